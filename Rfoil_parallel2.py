@@ -1,302 +1,857 @@
-# -*- coding: utf-8 -*-
-"""
-@author: Renaud Laine
-
-This is a program I wrote to take control of a computer's process and write
-text lines in a background task. The purpose was to automate the process of
-using a software that behaves like a command line (writing commands line after
-line) but that could not be used in a batch. Therefore this opens said process
-(rfoil) in the background, feeds it the required lines, waits for the
-computation to finish and outputs the data from the software as a file. Also
-this offers the option of parallel computing using the Thread class. A user
-interface calling the object Rfoil was also created.
-
-"""
-
-import time, datetime
-try:
-    import win32api, win32gui, win32process, win32con
-except:
-    from win32 import win32api, win32gui, win32process
-    import win32.lib.win32con as win32con
-import os
-import shutil
-import psutil
-from threading import Thread, RLock
-
-class Rfoil(Thread):
-    
-    def __init__(self, cmd = '', rootdir = '', profile = '', re = '', mach = 0,
-                 angle_max = 0, angle_step = 0, tries_max = 5):
-        Thread.__init__(self)
-        self.cmd = cmd
-        self.profile = profile.capitalize()
-        self.re = re
-        self.root_directory = rootdir
-        self.polar_directory = os.path.join(self.root_directory, self.profile)
-        self.profile_file = self.profile + '.dat'
-        self.log_file = self.profile + '.log'
-        self.polar_file = 'RE' + re + '.dat'
-        self.tries = 1
-        self.tries_max = tries_max
-        self.mach = mach
-        self.angle_max = angle_max
-        self.angle_step = angle_step
-        self.success = False
-        self.handle = {}
-        self.setDaemon(True)
-
-    def openwindow(self):
-        """
-        Opens rfoil in the background and remembers its process id
-        """
-        self.startupinfo = win32process.STARTUPINFO()
-        self.startupinfo.dwFlags = win32process.STARTF_USESHOWWINDOW
-        self.startupinfo.wShowWindow = win32con.SW_MINIMIZE
-        self.hp, self.ht, self.pid, self.tid = win32process.CreateProcess(
-                None,    # name
-                self.cmd,     # command line
-                None,    # process attributes
-                None,    # thread attributes
-                0,       # inheritance flag
-                0,       # creation flag
-                None,    # new environment
-                self.polar_directory,    # current directory
-                self.startupinfo)
-        self.process = psutil.Process(self.pid)
-        self.getwindow()
-
-    def wcallb(self, hwnd, handle):
-        '''wcallb is callback for EnumThreadWindows and 
-        EnumChildWindows. It populates the dict 'handle' with 
-        references by class name for each window and child 
-        window of the given thread ID.
-        '''
-        handle[win32gui.GetClassName(hwnd)] = hwnd
-        win32gui.EnumChildWindows(hwnd, self.wcallb, handle)
-        return True
-
-    def getwindow(self):
-        """
-        Gets the window handle for the window named 'rfoil01Graphic' in the
-        given process.
-        """
-        while 'rfoil01Graphic' not in self.handle:   
-            time.sleep(0.1)
-            try:
-                win32gui.EnumThreadWindows(self.tid, self.wcallb, self.handle)
-            except:
-                pass
-        
-    def write(self, msg):
-        """
-        write sends a message to the rfoil window and
-        then waits for rfoil to be idle (cpu usage = 0) for
-        a certain amount of time.
-        """
-        msg = str(msg) + '\n'
-        for c in msg:
-            win32api.PostMessage(
-                self.handle['rfoil01Graphic'], 
-                win32con.WM_CHAR, 
-                ord(c), 
-                0)
-        self.waitready()
-
-    def waitready(self):
-        """
-        Wait until process cpu usage is 0
-        """
-        timer = 50#milliseconds
-        count_max = int(timer/10)
-        #cpu usage over the last count_max*0.01 seconds
-        cpu = [1 for i in range(count_max)]
-        while sum(cpu) > 0:
-            cpu_now = self.process.cpu_percent()
-            cpu = cpu[1:] + [cpu_now]
-            #print(cpu)
-            time.sleep(0.01)
-
-    def close(self):
-        """
-        Kill process
-        """
-        self.handle = {}
-        try:
-            self.process.kill()
-        except:
-            pass
-
-    def run(self):
-        """
-        The run method for the Thread, plays all the desired actions in the
-        order. Creates a data file and a log file.
-        """
-        while (not self.success) and (self.tries <= tries_max):
-            if self.tries == 1:
-                old_lines=[]
-            file_fullpath = os.path.join(self.polar_directory, self.polar_file)
-            log_fullpath = os.path.join(self.polar_directory, self.log_file)
-            ###Check whether the profile is custom or Naca
-            naca = False
-            if self.profile[0:4] == 'Naca' and len(self.profile) in [8, 9]:
-                naca = True
-                naca_number = self.profile[4:]
-                naca_type = 'nac' + str(len(naca_number))
-            else:
-                naca_type = ''
-                naca_number = ''
-            if not naca and not os.path.exists(os.path.join(self.polar_directory, self.profile_file)):
-                try:
-                    with lock:
-                        shutil.copyfile(self.profile_file, os.path.join(self.polar_directory, self.profile_file))
-                except:
-                    print('No data for profile: {0}'.format(self.profile))
-                    self.success = True
-                    continue
-            if os.path.exists(file_fullpath):
-                #Remember what was in the file and delete it
-                with lock:
-                    file = open(file_fullpath)
-                    old_lines = file.readlines()
-                    file.close()
-                    os.remove(file_fullpath)
-            self.openwindow()
-            try:
-                self.waitready() #Initial wait for everything to be written in the window
-                with lock:
-                    if naca:
-                        self.write(naca_type)
-                        self.write(naca_number)
-                    else:
-                        self.write('load')
-                        self.write(self.profile_file)
-                        self.write(self.profile)
-                self.write('oper')
-                self.write('visc')
-                self.write(self.re)
-                self.write('mach')
-                self.write(self.mach)
-                self.write('pacc')
-                self.write(self.polar_file)
-                self.write('')
-                self.write('aseq')
-                self.write('0')
-                self.write(self.angle_max)
-                self.write(self.angle_step)
-                self.waitready() #Security wait between the two halves
-                self.write('vpar')
-                self.write('init')
-                self.write('')
-                self.write('aseq')
-                self.write(-self.angle_step)
-                self.write(-self.angle_max)
-                self.write(-self.angle_step)
-                self.waitready()
-            except:
-                pass
-            finally:
-                self.close()
-                if os.path.exists(file_fullpath):
-                    file = open(file_fullpath)
-                    lines = file.readlines()
-                    file.close()
-                    #There are 13 header lines
-                    lines = lines[13:]
-                    min_amount_data = self.angle_max / self.angle_step + 2
-                    #If data is same as before allow less data as minimum
-                    #This is to reduce calculation time as Rfoil takes lots
-                    #of cpu time on computation converging badly.
-                    if len(old_lines) == len(lines):
-                        min_amount_data = int(min_amount_data * (self.tries_max - self.tries + 1) / self.tries_max)
-                    #If we have less data than before, rewrite previous file
-                    elif len(old_lines) > len(lines):
-                        lines = old_lines
-                    #Check there is enough data or too many tries
-                    if len(lines) >= min_amount_data or self.tries >= self.tries_max: 
-                        if len(lines) >= min_amount_data:
-                            print('    Reynolds = {0}, success on try {1}'.format(self.re, self.tries))
-                            log = open(log_fullpath, 'a')
-                            log.write('Reynolds = {0}, success on try {1}\n'.format(self.re, self.tries))
-                            log.close()
-                        else:
-                            print('    Reynolds = {0}, failed {1} times'.format(self.re, self.tries_max))
-                            log = open(log_fullpath, 'a')
-                            log.write('Reynolds = {0}, failed {1} times\n'.format(self.re, self.tries_max))
-                            log.close()
-                        lines = [(float(item[:8]), item) for item in lines]
-                        lines = [line for angle, line in sorted(lines)]
-                        file = open(file_fullpath, 'w')
-                        file.writelines(lines)
-                        file.close()
-                        self.success = True
-                    else:
-                        self.tries += 1
-                        os.remove(file_fullpath)
-                else:
-                    if self.tries >= tries_max:
-                        open(file_fullpath, 'w').writelines(old_lines)
-                        print('    Reynolds = {0}, failed {1} times'.format(self.re, self.tries_max))
-                        open(log_fullpath, 'a').write('Reynolds = {0}, failed {1} times\n'.format(self.re, self.tries_max))
-                    self.tries += 1
-
-        
-###The main action of the script
-###Loops over profiles and Reynolds to create the polars.
-if __name__ == "__main__":
-    ###PATH to Rfoil
-    cmd = 'C:/Program Files (x86)/rFoil/rfoil01.exe' #Use / or \\ in the path
-    ###Write each profile between apostrophes separated by a comma.
-    ###If a Naca profile is specified, the airfoil will be generated by Rfoil.
-    profiles = ['Profile']
-    ###Write the range of Reynolds you want to generate a polar for.
-    Reynolds = ['1e5', '5e5', '1e6', '5e6', '1e7', '5e7']
-    ###Other Rfoil settings
-    Mach = 0.1
-    angle_max = 20
-    angle_step = 0.5
-    ###The number of tries you want to do for a polar in case of failure.
-    ###Failure can happen for various reason, from convergence failing to Rfoil crashing.
-    ###If you absolutely want all polars to be created set a high (>= 5) tries_max.
-    tries_max = 5
-    ###Polars will be saved to root_directory/Name_of_profile/ (relative to where you started this script)
-    root_directory = 'Polars'
-    lock = RLock()
-    max_running = 1
-    for profile in profiles:
-        profile = profile.capitalize()
-        ###Make some room for the incoming polars
-        polar_directory = os.path.join(root_directory, profile)
-        if not os.path.exists(polar_directory):
-            os.mkdir(polar_directory)
-        print('Profile: ' + profile)
-        now = datetime.datetime.now()
-        log_file = profile + '.log'
-        with lock:
-            log = open(os.path.join(polar_directory, log_file), 'a')
-            log.write(now.strftime("\n----- %Y-%m-%d %H:%M -----\n"))
-            log.close()
-        ###re is the Reynolds index
-        ###tries is to try again as many times as tries_max if something goes wrong
-        threads = [None for i in range(len(Reynolds))]
-        for i, re in enumerate(Reynolds):
-            threads[i] = Rfoil(cmd = cmd, rootdir = root_directory, profile = profile, re = re, mach = Mach,
-                   angle_max = angle_max, angle_step = angle_step, tries_max = tries_max)
-        running_threads = threads[:max_running]
-        threads = threads[max_running:]
-        for thread in running_threads:
-            thread.start()
-        while len(threads) > 0:
-            for i, thread in enumerate(running_threads):
-                if not thread.isAlive():
-                    running_threads[i] = threads.pop(0)
-                    running_threads[i].start()
-            time.sleep(0.1)
-        for thread in running_threads:
-            thread.join()
-        delta_t = datetime.datetime.now()-now
-        print('Total time: {0} seconds'.format(delta_t.seconds))
-        with lock:
-            log = open(os.path.join(polar_directory, log_file), 'a')
-            log.write('Total time: {0} seconds\n'.format(delta_t.seconds))
-            log.close()
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is a program I wrote to take control of a computer's process and write
+text lines in a background task. The purpose was to automate the process of
+using a software that behaves like a command line (writing commands line after
+line) but that could not be used in a batch. Therefore this opens said process
+(rfoil) in the background, feeds it the required lines, waits for the
+computation to finish and outputs the data from the software as a file. Also
+this offers the option of parallel computing using the Thread class. A user
+interface calling the object Rfoil was also created.
+The solver is driven through a backend (see rfoil_backends), either by typing
+in the rfoil window or by writing on the standard input of the process.
+The timings of the runs (process start, commands, sweeps, tries) are recorded
+by an optional Metrics object (see rfoil_metrics).
+A polar running speculate_after times longer than predicted (see
+rfoil_runtime) starts a speculative attempt computing the missing angles
+another way in a free slot of the Scheduler, the first attempt completing
+the polar stops the other one.
+A polar can be stopped at any time (stop, used by the GUI): the sessions of
+the running try are killed and its rows are kept.
+With adaptive = True, angle_step is the step of a coarse polar which is then
+refined where CL or CD are not linear between the angles (stall) or where
+angles did not converge, down to min_step and up to max_points angles.
+Each step of the refinement runs like a try, under attempt_timeout.
+
+"""
+
+import os
+import time
+import numpy as np
+from threading import Thread, Lock, Timer
+from rfoil_backends import make_backend, SolverTimeout, StartupTimeout
+from rfoil_sessions import Session, SessionPool, naca
+from rfoil_cache import PolarCache
+from rfoil_polar import Polar
+from rfoil_locks import directory_lock
+from rfoil_staging import default_store, cache_store
+
+###Failure classes of a try
+STARTUP_TIMEOUT = 'startup timeout'
+TIMEOUT = 'timeout'
+CRASH = 'crash'
+NONCONVERGENCE = 'non-convergence'
+TOO_FEW_ROWS = 'too few rows'
+CANCELLED = 'cancelled'
+
+def count_rows(path):
+    """
+    Returns the number of non empty lines of a file
+    """
+    with open(path, 'rb') as file:
+        return sum(1 for line in file if line.strip())
+
+
+class Rfoil(Thread):
+
+    ###Refinement of adaptive polars: largest acceptable error of a linear
+    ###interpolation of CL (absolute) and CD (relative) between two angles
+    refine_cl = 0.01
+    refine_cd = 0.05
+    
+    def __init__(self, cmd = '', rootdir = '', profile = '', re = '', mach = 0,
+                 angle_max = 0, angle_step = 0, tries_max = 5, backend = 'window',
+                 ready = None, timeout = None, pool = None, cache = None, split = 1,
+                 startup_timeout = None, attempt_timeout = None, metrics = None,
+                 speculate_after = None, adaptive = False, min_step = None, max_points = None,
+                 staging = None):
+        Thread.__init__(self)
+        self.cmd = cmd
+        self.profile = profile.capitalize()
+        self.re = re
+        self.root_directory = rootdir
+        self.polar_directory = os.path.join(self.root_directory, self.profile)
+        self.profile_file = self.profile + '.dat'
+        self.log_file = self.profile + '.log'
+        self.polar_file = 'RE' + re + '.dat'
+        self.tries = 1
+        self.tries_max = tries_max
+        self.mach = mach
+        self.angle_max = angle_max
+        self.angle_step = angle_step
+        self.success = False
+        self.failure = None
+        self.failures = []
+        self.backend = backend
+        self.backend_options = {'timeout': timeout, 'startup_timeout': startup_timeout}
+        self.attempt_timeout = attempt_timeout
+        self.active = []
+        self.active_lock = Lock()
+        self.expired = False
+        self.stopped = False
+        self.init_gaps = True
+        if ready:
+            self.backend_options['ready'] = ready
+        self.pool = pool
+        self.cache = cache
+        self.split = max(int(split), 1)
+        self.metrics = metrics
+        #Speculative attempts, predicted and slots are set by the Scheduler
+        self.speculate_after = speculate_after
+        self.predicted = None
+        self.slots = None
+        self.cancelled = set()
+        self.adaptive = adaptive
+        self.min_step = min_step or angle_step / 8.
+        self.max_points = max_points
+        #Angles of the refinement that did not converge
+        self.unconverged = set()
+        #Rows before the refinement and segments of its next step, None
+        #when the polar is not being refined
+        self.refinement = None
+        self.refinement_segments = []
+        #Profile files are staged and read once (see rfoil_staging)
+        self.staging = staging or (cache_store(cache.directory) if cache else default_store)
+        self.daemon = True
+
+    def record(self, event, **fields):
+        """
+        Records a timing event of this polar if metrics are enabled
+        """
+        if self.metrics is not None:
+            if event == 'polar':
+                #Settings of the runtime model (see rfoil_runtime)
+                fields.update(mach = self.mach, angle_max = self.angle_max, angle_step = self.angle_step)
+            self.metrics.record(event, profile = self.profile, re = self.re, attempt = self.tries, **fields)
+
+    def newsession(self):
+        return Session(make_backend(self.backend, self.cmd, **self.backend_options),
+                       self.polar_directory, record = self.record if self.metrics else None)
+
+    def opensolver(self):
+        """
+        Opens rfoil in the background, or takes a warm session of the same
+        profile from the pool
+        """
+        if self.pool is None:
+            session = self.newsession()
+            try:
+                session.open()
+            except Exception:
+                session.close()
+                raise
+            return session
+        key = (self.backend, str(self.cmd), self.polar_directory)
+        return self.pool.acquire(key, self.newsession)
+
+    def close(self, session, broken = True):
+        """
+        Kill process, or give the session back to the pool if it is not broken
+        """
+        if self.pool is None:
+            session.close()
+        else:
+            self.pool.release(session, broken)
+
+    def cachekey(self):
+        """
+        Returns the key of the polar in the cache (None without cache or
+        profile data)
+        """
+        if self.cache is None:
+            return None
+        if naca(self.profile):
+            geometry = self.profile
+        else:
+            try:
+                geometry = self.staging.load(self.profilesource())[1]
+            except (EnvironmentError, ValueError):
+                return None
+        options = [self.min_step, self.max_points, self.refine_cl, self.refine_cd] if self.adaptive else None
+        return self.cache.key(geometry, self.re, self.mach, self.angle_max,
+                              self.angle_step, self.tries_max, self.cmd, options)
+
+    def profilesource(self):
+        """
+        Returns the profile file of the working directory, or the one
+        already in the polar directory
+        """
+        if os.path.exists(self.profile_file):
+            return self.profile_file
+        return os.path.join(self.polar_directory, self.profile_file)
+
+    def angles(self):
+        """
+        Returns the angles of the positive sweep and of the negative sweep,
+        in the order they are computed
+        """
+        count = int(round(self.angle_max / self.angle_step))
+        positive = [round(i * self.angle_step, 3) for i in range(count + 1)]
+        negative = [-angle for angle in positive[1:]]
+        return [positive, negative]
+
+    def segments(self, init_gaps = None):
+        """
+        Returns the (first, last, init) aseq sweeps still to compute: the two
+        full sweeps on the first try, then only the missing angles. A missing
+        range restarts from initialized boundary layers or from its converged
+        neighbour depending on init_gaps (see retry).
+        """
+        if init_gaps is None:
+            init_gaps = self.init_gaps
+        segments = []
+        converged = self.polar.angles()
+        for sweep in self.angles():
+            previous = None
+            gap = []
+            for angle in sweep + [None]:
+                if angle is not None and angle not in converged:
+                    gap.append(angle)
+                    continue
+                if gap:
+                    if not init_gaps and previous is not None:
+                        segments.append((previous, gap[-1], False))
+                    else:
+                        segments.append((gap[0], gap[-1], True))
+                    gap = []
+                previous = angle
+        return segments
+
+    def speculativesegments(self):
+        """
+        Returns the segments of a speculative attempt: the missing ranges
+        restarted the other way (see retry), or when that changes nothing
+        each sweep split in two, the second half from initialized boundary
+        layers
+        """
+        segments = self.segments()
+        alternative = self.segments(not self.init_gaps)
+        if alternative != segments:
+            return alternative
+        alternative = []
+        for segment in segments:
+            alternative += self.halve(segment) if self.length(segment) > 2 else [segment]
+        return alternative
+
+    def length(self, segment):
+        """
+        Returns the number of angles of a (first, last, init) segment
+        """
+        return int(round(abs(segment[1] - segment[0]) / self.angle_step)) + 1
+
+    def halve(self, segment):
+        """
+        Cuts a segment of at least 2 angles in two, the second half from
+        initialized boundary layers
+        """
+        first, last, init = segment
+        step = self.angle_step if last >= first else -self.angle_step
+        middle = round(first + step * ((self.length(segment) - 1) // 2), 3)
+        return [(first, middle, init), (round(middle + step, 3), last, True)]
+
+    def share(self, segments, count):
+        """
+        Returns the segments of each of count sessions: the longest segments
+        are cut in two until there is one per session, then each segment
+        goes to the session with the fewest angles
+        """
+        segments = list(segments)
+        while 0 < len(segments) < count:
+            longest = max(segments, key = self.length)
+            if self.length(longest) < 2:
+                break
+            index = segments.index(longest)
+            segments[index:index + 1] = self.halve(longest)
+        groups = [[] for i in range(count)]
+        for segment in sorted(segments, key = self.length, reverse = True):
+            min(groups, key = lambda group: sum(self.length(other) for other in group)).append(segment)
+        return groups
+
+    def refinementsegments(self):
+        """
+        Returns the segments of the next refinement of an adaptive polar:
+        the middle of the intervals where the linear interpolation error
+        (estimated from the second differences) of CL or CD is larger than
+        refine_cl or refine_cd, and the middles around the angles that did
+        not converge. Each angle is computed from its converged neighbour
+        closer to 0, the largest errors first up to max_points angles.
+        """
+        alpha = self.polar.alpha
+        cl = self.polar['CL']
+        cd = self.polar['CD']
+        converged = self.polar.angles()
+        blocked = sorted(self.unconverged | set(angle for sweep in self.angles() for angle in sweep
+                                                if angle not in converged))
+        second_cl = np.zeros(len(alpha))
+        second_cd = np.zeros(len(alpha))
+        if len(alpha) >= 3:
+            h0 = alpha[1:-1] - alpha[:-2]
+            h1 = alpha[2:] - alpha[1:-1]
+            for values, second in [(cl, second_cl), (cd, second_cd)]:
+                second[1:-1] = 2 * ((values[2:] - values[1:-1]) / h1 - (values[1:-1] - values[:-2]) / h0) / (h0 + h1)
+        candidates = {}
+        for i in range(len(alpha) - 1):
+            inner = [angle for angle in blocked if alpha[i] < angle < alpha[i + 1]]
+            points = [alpha[i]] + inner + [alpha[i + 1]]
+            for a, b in zip(points[:-1], points[1:]):
+                if (b - a) / 2 < self.min_step - 1e-9:
+                    continue
+                if inner:
+                    error = np.inf
+                else:
+                    h = b - a
+                    error_cl = h ** 2 / 8 * max(abs(second_cl[i]), abs(second_cl[i + 1]))
+                    error_cd = h ** 2 / 8 * max(abs(second_cd[i]), abs(second_cd[i + 1])) / min(cd[i], cd[i + 1])
+                    error = max(error_cl / self.refine_cl, error_cd / self.refine_cd)
+                angle = round((a + b) / 2, 3)
+                if error > 1 and angle not in converged and angle not in self.unconverged:
+                    candidates[angle] = error
+        budget = len(candidates) if self.max_points is None else max(self.max_points - len(alpha), 0)
+        chosen = sorted(candidates, key = lambda angle: -candidates[angle])[:budget]
+        segments = []
+        for angle in sorted(chosen, key = abs):
+            closer = alpha[(alpha < angle) & (alpha >= 0)] if angle > 0 else alpha[(alpha > angle) & (alpha <= 0)]
+            if len(closer) == 0:
+                segments.append((angle, angle, True))
+                continue
+            neighbour = round(float(closer.max() if angle > 0 else closer.min()), 3)
+            segments.append((neighbour, angle, False, angle - neighbour))
+        return segments
+
+    def refine(self):
+        """
+        Starts the refinement of an adaptive polar, each step of the
+        refinement runs like a try (see begintry) until nothing is left to
+        refine
+        """
+        self.refinement = len(self.polar)
+        self.refinement_segments = self.refinementsegments()
+        if not self.refinement_segments:
+            self.endrefine()
+
+    def endrefinestep(self, failures):
+        """
+        Merges the angles of a refinement step and prepares the next one
+        """
+        path = os.path.join(self.polar_directory, self.refinefile())
+        with directory_lock(self.polar_directory):
+            rows = self.readpolar(path)
+            if os.path.exists(path):
+                os.remove(path)
+        converged = rows.angles()
+        angles = [segment[1] for segment in self.refinement_segments]
+        self.unconverged.update(angle for angle in angles if angle not in converged)
+        self.polar = self.polar.merge(rows)
+        self.record('refine', angles = len(angles), converged = sum(angle in converged for angle in angles),
+                    duration = time.time() - self.attempt_start)
+        if failures:
+            self.log('Reynolds = {0}, refinement stopped: {1} ({2})'.format(self.re, *failures[0]))
+            self.refinement_segments = []
+        else:
+            self.refinement_segments = self.refinementsegments()
+        if not self.refinement_segments:
+            self.endrefine()
+
+    def endrefine(self):
+        self.log('Reynolds = {0}, {1} angles added by the refinement'.format(self.re, len(self.polar) - self.refinement))
+        self.refinement = None
+        self.finish(True)
+
+    def sweepcommands(self, first, last, init, step = None):
+        """
+        Returns the commands computing the angles from first to last
+        """
+        step = abs(step or self.angle_step)
+        commands = ['vpar', 'init', ''] if init else []
+        return commands + ['aseq', first, last, step if last >= first else -step]
+
+    def sweep(self, session, first, last, init, step = None):
+        """
+        Computes the angles from first to last with aseq
+        """
+        start = time.time()
+        for msg in self.sweepcommands(first, last, init, step):
+            session.write(msg)
+        self.record('sweep', first = first, last = last, init = init, duration = time.time() - start)
+
+    def solve(self, segments, polar_file, failures, attempt = 'try'):
+        """
+        Computes the segments one after the other in one rfoil session,
+        accumulating the polar in polar_file. The failure class and message
+        are appended to failures if the session did not finish.
+        """
+        session = None
+        broken = True
+        try:
+            start = time.time()
+            session = self.opensolver()
+            if self.metrics:
+                #A warm session still reports to the polar it was opened for
+                session.record = self.record
+                self.record('session', duration = time.time() - start, warm = session.jobs > 0)
+            self.watch(session, attempt)
+            session.load(self.profile, self.profile_file)
+            session.oper(self.re, self.mach, polar_file)
+            for segment in segments:
+                self.sweep(session, *segment)
+            session.waitready()
+            session.leave()
+            broken = False
+        except Exception as error:
+            failures.append(self.classify(error))
+        finally:
+            if session is not None:
+                self.unwatch(session, attempt)
+                self.close(session, broken)
+
+    def classify(self, error):
+        """
+        Returns the failure class and message of the error ending a session
+        """
+        if self.stopped:
+            return CANCELLED, 'Stopped by the user'
+        if isinstance(error, StartupTimeout):
+            return STARTUP_TIMEOUT, str(error)
+        if isinstance(error, SolverTimeout):
+            return TIMEOUT, str(error)
+        #A session killed by the watchdog ends like a crash
+        return TIMEOUT if self.expired else CRASH, str(error) or repr(error)
+
+    def watch(self, session, attempt = 'try'):
+        """
+        Registers a session of the current try for the watchdog
+        """
+        with self.active_lock:
+            self.active.append((attempt, session))
+            if not (self.expired or self.stopped) and attempt not in self.cancelled:
+                return
+        session.kill()
+
+    def unwatch(self, session, attempt = 'try'):
+        with self.active_lock:
+            self.active.remove((attempt, session))
+
+    def expire(self):
+        """
+        Watchdog of a try: kills its sessions when attempt_timeout is over
+        """
+        with self.active_lock:
+            self.expired = True
+            sessions = [session for attempt, session in self.active]
+        for session in sessions:
+            session.kill()
+
+    def cancel(self, attempt):
+        """
+        Kills the sessions of the try ('try') or of the speculative attempt
+        ('speculative') when the other one completed the polar
+        """
+        with self.active_lock:
+            self.cancelled.add(attempt)
+            sessions = [session for name, session in self.active if name == attempt]
+        for session in sessions:
+            session.kill()
+
+    def stop(self):
+        """
+        Stops the polar for good: kills the sessions of the running try and
+        no other try starts
+        """
+        with self.active_lock:
+            self.stopped = True
+            sessions = [session for attempt, session in self.active]
+        for session in sessions:
+            session.kill()
+
+    def straggling(self):
+        """
+        Returns True if the current try runs speculate_after times longer
+        than predicted
+        """
+        if not (self.speculate_after and self.predicted and self.slots) or self.refinement is not None:
+            return False
+        return time.time() - self.attempt_start > self.speculate_after * self.predicted
+
+    def complete(self, polar_files):
+        """
+        Returns True if the polar and the rows of polar_files have all the
+        angles
+        """
+        polar = self.polar
+        with directory_lock(self.polar_directory):
+            for polar_file in polar_files:
+                polar = polar.merge(self.readpolar(os.path.join(self.polar_directory, polar_file)))
+        converged = polar.angles()
+        return all(angle in converged for sweep in self.angles() for angle in sweep)
+
+    def follow(self, threads, failures):
+        """
+        Waits for the sessions of a try, starts a speculative attempt if the
+        polar is straggling and a slot is free, and stops whichever attempt
+        is overtaken by the other. Returns the failures of the try.
+        """
+        speculative = None
+        speculative_failures = []
+        while any(thread.is_alive() for thread in threads):
+            if speculative is None and not self.stopped and self.straggling() and self.slots.borrow():
+                self.log('Reynolds = {0}, try {1}: speculative attempt'.format(self.re, self.tries))
+                self.record('speculative', elapsed = time.time() - self.attempt_start, predicted = self.predicted)
+                speculative = Thread(target = self.solve, daemon = True,
+                                     args = (self.speculativesegments(), self.specfile(),
+                                             speculative_failures, 'speculative'))
+                speculative.start()
+            if speculative is not None and not speculative.is_alive():
+                if not speculative_failures and self.complete([self.specfile()]):
+                    self.log('Reynolds = {0}, try {1}: speculative attempt completed first'.format(self.re, self.tries))
+                    self.cancel('try')
+                    for thread in threads:
+                        thread.join()
+                    self.slots.giveback()
+                    return speculative_failures
+            threads[0].join(0.1)
+        if speculative is None:
+            return failures
+        if speculative.is_alive():
+            if not failures and self.complete(self.partfiles()):
+                self.cancel('speculative')
+            speculative.join()
+        self.slots.giveback()
+        return failures
+
+    def retry(self, failure):
+        """
+        Prepares the next try for the failure class of the last one: after
+        a hung solver the missing ranges restart from initialized boundary
+        layers, after non-convergence they alternate between initializing and
+        continuing from the converged neighbour, after a crash or a startup
+        timeout the same ranges are computed again in a new process.
+        """
+        if failure == TIMEOUT:
+            self.init_gaps = True
+        elif failure == NONCONVERGENCE:
+            self.init_gaps = not self.init_gaps
+
+    def partfiles(self):
+        """
+        Returns the polar files of the sessions computing the polar, the
+        segments computed by the other sessions go to RE<re>.part<i>.dat
+        """
+        return [self.polar_file] + ['RE{0}.part{1}.dat'.format(self.re, i) for i in range(1, self.split)]
+
+    def refinefile(self):
+        return 'RE{0}.refine.dat'.format(self.re)
+
+    def oldfile(self):
+        """
+        Returns the name of the polar file of the previous run, kept aside
+        while the polar is computed again
+        """
+        return 'RE{0}.old.dat'.format(self.re)
+
+    def specfile(self):
+        return 'RE{0}.spec.dat'.format(self.re)
+
+    def readpolar(self, path):
+        """
+        Returns the valid rows of a polar file (empty if there is no file)
+        """
+        if not os.path.exists(path):
+            return Polar.empty()
+        return Polar.read(path).validated()
+
+    def log(self, message):
+        """
+        Prints the message and appends it to the log file of the profile
+        """
+        print('    ' + message)
+        with directory_lock(self.polar_directory):
+            log = open(os.path.join(self.polar_directory, self.log_file), 'a')
+            log.write(message + '\n')
+            log.close()
+
+    def fromcache(self):
+        """
+        Copies the polar from the cache, returns True on a hit. Otherwise
+        prepares the tries.
+        """
+        self.start_time = time.time()
+        self.record('start', predicted = self.predicted)
+        self.file_fullpath = os.path.join(self.polar_directory, self.polar_file)
+        self.key = self.cachekey()
+        if self.key and self.cache.get(self.key, self.file_fullpath):
+            self.log('Reynolds = {0}, from cache'.format(self.re))
+            self.success = True
+            self.record('polar', duration = time.time() - self.start_time, success = True, cached = True, rows = None)
+            return True
+        #Rows obtained by all the tries
+        self.polar = Polar.empty()
+        return False
+
+    def begintry(self):
+        """
+        Stages the profile and the polar files of the next try, returns the
+        (segments, polar file) of each session of the try, or None when the
+        polar is finished
+        """
+        if self.refinement is not None:
+            if self.stopped:
+                self.endrefine()
+                return None
+            path = os.path.join(self.polar_directory, self.refinefile())
+            with directory_lock(self.polar_directory):
+                if os.path.exists(path):
+                    os.remove(path)
+            #A step of the refinement has the watchdog of a try
+            self.attempt_start = time.time()
+            self.expired = False
+            self.cancelled = set()
+            return [(self.refinement_segments, self.refinefile())]
+        while (not self.success) and (self.tries <= self.tries_max) and not self.stopped:
+            if not naca(self.profile):
+                try:
+                    self.staging.stage(self.profilesource(), self.polar_directory, self.profile_file)
+                except (EnvironmentError, ValueError) as error:
+                    print('No data for profile: {0} ({1})'.format(self.profile, error))
+                    self.success = True
+                    continue
+            partfiles = self.partfiles()
+            old_path = os.path.join(self.polar_directory, self.oldfile())
+            with directory_lock(self.polar_directory):
+                if os.path.exists(self.file_fullpath) and self.tries == 1 and not os.path.exists(old_path):
+                    #Keep what was in the file before this run aside
+                    os.replace(self.file_fullpath, old_path)
+                for polar_file in partfiles + [self.specfile()]:
+                    if os.path.exists(os.path.join(self.polar_directory, polar_file)):
+                        os.remove(os.path.join(self.polar_directory, polar_file))
+            #With split > 1 the sweeps are cut in angle ranges shared between
+            #concurrent sessions
+            groups = self.share(self.segments(), len(partfiles))
+            self.attempt_start = time.time()
+            self.expired = False
+            self.cancelled = set()
+            self.count = len(self.polar)
+            return [(group, polar_file) for i, (group, polar_file) in enumerate(zip(groups, partfiles))
+                    if group or i == 0]
+        if self.stopped and not self.success:
+            self.failure = CANCELLED
+            self.log('Reynolds = {0}, cancelled'.format(self.re))
+            #Stopped between two tries: keep the rows of the previous ones
+            if self.tries > 1:
+                self.finish(False)
+        return None
+
+    def endtry(self, failures):
+        """
+        Merges the polar files of the try, classifies its failure and either
+        writes the polar or prepares the next try
+        """
+        if self.refinement is not None:
+            self.endrefinestep(failures)
+            return
+        count = self.count
+        with directory_lock(self.polar_directory):
+            #The rows of the try replace those of a speculative attempt
+            for polar_file in [self.specfile()] + self.partfiles():
+                path = os.path.join(self.polar_directory, polar_file)
+                #Duplicate angles of attack are merged
+                self.polar = self.polar.merge(self.readpolar(path))
+                if polar_file != self.polar_file and os.path.exists(path):
+                    os.remove(path)
+        failure = None
+        for failure_class in [CANCELLED, STARTUP_TIMEOUT, TIMEOUT, CRASH]:
+            for failed, message in failures:
+                if failed == failure_class and failure is None:
+                    failure = failed
+                    self.log('Reynolds = {0}, try {1}: {2} ({3})'.format(self.re, self.tries, failed, message))
+        converged = self.polar.angles()
+        if failure is None and any(angle not in converged for sweep in self.angles() for angle in sweep):
+            failure = NONCONVERGENCE
+        self.failures.append(failure)
+        self.record('try', failure = failure, rows = len(self.polar), new_rows = len(self.polar) - count,
+                    duration = time.time() - self.attempt_start)
+        min_amount_data = self.angle_max / self.angle_step + 2
+        #If this try converged no new data allow less data as minimum
+        #This is to reduce calculation time as Rfoil takes lots
+        #of cpu time on computation converging badly.
+        if len(self.polar) == count and failure == NONCONVERGENCE:
+            min_amount_data = int(min_amount_data * (self.tries_max - self.tries + 1) / self.tries_max)
+        #Check there is enough data or too many tries
+        enough = len(self.polar) >= min_amount_data
+        if enough or self.stopped or self.tries >= self.tries_max:
+            if enough:
+                self.log('Reynolds = {0}, success on try {1}'.format(self.re, self.tries))
+            elif self.stopped:
+                self.failure = CANCELLED
+                self.log('Reynolds = {0}, cancelled on try {1}'.format(self.re, self.tries))
+            else:
+                self.failure = TOO_FEW_ROWS
+                self.log('Reynolds = {0}, failed {1} times'.format(self.re, self.tries_max))
+            if self.adaptive and enough and not self.stopped:
+                self.refine()
+            else:
+                self.finish(enough)
+        else:
+            self.retry(failure)
+            self.tries += 1
+
+    def finish(self, enough):
+        """
+        Writes the polar and puts it in the cache
+        """
+        #The polar is written without the rfoil header
+        lines = self.polar.lines()
+        old_path = os.path.join(self.polar_directory, self.oldfile())
+        with directory_lock(self.polar_directory):
+            #If we have less data than before, put the previous file back
+            if os.path.exists(old_path) and count_rows(old_path) > len(lines):
+                os.replace(old_path, self.file_fullpath)
+            else:
+                file = open(self.file_fullpath, 'w')
+                file.writelines(lines)
+                file.close()
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        self.success = True
+        if self.key and enough:
+            self.cache.put(self.key, self.file_fullpath)
+        self.record('polar', duration = time.time() - self.start_time, success = self.failure is None,
+                    cached = False, rows = len(self.polar))
+
+    def run(self):
+        """
+        The run method for the Thread, plays all the desired actions in the
+        order. Creates a data file and a log file.
+        """
+        if self.fromcache():
+            return
+        sessions = self.begintry()
+        while sessions is not None:
+            failures = []
+            watchdog = None
+            if self.attempt_timeout:
+                watchdog = Timer(self.attempt_timeout, self.expire)
+                watchdog.daemon = True
+                watchdog.start()
+            threads = [Thread(target = self.solve, args = (group, polar_file, failures), daemon = True)
+                       for group, polar_file in sessions]
+            for thread in threads:
+                thread.start()
+            failures = self.follow(threads, failures)
+            if watchdog:
+                watchdog.cancel()
+            self.endtry(failures)
+            sessions = self.begintry()
+
+        
+###The main action of the script
+###Loops over profiles and Reynolds to create the polars.
+if __name__ == "__main__":
+    ###PATH to Rfoil
+    cmd = 'C:/Program Files (x86)/rFoil/rfoil01.exe' #Use / or \\ in the path
+    ###Write each profile between apostrophes separated by a comma.
+    ###If a Naca profile is specified, the airfoil will be generated by Rfoil.
+    profiles = ['Profile']
+    ###Write the range of Reynolds you want to generate a polar for.
+    Reynolds = ['1e5', '5e5', '1e6', '5e6', '1e7', '5e7']
+    ###Other Rfoil settings
+    Mach = 0.1
+    angle_max = 20
+    angle_step = 0.5
+    ###The number of tries you want to do for a polar in case of failure.
+    ###Failure can happen for various reason, from convergence failing to Rfoil crashing.
+    ###If you absolutely want all polars to be created set a high (>= 5) tries_max.
+    tries_max = 5
+    ###Polars will be saved to root_directory/Name_of_profile/ (relative to where you started this script)
+    root_directory = 'Polars'
+    ###'window' types the commands in the rfoil window (Windows only),
+    ###'pipe' writes them on the standard input of cmd (see fake_rfoil.py)
+    backend = 'window'
+    ###The pipe backend waits for the rfoil prompt after each command ('prompt')
+    ###or for the cpu usage to drop to 0 ('cpu', always used by 'window').
+    ###timeout is the maximum time in seconds for one command (None for no limit)
+    ready = 'prompt'
+    timeout = 600
+    ###A try is stopped when rfoil did not start within startup_timeout seconds
+    ###or when it lasts more than attempt_timeout seconds (None for no limit)
+    startup_timeout = 60
+    attempt_timeout = 3600
+    ###Keep rfoil running between the polars of a profile, a process is
+    ###restarted after it crashed or after max_jobs polars (0 to disable reuse)
+    max_jobs = 20
+    pool = SessionPool(max_jobs) if max_jobs else None
+    ###Polars already computed with the same geometry and settings are taken
+    ###from cache_directory (None to disable), the oldest are removed above
+    ###cache_size bytes
+    cache_directory = 'PolarCache'
+    cache_size = 200e6
+    cache = PolarCache(cache_directory, cache_size) if cache_directory else None
+    ###Number of polars computed at the same time
+    max_running = 1
+    ###Number of rfoil processes sharing the sweeps of one polar, 2 runs the
+    ###positive and the negative sweeps at the same time, more cut the sweeps
+    ###in angle ranges starting from initialized boundary layers
+    ###(max_running * split processes in total)
+    split = 1
+    ###The finished polars are added to the polar database in database_directory
+    ###(None to disable), see rfoil_polardb
+    database_directory = 'PolarDB'
+    ###After the batch the polars of each profile are resampled in one table
+    ###Reynolds x alpha in table_directory (None to disable), extrapolated to
+    ###+-180 degrees with extrapolation = True, see rfoil_tables
+    table_directory = 'PolarTables'
+    extrapolation = False
+    ###Timings of the runs are appended to metrics_file as JSON lines (None to
+    ###disable), see rfoil_metrics
+    metrics_file = 'rfoil_metrics.jsonl'
+    metrics = None
+    if metrics_file:
+        from rfoil_metrics import Metrics
+        metrics = Metrics(metrics_file)
+    ###Start the polars predicted to be the longest first (from the timings in
+    ###metrics_file), see rfoil_runtime
+    longest_first = True
+    ###A polar taking speculate_after times longer than predicted is also
+    ###computed another way in a free slot, the first complete result is kept
+    ###(None to disable, needs longest_first)
+    speculate_after = 2
+    ###Adaptive polars: angle_step is the step of a first coarse polar, angles
+    ###are then added where CL or CD are not linear (stall) down to min_step,
+    ###with at most max_points angles in a polar (None for no limit)
+    adaptive = False
+    min_step = 0.125
+    max_points = None
+    model = None
+    if longest_first and metrics_file:
+        from rfoil_runtime import RuntimeModel
+        model = RuntimeModel.read(metrics_file)
+    from rfoil_scheduler import Scheduler, make_jobs
+    import rfoil_locks
+    listeners = []
+    if database_directory:
+        from rfoil_polardb import PolarDB
+        database = PolarDB(database_directory)
+        listeners.append(lambda rfoil: rfoil.success and rfoil.failure is None and database.update(
+            os.path.join(rfoil.polar_directory, rfoil.polar_file)))
+    jobs = make_jobs(profiles, Reynolds, cmd = cmd, rootdir = root_directory, mach = Mach,
+                     angle_max = angle_max, angle_step = angle_step, tries_max = tries_max,
+                     backend = backend, ready = ready, timeout = timeout, cache = cache,
+                     split = split, startup_timeout = startup_timeout,
+                     attempt_timeout = attempt_timeout, metrics = metrics,
+                     speculate_after = speculate_after, adaptive = adaptive,
+                     min_step = min_step, max_points = max_points)
+    Scheduler(max_running, pool, listeners, model).run(jobs)
+    if table_directory:
+        from rfoil_tables import build_tables
+        tables = build_tables(root_directory, table_directory, [job['profile'].capitalize() for job in jobs],
+                              extrapolation = extrapolation)
+        print('{0} tables written to {1}'.format(len(tables), table_directory))
+    print(rfoil_locks.report())
+    if cache:
+        print(cache.report())
+    if pool:
+        pool.close()
+    if metrics:
+        metrics.close()
+        print(metrics.summary())
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the fixtures shared by the tests: every test runs in its own
+temporary directory, make_rfoil returns an Rfoil Thread driving the fake
+solver (see fake_rfoil) through the pipe backend.
+
+"""
+
+import os
+import pytest
+from fake_rfoil import fake_cmd
+from Rfoil_parallel2 import Rfoil
+
+
+class Events(object):
+    """
+    Metrics keeping the recorded events in memory
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event, **fields):
+        fields['event'] = event
+        self.events.append(fields)
+
+    def named(self, event):
+        return [fields for fields in self.events if fields['event'] == event]
+
+
+@pytest.fixture(autouse = True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def events():
+    return Events()
+
+
+@pytest.fixture
+def make_rfoil():
+    def make(cmd = None, cls = Rfoil, **settings):
+        settings = dict(dict(rootdir = 'Polars', profile = 'Naca0012', re = '1e6', mach = 0.1, tries_max = 3,
+                             angle_max = 10, angle_step = 0.5, backend = 'pipe', ready = 'prompt'), **settings)
+        rfoil = cls(cmd = cmd or fake_cmd(seed = 1), **settings)
+        os.makedirs(rfoil.polar_directory, exist_ok = True)
+        return rfoil
+    return make
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is a scripted fake of the rfoil command line, used to run and test the
+orchestration in Rfoil_parallel2 without the rfoil executable (on Linux for
+instance). It reads commands line after line on stdin, answers with the same
+prompts as rfoil and writes the polar files of the accumulated 'aseq' sweeps
+with the same 13 header lines and column layout. The aerodynamic model is
+a crude thin airfoil + stall model, only meant to produce believable numbers.
+The points can fail to converge (with a probability depending on the
+Reynolds number if needed) and the process can crash while solving, to
+exercise the retries of the orchestration (see rfoil_benchmark).
+
+Use fake_cmd() to get a command line usable as the 'cmd' of an Rfoil Thread
+with the pipe backend.
+
+"""
+
+import argparse
+import math
+import os
+import random
+import shlex
+import sys
+import time
+
+PROMPT_TOP = ' RFOIL   c>  '
+PROMPT_VPAR = '.VPAR   c>  '
+
+
+def fake_cmd(**options):
+    """
+    Returns the command line to start the fake solver with the given options,
+    e.g. fake_cmd(solve_time = 0.01, nonconv_re = {1e5: 0.5, 1e6: 0.1})
+    """
+    args = [sys.executable, os.path.abspath(__file__)]
+    for key, value in sorted(options.items()):
+        if isinstance(value, dict):
+            value = ','.join('{0}:{1}'.format(re, probability) for re, probability in sorted(value.items()))
+        args += ['--' + key.replace('_', '-'), str(value)]
+    return ' '.join(shlex.quote(arg) for arg in args)
+
+
+class FakeRfoil(object):
+
+    def __init__(self, solve_time = 0.0, nonconv = 0.0, seed = None,
+                 stdin = sys.stdin, stdout = sys.stdout, crash = 0.0, nonconv_re = None):
+        self.solve_time = solve_time
+        self.nonconv = nonconv
+        #{Reynolds number: nonconv}, the closest Reynolds number (in log) is used
+        self.nonconv_re = nonconv_re or {}
+        self.crash = crash
+        self.random = random.Random(seed)
+        self.stdin = stdin
+        self.stdout = stdout
+        self.pending = []
+        self.name = ''
+        self.loaded = False
+        self.viscous = False
+        self.re = 0.
+        self.mach = 0.
+        self.polar_file = ''
+
+    def say(self, text):
+        self.stdout.write(text + '\n')
+        self.stdout.flush()
+
+    def ask(self, prompt):
+        """
+        Prints the prompt and returns the next answer, answers can also be
+        given on the same line as the command like in rfoil ('visc 1e6')
+        """
+        if not self.pending:
+            self.stdout.write(prompt)
+            self.stdout.flush()
+            line = self.stdin.readline()
+            if not line:
+                raise EOFError
+            self.pending = line.split() or ['']
+        return self.pending.pop(0)
+
+    def askfloat(self, prompt):
+        while True:
+            answer = self.ask(prompt)
+            try:
+                return float(answer)
+            except ValueError:
+                self.say(' Invalid input: {0}'.format(answer))
+
+    def run(self):
+        self.say('')
+        self.say(' ===================================================')
+        self.say('  RFOIL (fake)  Version 1.1')
+        self.say(' ===================================================')
+        try:
+            while True:
+                command = self.ask(PROMPT_TOP).lower()
+                if command == 'load':
+                    self.load()
+                elif command[:3] == 'nac' and command[3:] in ['4', '5']:
+                    self.naca(int(command[3:]))
+                elif command == 'oper':
+                    self.oper()
+                elif command == 'quit':
+                    break
+                elif command:
+                    self.say(' {0} command not recognized.  Type a "?" for list'.format(command))
+        except EOFError:
+            pass
+
+    def load(self):
+        filename = self.ask('Enter filename   s>  ')
+        if not os.path.exists(filename):
+            self.say(' LOAD: File OPEN error.  Nonexistent file: {0}'.format(filename))
+            return
+        self.name = self.ask(' Enter airfoil name   s>  ')
+        self.loaded = True
+
+    def naca(self, digits):
+        number = self.ask('Enter NACA {0}-digit airfoil designation   i>  '.format(digits))
+        if len(number) != digits or not number.isdigit():
+            self.say(' Invalid designation: {0}'.format(number))
+            return
+        self.name = 'NACA ' + number
+        self.loaded = True
+
+    def oper(self):
+        if not self.loaded:
+            self.say(' ***  No airfoil available  ***')
+            return
+        while True:
+            prompt = '.OPER' + ('v' if self.viscous else 'i') + ('a' if self.polar_file else '') + '   c>  '
+            command = self.ask(prompt).lower()
+            if command == '':
+                return
+            elif command == 'visc':
+                if self.viscous:
+                    self.viscous = False
+                else:
+                    self.re = self.askfloat('Enter Reynolds number   r>  ')
+                    self.viscous = True
+            elif command == 're':
+                self.re = self.askfloat('Enter Reynolds number   r>  ')
+            elif command == 'mach':
+                self.mach = self.askfloat('Enter Mach number   r>  ')
+            elif command == 'pacc':
+                self.pacc()
+            elif command == 'init':
+                self.say(' BLs will be initialized on next point')
+            elif command == 'vpar':
+                self.vpar()
+            elif command == 'aseq':
+                first = self.askfloat('Enter first alfa value (deg)   r>  ')
+                last = self.askfloat('Enter last alfa value (deg)   r>  ')
+                step = self.askfloat('Enter alfa increment (deg)   r>  ')
+                self.aseq(first, last, step)
+            elif command == 'alfa':
+                self.solve(self.askfloat('Enter angle of attack (deg)   r>  '))
+            else:
+                self.say(' {0} command not recognized.  Type a "?" for list'.format(command))
+
+    def vpar(self):
+        while True:
+            command = self.ask(PROMPT_VPAR).lower()
+            if command == '':
+                return
+            elif command == 'init':
+                self.say(' BLs will be initialized on next point')
+
+    def pacc(self):
+        if self.polar_file:
+            self.say(' Polar accumulation disabled')
+            self.polar_file = ''
+            return
+        polar_file = self.ask('Enter  polar save filename  OR  <return> for no file   s>  ')
+        self.ask('Enter  polar dump filename  OR  <return> for no file   s>  ')
+        if polar_file and not os.path.exists(polar_file):
+            self.writeheader(polar_file)
+        self.polar_file = polar_file
+        self.say(' Polar accumulation enabled')
+
+    def writeheader(self, polar_file):
+        """
+        Writes the 13 header lines of an rfoil polar file
+        """
+        with open(polar_file, 'w') as file:
+            file.write('\n')
+            file.write('       RFOIL (fake)  Version 1.1\n')
+            file.write('\n')
+            file.write(' Calculated polar for: {0}\n'.format(self.name))
+            file.write('\n')
+            file.write(' 1 1 Reynolds number fixed          Mach number fixed\n')
+            file.write('\n')
+            file.write(' xtrf =   1.000 (top)        1.000 (bottom)\n')
+            file.write(' Mach = {0:7.3f}     Re = {1:9.3f} e 6     Ncrit =   9.000\n'.format(self.mach, self.re / 1e6))
+            file.write('\n')
+            file.write('   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr\n')
+            file.write('  ------ -------- --------- --------- -------- -------- --------\n')
+            file.write('\n')
+
+    def aseq(self, first, last, step):
+        if step == 0:
+            return
+        count = int(round((last - first) / step))
+        if count < 0:
+            return
+        for i in range(count + 1):
+            self.solve(first + i * step)
+
+    def coefficients(self, alpha):
+        """
+        Thin airfoil lift with a smooth stall, drag polar and transition
+        """
+        stall = min(max(12 + 2 * math.log10(max(self.re, 1e4) / 1e6), 8), 18)
+        cl_max = 2 * math.pi * 0.95 * math.radians(stall)
+        a = abs(alpha)
+        if a <= stall:
+            cl = 2 * math.pi * 0.95 * math.radians(a)
+        else:
+            cl = cl_max * (1 - 0.5 * math.tanh((a - stall) / 4))
+        cl = math.copysign(cl, alpha)
+        cd0 = 0.006 * (max(self.re, 1e4) / 1e6) ** -0.2
+        cd = cd0 + 0.01 * cl ** 2 + 0.02 * max(a - stall, 0) ** 1.5 / 10
+        cdp = 0.3 * cd
+        cm = -0.02 - 0.01 * max(a - stall, 0) / 4
+        top = min(max(0.6 - 0.04 * alpha, 0.01), 1.)
+        bot = min(max(0.6 + 0.04 * alpha, 0.01), 1.)
+        return cl, cd, cdp, cm, top, bot
+
+    def nonconvergence(self):
+        """
+        Returns the probability for a point at 10 degrees or more not to
+        converge at the current Reynolds number
+        """
+        if not self.nonconv_re:
+            return self.nonconv
+        log_re = math.log10(max(self.re, 1.))
+        closest = min(self.nonconv_re, key = lambda re: abs(math.log10(re) - log_re))
+        return self.nonconv_re[closest]
+
+    def converges(self, alpha):
+        if not self.viscous:
+            return True
+        return self.random.random() >= self.nonconvergence() * min(abs(alpha) / 10., 1.)
+
+    def solve(self, alpha):
+        """
+        Burns solve_time seconds of cpu like the real solver would (whatever
+        the number of solvers sharing the cores) and appends the converged
+        point to the accumulated polar
+        """
+        end = time.process_time() + self.solve_time
+        while time.process_time() < end:
+            pass
+        if self.crash and self.random.random() < self.crash:
+            #Dies like a crashed rfoil, without saying anything
+            os._exit(3)
+        if not self.converges(alpha):
+            self.say(' VISCAL:  Convergence failed')
+            self.say(' Type "!" to continue iterating')
+            return
+        cl, cd, cdp, cm, top, bot = self.coefficients(alpha)
+        self.say(' a ={0:7.3f}      CL ={1:8.4f}'.format(alpha, cl))
+        self.say(' Cm ={0:8.4f}     CD ={1:9.5f}'.format(cm, cd))
+        if self.polar_file:
+            with open(self.polar_file, 'a') as file:
+                file.write('{0:8.3f}{1:9.4f}{2:10.5f}{3:10.5f}{4:9.4f}{5:9.4f}{6:9.4f}\n'.format(
+                    alpha, cl, cd, cdp, cm, top, bot))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Scripted fake of the rfoil command line')
+    parser.add_argument('--solve-time', type = float, default = 0.0,
+                        help = 'cpu time burnt per angle of attack, in seconds')
+    parser.add_argument('--nonconv', type = float, default = 0.0,
+                        help = 'probability for a point at 10 degrees or more not to converge')
+    parser.add_argument('--nonconv-re', default = '',
+                        help = 'nonconv by Reynolds number, e.g. 1e5:0.5,1e6:0.1 (overrides --nonconv)')
+    parser.add_argument('--crash', type = float, default = 0.0,
+                        help = 'probability for the process to crash on each point')
+    parser.add_argument('--seed', type = int, default = None)
+    args = parser.parse_args()
+    nonconv_re = {}
+    for item in args.nonconv_re.split(','):
+        if item:
+            re, probability = item.split(':')
+            nonconv_re[float(re)] = float(probability)
+    FakeRfoil(solve_time = args.solve_time, nonconv = args.nonconv, seed = args.seed,
+              crash = args.crash, nonconv_re = nonconv_re).run()
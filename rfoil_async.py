@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is an asyncio version of the Rfoil Thread described in Rfoil_parallel2:
+the solver processes are started with asyncio.create_subprocess_exec and
+driven through their pipes (like the 'pipe' backend, waiting for the
+prompts), so that any number of polars and sessions run in one event loop
+instead of one thread each. The tries, retries, cache and log of a polar are
+those of Rfoil (the Rfoil object holds the state and the result), only the
+sessions are asynchronous. The number of polars computed at the same time is
+limited by a semaphore (max_running).
+
+    rfoil = await run_polar(cmd = cmd, rootdir = 'Polars', profile = 'Naca0018', re = '1e6', ...)
+    async for rfoil in run_batch(make_jobs(profiles, reynolds, cmd = cmd, ...), max_running = 4):
+        print(rfoil.profile, rfoil.re, rfoil.success)
+
+AsyncRfoil keeps the Thread API of Rfoil on top of it. Warm sessions
+(SessionPool) are not used here, every try starts new processes.
+
+"""
+
+import os
+import time
+import shlex
+import asyncio
+import contextlib
+from rfoil_backends import PipeBackend, SolverError, SolverTimeout, StartupTimeout
+from rfoil_sessions import Session
+from Rfoil_parallel2 import Rfoil, TIMEOUT
+
+
+def splitcmd(cmd):
+    """
+    Returns the arguments of the command line, a path to an executable
+    containing spaces is kept whole
+    """
+    if not isinstance(cmd, str):
+        return list(cmd)
+    if os.path.isfile(cmd):
+        return [cmd]
+    if os.name == 'nt':
+        return [token.strip('"') for token in shlex.split(cmd, posix = False)]
+    return shlex.split(cmd)
+
+
+class AsyncPipeBackend(object):
+    """
+    Solver driven through its stdin and stdout from the event loop, ready
+    when it prints its prompt
+    """
+
+    def __init__(self, cmd, timeout = None, startup_timeout = None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.reader = None
+        self.changed = None
+        self.prompts = 0
+        self.mark = 0
+        self.eof = False
+        self.tail = ''
+
+    async def open(self, cwd):
+        """
+        Opens the solver in the directory cwd and waits for its first prompt
+        """
+        try:
+            await self.start(cwd)
+            await self.wait(self.startup_timeout)
+        except SolverTimeout as error:
+            raise StartupTimeout(str(error))
+
+    async def start(self, cwd):
+        self.process = await asyncio.create_subprocess_exec(
+            *splitcmd(self.cmd), cwd = cwd or None, stdin = asyncio.subprocess.PIPE,
+            stdout = asyncio.subprocess.PIPE, stderr = asyncio.subprocess.STDOUT)
+        self.changed = asyncio.Event()
+        self.prompts = 0
+        self.mark = 0
+        self.eof = False
+        self.tail = ''
+        self.reader = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        """
+        Reads the solver output and counts the prompts it prints
+        """
+        while True:
+            data = await self.process.stdout.read(4096)
+            if not data:
+                self.eof = True
+                self.changed.set()
+                return
+            self.tail = (self.tail + data.decode(errors = 'replace'))[-4096:]
+            if PipeBackend.prompt.search(self.tail):
+                self.prompts += 1
+                self.tail = ''
+                self.changed.set()
+
+    async def send(self, line):
+        self.mark = self.prompts
+        try:
+            self.process.stdin.write((line + '\n').encode())
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            raise SolverError('Solver closed its input')
+
+    async def wait(self, timeout):
+        """
+        Wait for the prompt following the last command sent
+        """
+        async def ready():
+            while self.prompts <= self.mark and not self.eof:
+                self.changed.clear()
+                await self.changed.wait()
+        try:
+            await asyncio.wait_for(ready(), timeout)
+        except asyncio.TimeoutError:
+            raise SolverTimeout('No prompt after {0} seconds'.format(timeout))
+        if self.prompts <= self.mark:
+            raise SolverError('Solver closed its output')
+
+    async def waitready(self):
+        await self.wait(self.timeout)
+
+    def kill(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+        except ProcessLookupError:
+            pass
+
+    async def close(self):
+        if self.process is None:
+            return
+        self.kill()
+        await self.process.wait()
+        if not self.reader.done():
+            self.reader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.reader
+        self.process = None
+
+
+class AsyncSession(Session):
+    """
+    Session whose commands are awaited, same states and commands as Session
+    """
+
+    async def open(self):
+        start = time.time()
+        await self.backend.open(self.directory)
+        if self.record:
+            self.record('spawn', duration = time.time() - start)
+
+    async def write(self, msg):
+        start = time.time()
+        try:
+            await self.backend.send(str(msg))
+            sent = time.time()
+            await self.backend.waitready()
+        except BaseException:
+            self.broken = True
+            raise
+        if self.record:
+            self.record('command', command = str(msg), send = sent - start, wait = time.time() - sent)
+
+    async def waitready(self):
+        start = time.time()
+        try:
+            await self.backend.waitready()
+        except BaseException:
+            self.broken = True
+            raise
+        if self.record:
+            self.record('wait', duration = time.time() - start)
+
+    async def load(self, profile, profile_file):
+        for msg in self.loadcommands(profile, profile_file):
+            await self.write(msg)
+        self.profile = profile
+
+    async def oper(self, re, mach, polar_file):
+        for msg in self.opercommands(re, mach, polar_file):
+            await self.write(msg)
+        self.viscous = True
+
+    async def leave(self):
+        for msg in self.leavecommands():
+            await self.write(msg)
+        self.jobs += 1
+
+    async def close(self):
+        await self.backend.close()
+
+
+async def solve(rfoil, segments, polar_file, failures, attempt = 'try'):
+    """
+    Computes the segments of one session of a try of rfoil (see Rfoil.solve)
+    """
+    session = None
+    watched = False
+    try:
+        backend = AsyncPipeBackend(rfoil.cmd, rfoil.backend_options['timeout'],
+                                   rfoil.backend_options['startup_timeout'])
+        session = AsyncSession(backend, rfoil.polar_directory, record = rfoil.record if rfoil.metrics else None)
+        await session.open()
+        #Killed by stop and by the watchdog like the sessions of Rfoil
+        rfoil.watch(session, attempt)
+        watched = True
+        await session.load(rfoil.profile, rfoil.profile_file)
+        await session.oper(rfoil.re, rfoil.mach, polar_file)
+        for segment in segments:
+            start = time.time()
+            for msg in rfoil.sweepcommands(*segment):
+                await session.write(msg)
+            rfoil.record('sweep', first = segment[0], last = segment[1], init = segment[2],
+                         duration = time.time() - start)
+        await session.waitready()
+        await session.leave()
+    except asyncio.CancelledError:
+        if not rfoil.expired:
+            raise
+        failures.append((TIMEOUT, 'Try stopped after {0} seconds'.format(rfoil.attempt_timeout)))
+    except Exception as error:
+        failures.append(rfoil.classify(error))
+    finally:
+        if watched:
+            rfoil.unwatch(session, attempt)
+        if session is not None:
+            await session.close()
+
+
+async def runrfoil(rfoil):
+    """
+    Computes the polar of an Rfoil object in the event loop, the files are
+    handled by the Rfoil methods in a worker thread
+    """
+    if not os.path.exists(rfoil.polar_directory):
+        os.makedirs(rfoil.polar_directory, exist_ok = True)
+    if await asyncio.to_thread(rfoil.fromcache):
+        return rfoil
+    sessions = await asyncio.to_thread(rfoil.begintry)
+    while sessions is not None:
+        failures = []
+        tasks = [asyncio.ensure_future(solve(rfoil, group, polar_file, failures))
+                 for group, polar_file in sessions]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout = rfoil.attempt_timeout or None)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions = True)
+            raise
+        if pending:
+            rfoil.expired = True
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions = True)
+        await asyncio.to_thread(rfoil.endtry, failures)
+        sessions = await asyncio.to_thread(rfoil.begintry)
+    return rfoil
+
+
+async def run_polar(semaphore = None, **settings):
+    """
+    Computes one polar, settings are the arguments of Rfoil (cmd, rootdir,
+    profile, re, mach...). Returns the Rfoil object with the result
+    (success, failure, failures, polar).
+    """
+    settings['backend'] = 'pipe'
+    settings.pop('pool', None)
+    rfoil = Rfoil(**settings)
+    async with semaphore or contextlib.nullcontext():
+        return await runrfoil(rfoil)
+
+
+async def run_batch(jobs, max_running = 1):
+    """
+    Computes the jobs (see rfoil_scheduler.make_jobs) with at most
+    max_running polars at the same time, yields the Rfoil objects as they
+    finish
+    """
+    semaphore = asyncio.Semaphore(max(int(max_running), 1))
+    tasks = [asyncio.ensure_future(run_polar(semaphore, **job)) for job in jobs]
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        #The consumer stopped early
+        for task in tasks:
+            task.cancel()
+
+
+class AsyncRfoil(Rfoil):
+    """
+    Rfoil Thread computing its polar with an event loop of its own
+    """
+
+    def run(self):
+        asyncio.run(runrfoil(self))
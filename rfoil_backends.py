@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the solver backends used by the Rfoil Thread described in
+Rfoil_parallel2. A backend opens the solver process, feeds it command lines
+and closes it:
+    - 'window' takes control of the rfoil window and types the commands
+      character by character with window messages (Windows only),
+    - 'pipe' drives a solver reading its commands on stdin (rfoil run from a
+      console, or fake_rfoil) and writes whole command lines at once.
+The solver is ready for the next command when it prints its prompt ('c>',
+'r>', ...) on its output. The window backend has no output to read and
+waits for the cpu usage of the process to drop to 0 instead, which the pipe
+backend can also do with ready = 'cpu'. Waiting for the solver to start or
+to answer a command is limited by startup_timeout and timeout, a backend can
+also be killed from another thread (see the watchdog of Rfoil_parallel2).
+psutil and pywin32 are only imported when a backend needs them, the pipe
+backend waiting for prompts needs neither.
+
+"""
+
+import os
+import re
+import shlex
+import subprocess
+import time
+from threading import Thread, Condition
+#Imported on first use by loadpsutil and loadwin32
+psutil = None
+win32api = win32gui = win32process = win32con = None
+
+
+def loadpsutil():
+    global psutil
+    if psutil is None:
+        import psutil as module
+        psutil = module
+    return psutil
+
+
+def loadwin32():
+    """
+    Imports pywin32, returns False if it is not installed
+    """
+    global win32api, win32gui, win32process, win32con
+    if win32api is not None:
+        return True
+    try:
+        import win32api as api, win32gui as gui, win32process as process, win32con as con
+    except ImportError:
+        try:
+            from win32 import win32api as api, win32gui as gui, win32process as process
+            import win32.lib.win32con as con
+        except ImportError:
+            return False
+    win32api, win32gui, win32process, win32con = api, gui, process, con
+    return True
+
+
+class SolverError(Exception):
+    """
+    The solver stopped answering
+    """
+
+
+class SolverTimeout(SolverError):
+    """
+    The solver was not ready within the command timeout
+    """
+
+
+class StartupTimeout(SolverTimeout):
+    """
+    The solver did not start within the startup timeout
+    """
+
+
+def waitidle(process, timer = 50, timeout = None):
+    """
+    Wait until process cpu usage is 0 for timer milliseconds
+    """
+    loadpsutil()
+    count_max = int(timer/10)
+    deadline = None if timeout is None else time.time() + timeout
+    #cpu usage over the last count_max*0.01 seconds
+    cpu = [1 for i in range(count_max)]
+    while sum(cpu) > 0:
+        if deadline is not None and time.time() > deadline:
+            raise SolverTimeout('Solver still busy after {0} seconds'.format(timeout))
+        try:
+            cpu_now = process.cpu_percent()
+        except psutil.Error:
+            raise SolverError('Solver process ended')
+        cpu = cpu[1:] + [cpu_now]
+        time.sleep(0.01)
+
+
+class Backend(object):
+    """
+    Base class of the solver backends, timeout is the maximum time in seconds
+    to wait for the solver to be ready after a command and startup_timeout
+    after it was opened (None to wait forever)
+    """
+
+    def __init__(self, cmd, ready = 'cpu', timeout = None, startup_timeout = None):
+        self.cmd = cmd
+        self.ready = ready
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def open(self, cwd):
+        """
+        Opens the solver in the directory cwd and waits until it is ready
+        """
+        try:
+            self.start(cwd)
+            self.wait(self.startup_timeout)
+        except SolverTimeout as error:
+            raise StartupTimeout(str(error))
+
+    def start(self, cwd):
+        """
+        Opens the solver in the directory cwd
+        """
+        raise NotImplementedError
+
+    def send(self, line):
+        """
+        Sends one command line to the solver without waiting
+        """
+        raise NotImplementedError
+
+    def write(self, msg):
+        """
+        Sends a command line and waits for the solver to be ready
+        """
+        self.send(str(msg))
+        self.waitready()
+
+    def waitready(self):
+        """
+        Wait until the solver is ready for the next command
+        """
+        self.wait(self.timeout)
+
+    def wait(self, timeout):
+        """
+        Wait until process cpu usage is 0
+        """
+        waitidle(self.process, timeout = timeout)
+
+    def kill(self):
+        """
+        Kills the process without waiting for it, can be called from any thread
+        """
+        try:
+            self.process.kill()
+        except (AttributeError, loadpsutil().Error):
+            pass
+
+    def close(self):
+        """
+        Kill process and reap it
+        """
+        self.kill()
+        try:
+            self.process.wait(10)
+        except (AttributeError, loadpsutil().Error):
+            pass
+
+
+class WindowBackend(Backend):
+
+    def __init__(self, cmd, ready = 'cpu', timeout = None, startup_timeout = None):
+        Backend.__init__(self, cmd, 'cpu', timeout, startup_timeout)
+        if not loadwin32():
+            raise RuntimeError('The window backend needs pywin32, use the pipe backend instead')
+        self.handle = {}
+
+    def start(self, cwd):
+        """
+        Opens rfoil in the background and remembers its process id
+        """
+        self.startupinfo = win32process.STARTUPINFO()
+        self.startupinfo.dwFlags = win32process.STARTF_USESHOWWINDOW
+        self.startupinfo.wShowWindow = win32con.SW_MINIMIZE
+        self.hp, self.ht, self.pid, self.tid = win32process.CreateProcess(
+                None,    # name
+                self.cmd,     # command line
+                None,    # process attributes
+                None,    # thread attributes
+                0,       # inheritance flag
+                0,       # creation flag
+                None,    # new environment
+                cwd,     # current directory
+                self.startupinfo)
+        self.process = loadpsutil().Process(self.pid)
+        self.getwindow()
+
+    def wcallb(self, hwnd, handle):
+        '''wcallb is callback for EnumThreadWindows and
+        EnumChildWindows. It populates the dict 'handle' with
+        references by class name for each window and child
+        window of the given thread ID.
+        '''
+        handle[win32gui.GetClassName(hwnd)] = hwnd
+        win32gui.EnumChildWindows(hwnd, self.wcallb, handle)
+        return True
+
+    def getwindow(self):
+        """
+        Gets the window handle for the window named 'rfoil01Graphic' in the
+        given process.
+        """
+        start = time.time()
+        while 'rfoil01Graphic' not in self.handle:
+            if self.startup_timeout is not None and time.time() - start > self.startup_timeout:
+                raise StartupTimeout('No rfoil window after {0} seconds'.format(self.startup_timeout))
+            time.sleep(0.1)
+            try:
+                win32gui.EnumThreadWindows(self.tid, self.wcallb, self.handle)
+            except win32gui.error:
+                pass
+
+    def send(self, line):
+        """
+        Sends the line to the rfoil window one character at a time
+        """
+        for c in line + '\n':
+            win32api.PostMessage(
+                self.handle['rfoil01Graphic'],
+                win32con.WM_CHAR,
+                ord(c),
+                0)
+
+    def close(self):
+        self.handle = {}
+        Backend.close(self)
+
+
+class PipeBackend(Backend):
+
+    #rfoil prompts end with the type of the expected input: c>, s>, r>, i>
+    prompt = re.compile(r'\w>\s*$')
+
+    def __init__(self, cmd, ready = 'prompt', timeout = None, startup_timeout = None):
+        Backend.__init__(self, cmd, ready, timeout, startup_timeout)
+        self.popen = None
+        self.reader = None
+        self.condition = Condition()
+        self.prompts = 0
+        self.mark = 0
+        self.eof = False
+        self.tail = ''
+
+    def args(self):
+        """
+        Splits the command line, a path to an executable containing spaces
+        is kept whole. Windows takes the command line as a string.
+        """
+        if not isinstance(self.cmd, str):
+            return list(self.cmd)
+        if os.name == 'nt':
+            return self.cmd
+        if os.path.isfile(self.cmd):
+            return [self.cmd]
+        return shlex.split(self.cmd)
+
+    def start(self, cwd):
+        """
+        Opens the solver with pipes on stdin and stdout
+        """
+        self.popen = subprocess.Popen(self.args(), cwd = cwd or None,
+                                      stdin = subprocess.PIPE,
+                                      stdout = subprocess.PIPE,
+                                      stderr = subprocess.STDOUT)
+        #Only needed to wait for the cpu usage to drop
+        self.process = loadpsutil().Process(self.popen.pid) if self.ready == 'cpu' else None
+        self.prompts = 0
+        self.mark = 0
+        self.eof = False
+        self.tail = ''
+        self.reader = Thread(target = self.read, args = (self.popen.stdout.fileno(),),
+                             daemon = True)
+        self.reader.start()
+
+    def read(self, fd):
+        """
+        Reads the solver output (so that it never blocks on a full pipe) and
+        counts the prompts it prints
+        """
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                data = b''
+            with self.condition:
+                if not data:
+                    self.eof = True
+                    self.condition.notify_all()
+                    return
+                self.tail = (self.tail + data.decode(errors = 'replace'))[-4096:]
+                if self.prompt.search(self.tail):
+                    self.prompts += 1
+                    self.tail = ''
+                    self.condition.notify_all()
+
+    def send(self, line):
+        with self.condition:
+            self.mark = self.prompts
+        self.popen.stdin.write((line + '\n').encode())
+        self.popen.stdin.flush()
+
+    def wait(self, timeout):
+        """
+        Wait for the prompt following the last command sent
+        """
+        if self.ready == 'cpu':
+            return Backend.wait(self, timeout)
+        with self.condition:
+            ready = self.condition.wait_for(lambda: self.prompts > self.mark or self.eof,
+                                            timeout)
+            if not ready:
+                raise SolverTimeout('No prompt after {0} seconds'.format(timeout))
+            if self.prompts <= self.mark:
+                raise SolverError('Solver closed its output')
+
+    def kill(self):
+        popen = self.popen
+        if popen is None:
+            return
+        try:
+            popen.kill()
+        except OSError:
+            pass
+
+    def close(self):
+        if self.popen is None:
+            return
+        self.kill()
+        self.popen.wait()
+        self.reader.join(1)
+        for pipe in (self.popen.stdin, self.popen.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.popen = None
+
+
+backends = {'window': WindowBackend, 'pipe': PipeBackend}
+
+def make_backend(name, cmd, **options):
+    """
+    Returns a new backend of the given name ('window' or 'pipe'), options
+    are ready ('prompt' or 'cpu'), timeout and startup_timeout
+    """
+    if name not in backends:
+        raise ValueError('Unknown backend: {0}'.format(name))
+    return backends[name](cmd, **options)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the command line entry point to compute a batch of polars without
+editing Rfoil_parallel2 or using the GUI. The batch is described in a JSON
+or TOML file:
+
+    cmd = "C:/Program Files (x86)/rFoil/rfoil01.exe"
+    backend = "window"                  # or "pipe"
+    root_directory = "Polars"
+    profiles = ["Naca0018", "profiles/*.dat"]
+    reynolds = ["1e5", "5e5", "1e6"]    # or {from = 1e5, to = 1e7, count = 5}
+    mach = 0.1                          # or a list, one sub-directory M<mach> each
+                                        # (polars, database and tables)
+    angle_max = 20
+    angle_step = 0.5
+    tries_max = 5
+    max_running = 2
+
+The other keys are those of the main block of Rfoil_parallel2 (split,
+max_jobs, timeout, startup_timeout, attempt_timeout, cache_directory,
+cache_size, database_directory, metrics_file, longest_first,
+speculate_after, adaptive, min_step, max_points, table_directory,
+extrapolation). Profile globs take the
+.dat files they match. The job matrix is expanded and the duplicates are
+removed before the run, and the result of every polar is written to a JSON
+manifest.
+
+    python rfoil_batch.py batch.toml [--manifest manifest.json] [--dry-run]
+
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import datetime
+from threading import Lock
+import numpy as np
+try:
+    import tomllib
+except ImportError:
+    #Python < 3.11
+    tomllib = None
+
+#Settings of a batch and their default values
+DEFAULTS = {'cmd': 'C:/Program Files (x86)/rFoil/rfoil01.exe', 'backend': 'window', 'ready': 'prompt',
+            'root_directory': 'Polars', 'profiles': [], 'reynolds': [], 'mach': 0.1,
+            'angle_max': 20, 'angle_step': 0.5, 'tries_max': 5, 'max_running': 1, 'split': 1,
+            'max_jobs': 20, 'timeout': 600, 'startup_timeout': 60, 'attempt_timeout': 3600,
+            'cache_directory': 'PolarCache', 'cache_size': 200e6, 'database_directory': 'PolarDB',
+            'metrics_file': 'rfoil_metrics.jsonl', 'longest_first': True, 'speculate_after': 2,
+            'adaptive': False, 'min_step': 0.125, 'max_points': None, 'manifest': 'manifest.json',
+            'table_directory': 'PolarTables', 'extrapolation': False}
+
+
+def read_spec(path):
+    """
+    Reads a batch file (.toml or .json) and completes it with the defaults
+    """
+    if path.lower().endswith('.toml'):
+        if tomllib is None:
+            raise RuntimeError('TOML batch files need Python 3.11, use JSON instead')
+        with open(path, 'rb') as file:
+            spec = tomllib.load(file)
+    else:
+        with open(path) as file:
+            spec = json.load(file)
+    unknown = sorted(set(spec) - set(DEFAULTS))
+    if unknown:
+        raise ValueError('Unknown settings in {0}: {1}'.format(path, ', '.join(unknown)))
+    return dict(DEFAULTS, **spec)
+
+
+def format_re(value):
+    """
+    Returns the name of a Reynolds number in the polar files (1e6, 2.5e6...)
+    """
+    if isinstance(value, str):
+        return value
+    mantissa, exponent = '{0:.6e}'.format(float(value)).split('e')
+    return '{0}e{1}'.format(mantissa.rstrip('0').rstrip('.'), int(exponent))
+
+
+def expand_reynolds(reynolds):
+    """
+    Returns the Reynolds numbers of a list or of a log spaced grid
+    {from, to, count}
+    """
+    if isinstance(reynolds, dict):
+        values = np.logspace(np.log10(float(reynolds['from'])), np.log10(float(reynolds['to'])),
+                             int(reynolds['count']))
+        return [format_re(float('{0:.3g}'.format(value))) for value in values]
+    if not isinstance(reynolds, list):
+        reynolds = [reynolds]
+    return [format_re(value) for value in reynolds]
+
+
+def expand_profiles(profiles):
+    """
+    Returns the (profile, file) of the profiles, file is None for a profile
+    given by name (Naca or .dat file in the current directory). Raises
+    ValueError for a glob or .dat file matching no file.
+    """
+    result = []
+    for profile in profiles:
+        if glob.has_magic(profile) or profile.lower().endswith('.dat'):
+            paths = sorted(glob.glob(profile))
+            if not paths:
+                raise ValueError('No profile file matches {0}'.format(profile))
+            for path in paths:
+                result.append((os.path.splitext(os.path.basename(path))[0], path))
+        else:
+            result.append((profile, None))
+    return result
+
+
+def expand(spec):
+    """
+    Returns the jobs of the batch without duplicates and the profile files
+    to stage by polar directory
+    """
+    machs = spec['mach'] if isinstance(spec['mach'], list) else [spec['mach']]
+    settings = dict((key, spec[key]) for key in ['cmd', 'angle_max', 'angle_step', 'tries_max', 'backend',
+                                                  'ready', 'timeout', 'startup_timeout', 'attempt_timeout',
+                                                  'split', 'speculate_after', 'adaptive', 'min_step',
+                                                  'max_points'])
+    jobs = []
+    seen = set()
+    staging = {}
+    for mach in machs:
+        #The polar files are named after the Reynolds number only
+        rootdir = spec['root_directory'] if len(machs) == 1 else \
+            os.path.join(spec['root_directory'], 'M{0:g}'.format(float(mach)))
+        for profile, path in expand_profiles(spec['profiles']):
+            for re in expand_reynolds(spec['reynolds']):
+                key = (profile.capitalize(), float(re), float(mach))
+                if key in seen:
+                    continue
+                seen.add(key)
+                jobs.append(dict(settings, rootdir = rootdir, profile = profile, re = re, mach = mach))
+                if path:
+                    staging[os.path.join(rootdir, profile.capitalize())] = path
+    return jobs, staging
+
+
+def stage(spec, staging):
+    """
+    Links the profile files matched by globs in their polar directories
+    """
+    from rfoil_staging import default_store, cache_store
+    store = cache_store(spec['cache_directory']) if spec['cache_directory'] else default_store
+    for directory, path in staging.items():
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        store.stage(path, directory, os.path.basename(directory) + '.dat')
+
+
+class Manifest(object):
+    """
+    Result of every polar of the batch, written as JSON after each polar
+    """
+
+    def __init__(self, path, spec_path):
+        self.path = path
+        self.lock = Lock()
+        self.data = {'spec': os.path.abspath(spec_path),
+                     'started': datetime.datetime.now().isoformat(timespec = 'seconds'),
+                     'finished': None, 'polars': []}
+
+    def add(self, rfoil):
+        polar = getattr(rfoil, 'polar', None)
+        start = getattr(rfoil, 'start_time', None)
+        with self.lock:
+            self.data['polars'].append({
+                'profile': rfoil.profile, 're': rfoil.re, 'mach': rfoil.mach,
+                'file': os.path.join(rfoil.polar_directory, rfoil.polar_file),
+                'success': rfoil.success and rfoil.failure is None, 'failure': rfoil.failure,
+                'failures': rfoil.failures, 'tries': len(rfoil.failures), 'cached': polar is None,
+                'rows': None if polar is None else len(polar),
+                'seconds': None if start is None else round(time.time() - start, 3)})
+        self.write()
+
+    def write(self, finished = False):
+        with self.lock:
+            if finished:
+                self.data['finished'] = datetime.datetime.now().isoformat(timespec = 'seconds')
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(self.data, file, indent = 1)
+            os.replace(temporary, self.path)
+
+
+def subdirectory(spec, directory, rootdir):
+    """
+    Returns the directory of the output of the polars of rootdir: directory
+    itself, or its sub directory M<mach> with several Mach numbers
+    """
+    return os.path.normpath(os.path.join(directory, os.path.relpath(rootdir, spec['root_directory'])))
+
+
+def tables(spec, jobs):
+    """
+    Builds the Reynolds x alpha table of the profiles of the batch, in a sub
+    directory M<mach> of table_directory for each Mach number
+    """
+    from rfoil_tables import build_tables
+    for rootdir in sorted(set(job['rootdir'] for job in jobs)):
+        directory = subdirectory(spec, spec['table_directory'], rootdir)
+        profiles = sorted(set(job['profile'].capitalize() for job in jobs if job['rootdir'] == rootdir))
+        written = build_tables(rootdir, directory, profiles, extrapolation = spec['extrapolation'])
+        print('{0} tables written to {1}'.format(len(written), directory))
+
+
+def run(spec, spec_path, manifest_path = None, dry_run = False):
+    """
+    Computes the batch, returns the manifest data
+    """
+    from rfoil_scheduler import Scheduler
+    jobs, staging = expand(spec)
+    model = None
+    if spec['longest_first'] and spec['metrics_file']:
+        from rfoil_runtime import RuntimeModel
+        model = RuntimeModel.read(spec['metrics_file'])
+    if dry_run:
+        for job in (model.order(jobs) if model else jobs):
+            print('{0} RE{1} M{2}'.format(job['profile'].capitalize(), job['re'], job['mach']))
+        if model:
+            print(model.report(jobs, spec['max_running']))
+        return None
+    from rfoil_sessions import SessionPool
+    stage(spec, staging)
+    pool = SessionPool(spec['max_jobs']) if spec['max_jobs'] else None
+    cache = None
+    if spec['cache_directory']:
+        from rfoil_cache import PolarCache
+        cache = PolarCache(spec['cache_directory'], spec['cache_size'])
+    metrics = None
+    if spec['metrics_file']:
+        from rfoil_metrics import Metrics
+        metrics = Metrics(spec['metrics_file'])
+    manifest = Manifest(manifest_path or spec['manifest'], spec_path)
+    listeners = [manifest.add]
+    if spec['database_directory']:
+        from rfoil_polardb import PolarDB
+        #One database per Mach number, the polars are indexed by profile and file name
+        databases = dict((rootdir, PolarDB(subdirectory(spec, spec['database_directory'], rootdir)))
+                         for rootdir in set(job['rootdir'] for job in jobs))
+        listeners.append(lambda rfoil: rfoil.success and rfoil.failure is None and databases[
+            rfoil.root_directory].update(os.path.join(rfoil.polar_directory, rfoil.polar_file)))
+    for job in jobs:
+        job.update(cache = cache, metrics = metrics)
+    try:
+        Scheduler(spec['max_running'], pool, listeners, model).run(jobs)
+    finally:
+        if pool:
+            pool.close()
+        if metrics:
+            metrics.close()
+        manifest.write(finished = True)
+    if spec['table_directory']:
+        tables(spec, jobs)
+    if cache:
+        print(cache.report())
+    return manifest.data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Computes the polars of a batch file (JSON or TOML)')
+    parser.add_argument('spec', help = 'batch file')
+    parser.add_argument('--manifest', default = None, help = 'results file (default: manifest setting)')
+    parser.add_argument('--dry-run', action = 'store_true', help = 'only print the jobs')
+    args = parser.parse_args()
+    data = run(read_spec(args.spec), args.spec, args.manifest, args.dry_run)
+    if data is not None:
+        failed = [polar for polar in data['polars'] if not polar['success']]
+        print('{0} polars, {1} failed'.format(len(data['polars']), len(failed)))
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is a benchmark of the orchestration of Rfoil_parallel2 (Rfoil Threads
+run by the Scheduler with warm sessions) using the fake solver of
+fake_rfoil, so it runs on Linux without rfoil. The same batch of polars is
+computed for every combination of number of workers (max_running), number of
+tries and split, and the throughput (polars per hour), the median and 95th
+percentile time of a polar and the cpu time used by the orchestration itself
+(this process, the solvers are counted apart) are reported. The fake solver
+burns solve_time of cpu per angle of attack, fails to converge with a
+probability depending on the Reynolds number and crashes now and then.
+
+Example: python rfoil_benchmark.py --workers 1 2 4 8 --tries 1 3
+
+"""
+
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+from rfoil_sessions import SessionPool
+from rfoil_scheduler import Scheduler, make_jobs
+from fake_rfoil import fake_cmd
+try:
+    import resource
+except ImportError:
+    #Windows
+    resource = None
+
+
+class Recorder(object):
+    """
+    Keeps the events of the Rfoil Threads in memory, used instead of a
+    Metrics object (see rfoil_metrics)
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event, **fields):
+        if event in ['polar', 'try']:
+            fields['event'] = event
+            self.events.append(fields)
+
+
+def children_cpu():
+    """
+    Returns the cpu time of the finished solver processes
+    """
+    if resource is None:
+        return float('nan')
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(workers, tries_max, split, settings):
+    """
+    Computes the batch with max_running = workers and returns the
+    measurements
+    """
+    root_directory = tempfile.mkdtemp(prefix = 'rfoil_benchmark')
+    recorder = Recorder()
+    pool = SessionPool(settings['max_jobs']) if settings['max_jobs'] else None
+    cmd = fake_cmd(solve_time = settings['solve_time'], crash = settings['crash'],
+                   nonconv_re = settings['nonconv_re'])
+    jobs = make_jobs(settings['profiles'], settings['reynolds'], cmd = cmd, rootdir = root_directory,
+                     mach = 0.1, angle_max = settings['angle_max'], angle_step = settings['angle_step'],
+                     tries_max = tries_max, backend = 'pipe', ready = 'prompt',
+                     timeout = settings['timeout'], startup_timeout = settings['timeout'],
+                     split = split, metrics = recorder)
+    cpu = time.process_time()
+    solver_cpu = children_cpu()
+    start = time.time()
+    try:
+        with redirect_stdout(io.StringIO()):
+            rfoils = Scheduler(workers, pool).run(jobs)
+            if pool:
+                pool.close()
+    finally:
+        shutil.rmtree(root_directory, ignore_errors = True)
+    wall = time.time() - start
+    cpu = time.process_time() - cpu
+    solver_cpu = children_cpu() - solver_cpu
+    durations = [event['duration'] for event in recorder.events if event['event'] == 'polar']
+    tries = [event for event in recorder.events if event['event'] == 'try']
+    return {'workers': workers, 'tries_max': tries_max, 'split': split,
+            'polars': len(rfoils), 'failed': sum(rfoil.failure is not None for rfoil in rfoils),
+            'tries': len(tries), 'crashes': sum(event['failure'] == 'crash' for event in tries),
+            'wall': wall, 'polars_per_hour': len(rfoils) / wall * 3600,
+            'p50': float(np.percentile(durations, 50)) if durations else float('nan'),
+            'p95': float(np.percentile(durations, 95)) if durations else float('nan'),
+            'orchestrator_cpu': cpu, 'solver_cpu': solver_cpu}
+
+
+def report(results):
+    lines = ['workers tries split  polars/h   p50 (s)   p95 (s)  orch. cpu (s)  solver cpu (s)  tries  crashes  failed']
+    for result in results:
+        lines.append('{workers:7d} {tries_max:5d} {split:5d} {polars_per_hour:9.0f} {p50:9.2f} {p95:9.2f} '
+                     '{orchestrator_cpu:14.2f} {solver_cpu:15.2f} {tries:6d} {crashes:8d} {failed:7d}'.format(**result))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Throughput of the rfoil orchestration with a fake solver')
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, 2, 4],
+                        help = 'values of max_running to benchmark')
+    parser.add_argument('--tries', type = int, nargs = '+', default = [1, 3],
+                        help = 'values of tries_max to benchmark')
+    parser.add_argument('--split', type = int, nargs = '+', default = [1],
+                        help = 'values of split to benchmark')
+    parser.add_argument('--profiles', nargs = '+', default = ['Naca0012', 'Naca0018', 'Naca2412', 'Naca4415'])
+    parser.add_argument('--reynolds', nargs = '+', default = ['1e5', '1e6', '1e7'])
+    parser.add_argument('--angle-max', type = float, default = 10)
+    parser.add_argument('--angle-step', type = float, default = 1)
+    parser.add_argument('--solve-time', type = float, default = 0.01,
+                        help = 'cpu time of the fake solver per angle of attack, in seconds')
+    parser.add_argument('--crash', type = float, default = 0.002,
+                        help = 'probability for the fake solver to crash on each point')
+    parser.add_argument('--nonconv-re', default = '1e5:0.5,1e6:0.2,1e7:0.05',
+                        help = 'probability of non-convergence by Reynolds number')
+    parser.add_argument('--max-jobs', type = int, default = 20,
+                        help = 'polars per warm session (0 to start rfoil for every polar)')
+    parser.add_argument('--timeout', type = float, default = 60)
+    parser.add_argument('--output', default = None,
+                        help = 'file the results are appended to as JSON lines')
+    args = parser.parse_args()
+    settings = {'profiles': args.profiles, 'reynolds': args.reynolds, 'angle_max': args.angle_max,
+                'angle_step': args.angle_step, 'solve_time': args.solve_time, 'crash': args.crash,
+                'nonconv_re': dict((float(re), float(probability)) for re, probability in
+                                   (item.split(':') for item in args.nonconv_re.split(',') if item)),
+                'max_jobs': args.max_jobs, 'timeout': args.timeout}
+    results = []
+    for split in args.split:
+        for tries_max in args.tries:
+            for workers in args.workers:
+                result = run_case(workers, tries_max, split, settings)
+                results.append(result)
+                print(report([result]).splitlines()[1], file = sys.stderr)
+                if args.output:
+                    with open(args.output, 'a') as file:
+                        file.write(json.dumps(dict(result, time = time.time(), settings = settings)) + '\n')
+    print(report(results))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is an on disk cache of the polars computed by the Rfoil Thread described
+in Rfoil_parallel2. A polar is stored under the hash of everything that
+changes its result: the geometry (contents of the profile .dat file or the
+Naca designation), the Reynolds and Mach numbers, the angle range and step,
+the number of tries, the solver executable and the refinement options.
+Running the same batch again returns the cached polars instantly and only
+the changed combinations are computed by rfoil. The least recently used
+polars are removed when the cache grows over max_size bytes.
+
+"""
+
+import os
+import shlex
+import shutil
+import hashlib
+from threading import Lock, get_ident
+
+
+def solver_identity(cmd):
+    """
+    Identifies the solver by its command line and the size and modification
+    time of the files it runs
+    """
+    if not isinstance(cmd, str):
+        tokens = list(cmd)
+    elif os.path.isfile(cmd):
+        tokens = [cmd]
+    else:
+        tokens = shlex.split(cmd, posix = os.name != 'nt')
+    identity = [str(cmd)]
+    for token in tokens:
+        token = token.strip('"')
+        if os.path.isfile(token):
+            stat = os.stat(token)
+            identity.append('{0}:{1}:{2}'.format(os.path.abspath(token), stat.st_size, int(stat.st_mtime)))
+    return identity
+
+
+class PolarCache(object):
+
+    def __init__(self, directory = 'PolarCache', max_size = 200e6):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, geometry, re, mach, angle_max, angle_step, tries_max, cmd, options = None):
+        """
+        Returns the cache key of a polar, geometry is the contents of the
+        profile file (bytes) or the Naca designation, options are any other
+        settings changing the result
+        """
+        if isinstance(geometry, str):
+            geometry = geometry.encode()
+        settings = [float(re), float(mach), float(angle_max), float(angle_step), int(tries_max)]
+        digest = hashlib.sha1(geometry)
+        digest.update(repr(settings).encode())
+        digest.update(repr(solver_identity(cmd)).encode())
+        if options is not None:
+            digest.update(repr(options).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.dat')
+
+    def get(self, key, destination):
+        """
+        Copies the cached polar to destination, returns False on a miss
+        """
+        path = self.path(key)
+        try:
+            shutil.copyfile(path, destination)
+            os.utime(path, None) #Most recently used
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return False
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def put(self, key, source):
+        """
+        Stores the polar file source under key
+        """
+        path = self.path(key)
+        temporary = '{0}.{1}.tmp'.format(path, get_ident())
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, path)
+        self.evict()
+
+    def entries(self):
+        """
+        Returns the (last use, size, path) of the cached polars
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.dat'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used polars until the cache is smaller
+        than max_size
+        """
+        if not self.max_size:
+            return
+        with self.lock:
+            entries = sorted(self.entries())
+            size = sum(entry[1] for entry in entries)
+            while entries and size > self.max_size:
+                last_use, entry_size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                size -= entry_size
+
+    def stats(self):
+        """
+        Returns the hit/miss statistics and the size of the cache
+        """
+        entries = self.entries()
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(entries), 'size': sum(entry[1] for entry in entries)}
+
+    def report(self):
+        stats = self.stats()
+        return 'Cache: {hits} hits, {misses} misses, {entries} polars ({size} bytes)'.format(**stats)
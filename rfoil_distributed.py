@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This spreads the polars of a batch over several computers. The Coordinator
+serves the profile x Reynolds job matrix over TCP, Workers (on the same or
+on other machines) take the jobs one at a time, compute them with the Rfoil
+Thread of Rfoil_parallel2 and send the polar file and the log lines back to
+the coordinator, which writes them in its own Polars tree. A job is leased
+to a worker for lease seconds, renewed while the worker computes it: when a
+worker dies or loses the network its lease expires and the job is given to
+another worker (max_leases times at most).
+The protocol is one JSON line per connection in each direction.
+
+Coordinator: python rfoil_distributed.py coordinator --profiles Naca0018 --reynolds 1e6 1e7
+Worker:      python rfoil_distributed.py worker --coordinator host:5170 --cmd path/to/rfoil01.exe
+
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import itertools
+import socketserver
+from collections import deque
+from threading import Thread, Condition, Event
+from Rfoil_parallel2 import Rfoil
+from rfoil_sessions import SessionPool, naca
+from rfoil_scheduler import make_jobs
+from rfoil_locks import directory_lock
+
+PORT = 5170
+#Numbers the Workers of a process
+worker_numbers = itertools.count(1)
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode())
+            response = self.server.coordinator.handle(request)
+        except Exception as error:
+            response = {'error': str(error) or repr(error)}
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator(object):
+
+    def __init__(self, jobs, root_directory = 'Polars', host = '127.0.0.1', port = PORT,
+                 lease = 120, max_leases = 5, token = None):
+        self.root_directory = root_directory
+        self.lease = lease
+        self.max_leases = max_leases
+        self.token = token
+        self.jobs = {}
+        for i, job in enumerate(jobs):
+            job = dict(job)
+            profile = job['profile'].capitalize()
+            #The workers may not have the profile file
+            if not naca(profile) and os.path.exists(profile + '.dat'):
+                with open(profile + '.dat') as file:
+                    job['profile_data'] = file.read()
+            self.jobs[i] = job
+        self.pending = deque(sorted(self.jobs))
+        #Job id: [worker, deadline]
+        self.leases = {}
+        self.lease_count = dict((i, 0) for i in self.jobs)
+        self.results = {}
+        self.condition = Condition()
+        self.server = Server((host, port), Handler)
+        self.server.coordinator = self
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def handle(self, request):
+        """
+        Answers a request of a worker
+        """
+        if self.token and request.get('token') != self.token:
+            return {'error': 'invalid token'}
+        operation = request.get('op')
+        if operation == 'get':
+            return self.get(request['worker'])
+        elif operation == 'renew':
+            return self.renew(request['worker'], request['id'])
+        elif operation == 'result':
+            return self.result(request)
+        return {'error': 'unknown operation {0}'.format(operation)}
+
+    def expire(self):
+        """
+        Puts the jobs of expired leases back at the front of the queue, must
+        be called with the condition held
+        """
+        now = time.time()
+        for job_id, (worker, deadline) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[job_id]
+                self.pending.appendleft(job_id)
+                print('Lease of job {0} by {1} expired'.format(job_id, worker))
+
+    def get(self, worker):
+        """
+        Leases the next job to worker, tells it to wait while jobs are leased
+        to other workers, or that everything is done
+        """
+        with self.condition:
+            self.expire()
+            while self.pending:
+                job_id = self.pending.popleft()
+                if job_id in self.results:
+                    continue
+                if self.lease_count[job_id] >= self.max_leases:
+                    self.finish(job_id, {'success': False, 'failure': 'lease expired {0} times'.format(self.max_leases)})
+                    continue
+                self.lease_count[job_id] += 1
+                self.leases[job_id] = [worker, time.time() + self.lease]
+                return {'id': job_id, 'job': self.jobs[job_id], 'lease': self.lease}
+            if self.leases:
+                return {'wait': min(1., self.lease / 4.)}
+            return {'done': True}
+
+    def renew(self, worker, job_id):
+        with self.condition:
+            lease = self.leases.get(job_id)
+            if lease is None or lease[0] != worker:
+                return {'ok': False}
+            lease[1] = time.time() + self.lease
+            return {'ok': True}
+
+    def result(self, request):
+        """
+        Writes the polar file and the log lines of a finished job, the first
+        result of a job is kept
+        """
+        job_id = request['id']
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {'error': 'unknown job {0}'.format(job_id)}
+        #The files are named after the job, never after the request
+        profile = job['profile'].capitalize()
+        directory = os.path.join(self.root_directory, profile)
+        #Held until the result is recorded: the result of an expired lease
+        #and the one of its new lease are not both written
+        with self.condition:
+            if job_id in self.results:
+                return {'ok': True}
+            if not os.path.exists(directory):
+                os.makedirs(directory, exist_ok = True)
+            with directory_lock(directory):
+                if request.get('polar') is not None:
+                    path = os.path.join(directory, 'RE' + job['re'] + '.dat')
+                    temporary = path + '.tmp'
+                    with open(temporary, 'w') as file:
+                        file.write(request['polar'])
+                    os.replace(temporary, path)
+                if request.get('log'):
+                    with open(os.path.join(directory, profile + '.log'), 'a') as file:
+                        file.write(request['log'])
+            self.finish(job_id, {'success': request['success'], 'failure': request['failure'],
+                                 'worker': request['worker']})
+        print('Job {0} ({1} RE{2}) from {3}: {4}'.format(job_id, profile, job['re'],
+                                                        request['worker'], request['failure'] or 'success'))
+        return {'ok': True}
+
+    def finish(self, job_id, result):
+        """
+        Records the result of a job, must be called with the condition held
+        """
+        self.results.setdefault(job_id, result)
+        self.leases.pop(job_id, None)
+        if job_id in self.pending:
+            self.pending.remove(job_id)
+        self.condition.notify_all()
+
+    def serve(self, linger = 5.):
+        """
+        Serves the jobs until they are all done and returns the results by
+        job id, the server stays up for linger seconds afterwards to tell
+        the workers to stop
+        """
+        thread = Thread(target = self.server.serve_forever, daemon = True)
+        thread.start()
+        with self.condition:
+            while len(self.results) < len(self.jobs):
+                #Wake up to expire the leases even when no worker asks for jobs
+                self.condition.wait(min(1., self.lease / 4.))
+                self.expire()
+        time.sleep(linger)
+        self.server.shutdown()
+        self.server.server_close()
+        return self.results
+
+
+class Worker(object):
+
+    def __init__(self, address, cmd, work_directory = 'Polars', name = None, max_running = 1,
+                 max_jobs = 20, token = None, retries = 10, **options):
+        self.address = address
+        self.cmd = cmd
+        self.work_directory = work_directory
+        #Several Workers may run in one process (tests on localhost)
+        self.name = name or '{0}:{1}:{2}'.format(socket.gethostname(), os.getpid(), next(worker_numbers))
+        self.max_running = max(int(max_running), 1)
+        self.pool = SessionPool(max_jobs) if max_jobs else None
+        self.token = token
+        self.retries = retries
+        #backend, ready, timeout, startup_timeout, attempt_timeout, split
+        self.options = options
+
+    def call(self, request):
+        """
+        Sends a request to the coordinator and returns its answer
+        """
+        request = dict(request, worker = self.name, token = self.token)
+        with socket.create_connection(self.address, timeout = 60) as connection:
+            file = connection.makefile('rwb')
+            file.write((json.dumps(request) + '\n').encode())
+            file.flush()
+            line = file.readline()
+        if not line:
+            raise OSError('No answer from the coordinator')
+        response = json.loads(line.decode())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def callretrying(self, request):
+        """
+        Sends a request, retrying while the coordinator cannot be reached or
+        answers with an error, returns None when it is gone or keeps failing
+        """
+        for attempt in range(self.retries):
+            try:
+                return self.call(request)
+            except OSError:
+                pass
+            except RuntimeError as error:
+                print('Worker {0}: {1} failed: {2}'.format(self.name, request['op'], error))
+            time.sleep(min(2 ** attempt * 0.1, 10.))
+        return None
+
+    def run(self):
+        """
+        Computes jobs until the coordinator has no more
+        """
+        threads = [Thread(target = self.loop, daemon = True) for i in range(self.max_running)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.pool:
+            self.pool.close()
+
+    def loop(self):
+        last_directory = None
+        while True:
+            response = self.callretrying({'op': 'get'})
+            if response is None or response.get('done'):
+                return
+            if 'wait' in response:
+                time.sleep(response['wait'])
+                continue
+            rfoil = self.work(response['id'], response['job'], response['lease'])
+            #The warm sessions of the previous profile are not needed any more
+            if self.pool and last_directory not in [None, rfoil.polar_directory]:
+                self.pool.discard(last_directory)
+            last_directory = rfoil.polar_directory
+
+    def renew(self, job_id, lease, stop):
+        while not stop.wait(lease / 3.):
+            try:
+                self.call({'op': 'renew', 'id': job_id})
+            except (OSError, RuntimeError):
+                pass
+
+    def work(self, job_id, job, lease):
+        """
+        Computes a job with an Rfoil Thread (run in this thread) and sends
+        the polar and the new log lines to the coordinator
+        """
+        job = dict(job)
+        profile_data = job.pop('profile_data', None)
+        settings = dict(self.options)
+        settings.update(job)
+        rfoil = Rfoil(cmd = self.cmd, rootdir = self.work_directory, pool = self.pool, **settings)
+        if not os.path.exists(rfoil.polar_directory):
+            os.makedirs(rfoil.polar_directory, exist_ok = True)
+        log_path = os.path.join(rfoil.polar_directory, rfoil.log_file)
+        with directory_lock(rfoil.polar_directory):
+            if profile_data is not None:
+                with open(os.path.join(rfoil.polar_directory, rfoil.profile_file), 'w') as file:
+                    file.write(profile_data)
+            log_start = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        stop = Event()
+        Thread(target = self.renew, args = (job_id, lease, stop), daemon = True).start()
+        try:
+            rfoil.run()
+            failure = rfoil.failure
+        except Exception as error:
+            failure = str(error) or repr(error)
+        finally:
+            stop.set()
+        polar_path = os.path.join(rfoil.polar_directory, rfoil.polar_file)
+        polar = log = None
+        with directory_lock(rfoil.polar_directory):
+            if os.path.exists(polar_path):
+                with open(polar_path) as file:
+                    polar = file.read()
+            if os.path.exists(log_path):
+                with open(log_path) as file:
+                    file.seek(log_start)
+                    log = file.read()
+        self.callretrying({'op': 'result', 'id': job_id, 'polar': polar, 'log': log,
+                           'success': rfoil.success and failure is None, 'failure': failure})
+        return rfoil
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Distributed rfoil polar generation')
+    parser.add_argument('--token', default = None, help = 'shared secret of the coordinator and the workers')
+    subparsers = parser.add_subparsers(dest = 'mode')
+    coordinator_parser = subparsers.add_parser('coordinator', help = 'serve the jobs')
+    coordinator_parser.add_argument('--host', default = '127.0.0.1',
+                                    help = 'interface to listen on (0.0.0.0 for all)')
+    coordinator_parser.add_argument('--port', type = int, default = PORT)
+    coordinator_parser.add_argument('--profiles', nargs = '+', required = True)
+    coordinator_parser.add_argument('--reynolds', nargs = '+', required = True)
+    coordinator_parser.add_argument('--mach', type = float, default = 0.1)
+    coordinator_parser.add_argument('--angle-max', type = float, default = 20)
+    coordinator_parser.add_argument('--angle-step', type = float, default = 0.5)
+    coordinator_parser.add_argument('--tries-max', type = int, default = 5)
+    coordinator_parser.add_argument('--root-directory', default = 'Polars')
+    coordinator_parser.add_argument('--lease', type = float, default = 120,
+                                    help = 'seconds before the job of a silent worker is given to another')
+    worker_parser = subparsers.add_parser('worker', help = 'compute jobs')
+    worker_parser.add_argument('--coordinator', default = '127.0.0.1:{0}'.format(PORT), help = 'host:port')
+    worker_parser.add_argument('--cmd', required = True, help = 'path to rfoil')
+    worker_parser.add_argument('--work-directory', default = 'Polars')
+    worker_parser.add_argument('--name', default = None)
+    worker_parser.add_argument('--max-running', type = int, default = 1)
+    worker_parser.add_argument('--backend', default = 'window', choices = ['window', 'pipe'])
+    worker_parser.add_argument('--ready', default = 'prompt', choices = ['prompt', 'cpu'])
+    worker_parser.add_argument('--timeout', type = float, default = 600)
+    worker_parser.add_argument('--startup-timeout', type = float, default = 60)
+    worker_parser.add_argument('--attempt-timeout', type = float, default = 3600)
+    worker_parser.add_argument('--split', type = int, default = 1)
+    args = parser.parse_args()
+    if args.mode == 'coordinator':
+        jobs = make_jobs(args.profiles, args.reynolds, mach = args.mach, angle_max = args.angle_max,
+                         angle_step = args.angle_step, tries_max = args.tries_max)
+        coordinator = Coordinator(jobs, args.root_directory, args.host, args.port, args.lease, token = args.token)
+        print('Serving {0} jobs on {1}:{2}'.format(len(jobs), *coordinator.address))
+        results = coordinator.serve()
+        failed = [job_id for job_id, result in results.items() if not result['success']]
+        print('{0} polars, {1} failed'.format(len(results), len(failed)))
+        sys.exit(1 if failed else 0)
+    elif args.mode == 'worker':
+        Worker(parse_address(args.coordinator), args.cmd, args.work_directory, args.name,
+               args.max_running, token = args.token, backend = args.backend, ready = args.ready,
+               timeout = args.timeout, startup_timeout = args.startup_timeout,
+               attempt_timeout = args.attempt_timeout, split = args.split).run()
+    else:
+        parser.print_help()
@@ -1,140 +1,485 @@
-# -*- coding: utf-8 -*-
-"""
-@author: Renaud Laine
-
-This is the user interface to use the Rfoil Thread described in Rfoil_parallel2
-
-"""
-
-from Rfoil_parallel2 import Rfoil
-import tkinter as tk
-import re
-from threading import RLock
-import os
-import time, datetime
-
-lock = RLock()
-
-class GUI(tk.Frame):
-
-    def __init__(self, window, **kwargs):
-        tk.Frame.__init__(self, window, **kwargs)
-        self.profiles = []
-        self.reynolds = []
-        self.mach = tk.DoubleVar()
-        self.mach.set(0.1)
-        self.angle_max = tk.DoubleVar()
-        self.angle_max.set(20)
-        self.angle_step = tk.DoubleVar()
-        self.angle_step.set(0.5)
-        self.tries_max = tk.IntVar()
-        self.tries_max.set(5)
-        self.root_directory = tk.StringVar()
-        self.root_directory.set('Polars')
-        self.cmd = tk.StringVar()
-        self.cmd.set('C:/rFoil/rfoil01.exe')
-        self.max_running = tk.IntVar()
-        self.max_running.set(2)
-        self.profiles_string = tk.StringVar()
-        self.profiles_string.set('Naca0018')
-        self.reynolds_string = tk.StringVar()
-        self.reynolds_string.set('1e5 5e5 1e6 5e6 1e7 5e7')
-        self.button_text = tk.StringVar()
-        self.button_text.set('Calculate polars')
-
-        self.grid()
-
-        self.rfoil_path_label = tk.Label(self, text = 'Rfoil path: ', font = ("Times", 10,"bold"))
-        self.rfoil_path_label.grid(row = 0, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.rfoil_path_entry = tk.Entry(self, width = 100, textvariable = self.cmd)
-        self.rfoil_path_entry.grid(row = 0, column = 1)
-        self.rootdir_label = tk.Label(self, text = 'Root directory: ', font = ("Times", 10,"bold"))
-        self.rootdir_label.grid(row = 1, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.rootdir_entry = tk.Entry(self, width = 100, textvariable = self.root_directory)
-        self.rootdir_entry.grid(row = 1, column = 1)
-        self.profiles_label = tk.Label(self, text = 'Profiles: ', font = ("Times", 10,"bold"))
-        self.profiles_label.grid(row = 2, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.profiles_entry = tk.Entry(self, width = 100, textvariable = self.profiles_string)
-        self.profiles_entry.grid(row = 2, column = 1)
-        self.reynolds_label = tk.Label(self, text = 'Reynolds: ', font = ("Times", 10,"bold"))
-        self.reynolds_label.grid(row = 3, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.reynolds_entry = tk.Entry(self, width = 100, textvariable = self.reynolds_string)
-        self.reynolds_entry.grid(row = 3, column = 1)
-        self.mach_label = tk.Label(self, text = 'Mach: ', font = ("Times", 10,"bold"))
-        self.mach_label.grid(row = 4, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.mach_entry = tk.Entry(self, width = 100, textvariable = self.mach)
-        self.mach_entry.grid(row = 4, column = 1)
-        self.angle_max_label = tk.Label(self, text = 'Angle max: ', font = ("Times", 10,"bold"))
-        self.angle_max_label.grid(row = 5, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.angle_max_entry = tk.Entry(self, width = 100, textvariable = self.angle_max)
-        self.angle_max_entry.grid(row = 5, column = 1)
-        self.angle_step_label = tk.Label(self, text = 'Angle step: ', font = ("Times", 10,"bold"))
-        self.angle_step_label.grid(row = 6, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.angle_step_entry = tk.Entry(self, width = 100, textvariable = self.angle_step)
-        self.angle_step_entry.grid(row = 6, column = 1)
-        self.tries_max_label = tk.Label(self, text = 'Tries max: ', font = ("Times", 10,"bold"))
-        self.tries_max_label.grid(row = 7, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.tries_max_entry = tk.Entry(self, width = 100, textvariable = self.tries_max)
-        self.tries_max_entry.grid(row = 7, column = 1)
-        self.max_running_label = tk.Label(self, text = 'Max running: ', font = ("Times", 10,"bold"))
-        self.max_running_label.grid(row = 8, column = 0, sticky = tk.W, padx = 10, pady = 5)
-        self.max_running_entry = tk.Entry(self, width = 100, textvariable = self.max_running)
-        self.max_running_entry.grid(row = 8, column = 1)
-        self.run_button = tk.Button(self, textvariable = self.button_text, command = self.launch)
-        self.run_button.grid(row = 9, column = 0, columnspan = 2)
-
-    def get_profiles(self):
-        self.profiles = re.split('[,; ]+', self.profiles_string.get())
-
-    def get_reynolds(self):
-        self.reynolds = re.split('[,; ]+', self.reynolds_string.get())
-        
-    def launch(self):
-        self.get_profiles()
-        self.get_reynolds()
-        if self.root_directory.get() and not os.path.exists(self.root_directory.get()):
-            os.mkdir(self.root_directory.get())
-        for profile in self.profiles:
-            profile = profile.capitalize()
-            ###Make some room for the incoming polars
-            polar_directory = os.path.join(self.root_directory.get(), profile)
-            if not os.path.exists(polar_directory):
-                os.mkdir(polar_directory)
-            print('Profile: ' + profile)
-            now = datetime.datetime.now()
-            log_file = profile + '.log'
-            with lock:
-                log = open(os.path.join(polar_directory, log_file), 'a')
-                log.write(now.strftime("\n----- %Y-%m-%d %H:%M -----\n"))
-                log.close()
-            threads = [None for i in range(len(self.reynolds))]
-            for i, Re in enumerate(self.reynolds):
-                threads[i] = Rfoil(cmd = self.cmd.get(), rootdir = self.root_directory.get(),
-                                   profile = profile, re = Re, mach = self.mach.get(),
-                                   angle_max = self.angle_max.get(), angle_step = self.angle_step.get(),
-                                   tries_max = self.tries_max.get())
-            running_threads = threads[:self.max_running.get()]
-            threads = threads[self.max_running.get():]
-            for thread in running_threads:
-                thread.start()
-            while len(threads) > 0:
-                for i, thread in enumerate(running_threads):
-                    if not thread.isAlive():
-                        running_threads[i] = threads.pop(0)
-                        running_threads[i].start()
-                time.sleep(0.1)
-            for thread in running_threads:
-                thread.join()
-            delta_t = datetime.datetime.now()-now
-            print('Total time: {0} seconds'.format(delta_t.seconds))
-            with lock:
-                log = open(os.path.join(polar_directory, log_file), 'a')
-                log.write('Total time: {0} seconds\n'.format(delta_t.seconds))
-                log.close()
-
-
-if __name__ == '__main__':
-    window = tk.Tk()
-    window.wm_title("Rfoil GUI")
-    gui = GUI(window)
-    gui.mainloop()
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the user interface to use the Rfoil Thread described in Rfoil_parallel2
+through the scheduler of rfoil_scheduler.
+The batch runs in a background thread so that the window stays responsive.
+The polars post their progress (start, result of each try, rows, end) to a
+queue which the Tk loop empties every poll_interval milliseconds into the
+table of the jobs, with the estimated remaining time of the batch. Pause
+stops new polars from starting, Cancel stops the selected polars (all of them
+if none is selected) and frees their solvers.
+The live polars window plots CL-alpha and CL-CD of the running polars while
+rfoil computes them: the polar files are followed with PolarTail (only the
+new rows are read) and the plots are redrawn at most every refresh_interval
+milliseconds, when rows were added.
+
+"""
+
+from rfoil_scheduler import Scheduler, make_jobs
+from rfoil_runtime import angle_count
+from Rfoil_parallel2 import CANCELLED
+from rfoil_polar import PolarTail
+from threading import Thread
+import tkinter as tk
+import tkinter.ttk as ttk
+import datetime
+import queue
+import time
+import numpy as np
+import re
+import os
+
+#States of the finished polars in the table
+FINISHED = ('success', 'failed', 'cancelled')
+
+
+class Progress(object):
+    """
+    Metrics object of the polars (see rfoil_metrics) posting their progress
+    events to a queue read by the GUI
+    """
+    events = {'start', 'try', 'speculative', 'polar'}
+
+    def __init__(self, events_queue):
+        self.queue = events_queue
+
+    def record(self, event, **fields):
+        if event in self.events:
+            self.queue.put((event, fields))
+
+
+class GUI(tk.Frame):
+
+    ###Time in milliseconds between two updates of the table
+    poll_interval = 200
+
+    def __init__(self, window, **kwargs):
+        tk.Frame.__init__(self, window, **kwargs)
+        self.profiles = []
+        self.reynolds = []
+        self.mach = tk.DoubleVar()
+        self.mach.set(0.1)
+        self.angle_max = tk.DoubleVar()
+        self.angle_max.set(20)
+        self.angle_step = tk.DoubleVar()
+        self.angle_step.set(0.5)
+        self.tries_max = tk.IntVar()
+        self.tries_max.set(5)
+        self.root_directory = tk.StringVar()
+        self.root_directory.set('Polars')
+        self.cmd = tk.StringVar()
+        self.cmd.set('C:/rFoil/rfoil01.exe')
+        self.max_running = tk.IntVar()
+        self.max_running.set(2)
+        self.profiles_string = tk.StringVar()
+        self.profiles_string.set('Naca0018')
+        self.reynolds_string = tk.StringVar()
+        self.reynolds_string.set('1e5 5e5 1e6 5e6 1e7 5e7')
+        self.button_text = tk.StringVar()
+        self.button_text.set('Calculate polars')
+        self.pause_text = tk.StringVar()
+        self.pause_text.set('Pause')
+        self.status = tk.StringVar()
+        self.events = queue.Queue()
+        self.scheduler = None
+        self.thread = None
+        #Job key (profile, re): expected and obtained rows
+        self.expected = {}
+        self.rows = {}
+        self.start_time = None
+
+        self.grid()
+
+        self.rfoil_path_label = tk.Label(self, text = 'Rfoil path: ', font = ("Times", 10,"bold"))
+        self.rfoil_path_label.grid(row = 0, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.rfoil_path_entry = tk.Entry(self, width = 100, textvariable = self.cmd)
+        self.rfoil_path_entry.grid(row = 0, column = 1)
+        self.rootdir_label = tk.Label(self, text = 'Root directory: ', font = ("Times", 10,"bold"))
+        self.rootdir_label.grid(row = 1, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.rootdir_entry = tk.Entry(self, width = 100, textvariable = self.root_directory)
+        self.rootdir_entry.grid(row = 1, column = 1)
+        self.profiles_label = tk.Label(self, text = 'Profiles: ', font = ("Times", 10,"bold"))
+        self.profiles_label.grid(row = 2, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.profiles_entry = tk.Entry(self, width = 100, textvariable = self.profiles_string)
+        self.profiles_entry.grid(row = 2, column = 1)
+        self.reynolds_label = tk.Label(self, text = 'Reynolds: ', font = ("Times", 10,"bold"))
+        self.reynolds_label.grid(row = 3, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.reynolds_entry = tk.Entry(self, width = 100, textvariable = self.reynolds_string)
+        self.reynolds_entry.grid(row = 3, column = 1)
+        self.mach_label = tk.Label(self, text = 'Mach: ', font = ("Times", 10,"bold"))
+        self.mach_label.grid(row = 4, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.mach_entry = tk.Entry(self, width = 100, textvariable = self.mach)
+        self.mach_entry.grid(row = 4, column = 1)
+        self.angle_max_label = tk.Label(self, text = 'Angle max: ', font = ("Times", 10,"bold"))
+        self.angle_max_label.grid(row = 5, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.angle_max_entry = tk.Entry(self, width = 100, textvariable = self.angle_max)
+        self.angle_max_entry.grid(row = 5, column = 1)
+        self.angle_step_label = tk.Label(self, text = 'Angle step: ', font = ("Times", 10,"bold"))
+        self.angle_step_label.grid(row = 6, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.angle_step_entry = tk.Entry(self, width = 100, textvariable = self.angle_step)
+        self.angle_step_entry.grid(row = 6, column = 1)
+        self.tries_max_label = tk.Label(self, text = 'Tries max: ', font = ("Times", 10,"bold"))
+        self.tries_max_label.grid(row = 7, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.tries_max_entry = tk.Entry(self, width = 100, textvariable = self.tries_max)
+        self.tries_max_entry.grid(row = 7, column = 1)
+        self.max_running_label = tk.Label(self, text = 'Max running: ', font = ("Times", 10,"bold"))
+        self.max_running_label.grid(row = 8, column = 0, sticky = tk.W, padx = 10, pady = 5)
+        self.max_running_entry = tk.Entry(self, width = 100, textvariable = self.max_running)
+        self.max_running_entry.grid(row = 8, column = 1)
+        self.buttons = tk.Frame(self)
+        self.buttons.grid(row = 9, column = 0, columnspan = 2)
+        self.run_button = tk.Button(self.buttons, textvariable = self.button_text, command = self.launch)
+        self.run_button.grid(row = 0, column = 0, padx = 5)
+        self.pause_button = tk.Button(self.buttons, textvariable = self.pause_text, command = self.pause,
+                                      state = tk.DISABLED)
+        self.pause_button.grid(row = 0, column = 1, padx = 5)
+        self.cancel_button = tk.Button(self.buttons, text = 'Cancel', command = self.cancel, state = tk.DISABLED)
+        self.cancel_button.grid(row = 0, column = 2, padx = 5)
+        self.plots_button = tk.Button(self.buttons, text = 'Live polars', command = self.showplots)
+        self.plots_button.grid(row = 0, column = 3, padx = 5)
+        self.viewer = None
+        self.jobs_table = ttk.Treeview(self, height = 12, columns = ('profile', 're', 'state', 'tries', 'rows', 'time'),
+                                       show = 'headings')
+        for column, heading, width in [('profile', 'Profile', 150), ('re', 'Reynolds', 90), ('state', 'State', 250),
+                                       ('tries', 'Tries', 60), ('rows', 'Rows', 80), ('time', 'Time (s)', 80)]:
+            self.jobs_table.heading(column, text = heading)
+            self.jobs_table.column(column, width = width)
+        self.jobs_table.grid(row = 10, column = 0, columnspan = 2, sticky = tk.W + tk.E, padx = 10, pady = 5)
+        self.status_label = tk.Label(self, textvariable = self.status)
+        self.status_label.grid(row = 11, column = 0, columnspan = 2, sticky = tk.W, padx = 10, pady = 5)
+
+    def get_profiles(self):
+        self.profiles = re.split('[,; ]+', self.profiles_string.get())
+
+    def get_reynolds(self):
+        self.reynolds = re.split('[,; ]+', self.reynolds_string.get())
+
+    def launch(self):
+        """
+        Starts the batch in the background and the updates of the table
+        """
+        self.get_profiles()
+        self.get_reynolds()
+        if self.root_directory.get() and not os.path.exists(self.root_directory.get()):
+            os.mkdir(self.root_directory.get())
+        #Without duplicates, in the order given
+        profiles = list(dict.fromkeys(profile.capitalize() for profile in self.profiles if profile))
+        reynolds = list(dict.fromkeys(value for value in self.reynolds if value))
+        jobs = make_jobs(profiles, reynolds,
+                         cmd = self.cmd.get(), rootdir = self.root_directory.get(),
+                         mach = self.mach.get(), angle_max = self.angle_max.get(),
+                         angle_step = self.angle_step.get(), tries_max = self.tries_max.get(),
+                         metrics = Progress(self.events))
+        self.jobs_table.delete(*self.jobs_table.get_children())
+        self.expected = {}
+        self.rows = {}
+        for job in jobs:
+            key = (job['profile'], job['re'])
+            self.expected[key] = angle_count(job['angle_max'], job['angle_step'])
+            self.rows[key] = 0
+            self.jobs_table.insert('', tk.END, iid = self.item(*key),
+                                   values = (job['profile'], job['re'], 'waiting', 0, 0, ''))
+        self.scheduler = Scheduler(self.max_running.get(), listeners = [self.finished])
+        self.thread = Thread(target = self.work, args = (self.scheduler, jobs), daemon = True)
+        self.start_time = time.time()
+        self.run_button.configure(state = tk.DISABLED)
+        self.pause_button.configure(state = tk.NORMAL)
+        self.cancel_button.configure(state = tk.NORMAL)
+        self.pause_text.set('Pause')
+        self.thread.start()
+        self.after(self.poll_interval, self.poll)
+
+    def work(self, scheduler, jobs):
+        """
+        Runs the batch in the background thread, the end (or the error ending
+        it) is posted to the queue
+        """
+        try:
+            scheduler.run(jobs)
+            self.events.put(('batch', {'error': None}))
+        except Exception as error:
+            self.events.put(('batch', {'error': str(error) or repr(error)}))
+
+    def finished(self, rfoil):
+        """
+        Listener of the scheduler, called in the background thread
+        """
+        self.events.put(('done', {'profile': rfoil.profile, 're': rfoil.re, 'failure': rfoil.failure,
+                                  'success': rfoil.success and rfoil.failure is None,
+                                  'tries': len(rfoil.failures)}))
+
+    def item(self, profile, re):
+        return '{0} {1}'.format(profile, re)
+
+    def poll(self):
+        """
+        Empties the queue of progress events into the table, runs in the Tk
+        loop until the batch is over
+        """
+        running = True
+        while True:
+            try:
+                event, fields = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == 'batch':
+                running = False
+                self.ended(fields['error'])
+            else:
+                self.show(event, fields)
+        self.status.set(self.progress())
+        if running:
+            self.after(self.poll_interval, self.poll)
+
+    def show(self, event, fields):
+        """
+        Updates the row of a job with a progress event
+        """
+        key = (fields['profile'], fields['re'])
+        item = self.item(*key)
+        if not self.jobs_table.exists(item):
+            return
+        if event == 'start':
+            self.jobs_table.set(item, 'state', 'running (try 1)')
+        elif event == 'try':
+            self.rows[key] = fields['rows']
+            self.jobs_table.set(item, 'tries', fields['attempt'])
+            self.jobs_table.set(item, 'rows', '{0}/{1}'.format(fields['rows'], self.expected[key]))
+            self.jobs_table.set(item, 'state', 'running (try {0}: {1})'.format(
+                fields['attempt'] + 1, fields['failure']) if fields['failure'] else 'running')
+        elif event == 'speculative':
+            self.jobs_table.set(item, 'state', 'running (speculative attempt)')
+        elif event == 'polar':
+            self.jobs_table.set(item, 'time', '{0:.0f}'.format(fields['duration']))
+            if fields['cached']:
+                self.rows[key] = self.expected[key]
+                self.jobs_table.set(item, 'rows', 'cached')
+        elif event == 'done':
+            self.rows[key] = self.expected[key]
+            self.jobs_table.set(item, 'tries', fields['tries'])
+            if fields['success']:
+                self.jobs_table.set(item, 'state', 'success')
+            elif fields['failure'] == CANCELLED:
+                self.jobs_table.set(item, 'state', 'cancelled')
+            else:
+                self.jobs_table.set(item, 'state', 'failed: {0}'.format(fields['failure']))
+
+    def progress(self):
+        """
+        Returns the status line: polars done and estimated remaining time
+        from the rows obtained so far
+        """
+        if self.start_time is None:
+            return ''
+        done = sum(1 for item in self.jobs_table.get_children()
+                   if self.jobs_table.set(item, 'state').startswith(FINISHED))
+        status = '{0}/{1} polars'.format(done, len(self.expected))
+        fraction = float(sum(self.rows.values())) / max(sum(self.expected.values()), 1)
+        elapsed = time.time() - self.start_time
+        if self.thread is not None and self.thread.is_alive():
+            if 0 < fraction < 1:
+                remaining = datetime.timedelta(seconds = int(elapsed * (1 - fraction) / fraction))
+                status += ', about {0} left'.format(remaining)
+            if not self.scheduler.resumed.is_set():
+                status += ' (paused)'
+        else:
+            status += ' in {0}'.format(datetime.timedelta(seconds = int(elapsed)))
+        return status
+
+    def ended(self, error):
+        self.run_button.configure(state = tk.NORMAL)
+        self.pause_button.configure(state = tk.DISABLED)
+        self.cancel_button.configure(state = tk.DISABLED)
+        if error:
+            print('Batch failed: {0}'.format(error))
+
+    def pause(self):
+        if self.scheduler.resumed.is_set():
+            self.scheduler.pause()
+            self.pause_text.set('Resume')
+        else:
+            self.scheduler.resume()
+            self.pause_text.set('Pause')
+
+    def cancel(self):
+        """
+        Stops the selected polars, or the whole batch if none is selected
+        """
+        selection = set(self.jobs_table.selection())
+        if not selection:
+            self.scheduler.cancel()
+            self.pause_text.set('Pause')
+            return
+        rfoils = [rfoil for rfoil in self.scheduler.rfoils if self.item(rfoil.profile, rfoil.re) in selection]
+        self.scheduler.cancel(rfoils)
+        for item in selection:
+            if not self.jobs_table.set(item, 'state').startswith(FINISHED):
+                self.jobs_table.set(item, 'state', 'cancelling')
+
+    def running(self):
+        """
+        Returns the Rfoil objects of the polars being computed
+        """
+        if self.scheduler is None:
+            return []
+        rfoils = []
+        for rfoil in self.scheduler.rfoils:
+            item = self.item(rfoil.profile, rfoil.re)
+            if self.jobs_table.exists(item) and \
+                    self.jobs_table.set(item, 'state').startswith(('running', 'cancelling')):
+                rfoils.append(rfoil)
+        return rfoils
+
+    def showplots(self):
+        if self.viewer is not None and self.viewer.winfo_exists():
+            self.viewer.lift()
+        else:
+            self.viewer = PolarViewer(self)
+
+    def close(self):
+        """
+        Stops the batch before closing the window
+        """
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+        self.master.destroy()
+
+
+class Plot(tk.Canvas):
+    """
+    Canvas drawing curves on axes scaled to their data
+    """
+    margin = 50
+
+    def __init__(self, master, xlabel, ylabel, **kwargs):
+        tk.Canvas.__init__(self, master, width = 450, height = 350, background = 'white', **kwargs)
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+
+    def scale(self, values, low, high):
+        """
+        Returns the pixels of values between the pixels low and high
+        """
+        vmin, vmax = np.min(values), np.max(values)
+        if vmax - vmin < 1e-12:
+            vmin, vmax = vmin - 1, vmax + 1
+        return (vmin, vmax), lambda value: low + (value - vmin) / (vmax - vmin) * (high - low)
+
+    def draw(self, curves):
+        """
+        Draws the curves: list of (label, color, x, y)
+        """
+        self.delete('all')
+        width, height = int(self['width']), int(self['height'])
+        left, top, right, bottom = self.margin, 10, width - 10, height - self.margin + 15
+        self.create_rectangle(left, top, right, bottom)
+        self.create_text((left + right) / 2, height - 10, text = self.xlabel)
+        self.create_text(12, (top + bottom) / 2, text = self.ylabel, angle = 90)
+        curves = [curve for curve in curves if len(curve[2])]
+        if not curves:
+            return
+        (xmin, xmax), px = self.scale(np.concatenate([curve[2] for curve in curves]), left, right)
+        (ymin, ymax), py = self.scale(np.concatenate([curve[3] for curve in curves]), bottom, top)
+        for value in np.linspace(xmin, xmax, 5):
+            self.create_line(px(value), bottom, px(value), bottom + 4)
+            self.create_text(px(value), bottom + 12, text = '{0:.3g}'.format(value))
+        for value in np.linspace(ymin, ymax, 5):
+            self.create_line(left - 4, py(value), left, py(value))
+            self.create_text(left - 6, py(value), text = '{0:.3g}'.format(value), anchor = tk.E)
+        for i, (label, color, x, y) in enumerate(curves):
+            coordinates = np.column_stack([px(x), py(y)]).ravel().tolist()
+            if len(x) > 1:
+                self.create_line(*coordinates, fill = color)
+            for xi, yi in zip(coordinates[0::2], coordinates[1::2]):
+                self.create_rectangle(xi - 1, yi - 1, xi + 1, yi + 1, outline = color)
+            self.create_text(right - 5, top + 5 + 12 * i, text = label, fill = color, anchor = tk.NE)
+
+
+class PolarViewer(tk.Toplevel):
+    """
+    Window plotting the rows of the running polars as they are computed
+    """
+
+    ###Time in milliseconds between two refreshes of the plots
+    refresh_interval = 1000
+    colors = ['blue', 'red', 'green', 'orange', 'purple', 'brown', 'magenta', 'cyan', 'gray', 'olive']
+
+    def __init__(self, gui):
+        tk.Toplevel.__init__(self, gui)
+        self.title('Live polars')
+        self.gui = gui
+        #Polar file path: PolarTail
+        self.tails = {}
+        #Job key: color
+        self.curve_colors = {}
+        self.shown = None
+        self.cl_alpha = Plot(self, 'alpha', 'CL')
+        self.cl_alpha.grid(row = 0, column = 0, padx = 5, pady = 5)
+        self.cl_cd = Plot(self, 'CD', 'CL')
+        self.cl_cd.grid(row = 0, column = 1, padx = 5, pady = 5)
+        self.after(0, self.refresh)
+
+    def rows(self, rfoil):
+        """
+        Returns the alpha, CL and CD of the previous tries and of the files
+        of the running one, sorted by angle of attack
+        """
+        polars = [getattr(rfoil, 'polar', None)]
+        for polar_file in rfoil.partfiles() + [rfoil.specfile()]:
+            tail = self.tails.get(os.path.join(rfoil.polar_directory, polar_file))
+            if tail is not None:
+                polars.append(tail.polar())
+        polars = [polar for polar in polars if polar is not None and len(polar)
+                  and all(name in polar.columns for name in ['alpha', 'CL', 'CD'])]
+        if not polars:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        alpha, cl, cd = [np.concatenate([polar[name] for polar in polars]) for name in ['alpha', 'CL', 'CD']]
+        order = np.argsort(alpha, kind = 'stable')
+        return alpha[order], cl[order], cd[order]
+
+    def refresh(self):
+        """
+        Reads the new rows of the running polars and redraws the plots if
+        there are any
+        """
+        if not self.winfo_exists():
+            return
+        rfoils = self.gui.running()
+        paths = set()
+        changed = False
+        for rfoil in rfoils:
+            for polar_file in rfoil.partfiles() + [rfoil.specfile()]:
+                path = os.path.join(rfoil.polar_directory, polar_file)
+                paths.add(path)
+                if path not in self.tails:
+                    self.tails[path] = PolarTail(path)
+                changed = self.tails[path].read() or changed
+        #Forget the finished polars
+        for path in set(self.tails) - paths:
+            del self.tails[path]
+        shown = [(rfoil.profile, rfoil.re, len(getattr(rfoil, 'polar', ()))) for rfoil in rfoils]
+        if changed or shown != self.shown:
+            self.shown = shown
+            curves_alpha = []
+            curves_cd = []
+            for rfoil in rfoils:
+                key = (rfoil.profile, rfoil.re)
+                if key not in self.curve_colors:
+                    self.curve_colors[key] = self.colors[len(self.curve_colors) % len(self.colors)]
+                alpha, cl, cd = self.rows(rfoil)
+                label = '{0} RE{1}'.format(*key)
+                curves_alpha.append((label, self.curve_colors[key], alpha, cl))
+                curves_cd.append((label, self.curve_colors[key], cd, cl))
+            self.cl_alpha.draw(curves_alpha)
+            self.cl_cd.draw(curves_cd)
+        self.after(self.refresh_interval, self.refresh)
+
+
+if __name__ == '__main__':
+    window = tk.Tk()
+    window.wm_title("Rfoil GUI")
+    gui = GUI(window)
+    window.protocol('WM_DELETE_WINDOW', gui.close)
+    gui.mainloop()
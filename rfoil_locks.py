@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the locks of the polar directories used by the Rfoil Thread
+described in Rfoil_parallel2 and by rfoil_scheduler. Each polar directory has
+its own lock for copying the profile and reading, writing or deleting its
+polar and log files, so that threads working on different profiles never
+wait for each other and no lock is held while talking to rfoil. Every lock
+records how many times it was taken and how long threads waited for it.
+
+"""
+
+import os
+import time
+from threading import RLock, Lock
+
+registry = {}
+registry_lock = Lock()
+
+
+class TimedLock(object):
+    """
+    Reentrant lock recording the time spent waiting to acquire it
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = RLock()
+        self.stats_lock = Lock()
+        self.acquisitions = 0
+        self.wait_time = 0.
+        self.max_wait = 0.
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        wait = time.perf_counter() - start
+        with self.stats_lock:
+            self.acquisitions += 1
+            self.wait_time += wait
+            self.max_wait = max(self.max_wait, wait)
+        return self
+
+    def __exit__(self, *args):
+        self.lock.release()
+
+
+def directory_lock(directory):
+    """
+    Returns the lock of a directory
+    """
+    name = os.path.normcase(os.path.abspath(directory))
+    with registry_lock:
+        if name not in registry:
+            registry[name] = TimedLock(name)
+        return registry[name]
+
+
+def contention():
+    """
+    Returns (name, acquisitions, total wait, max wait) for every lock, the
+    most waited for first
+    """
+    with registry_lock:
+        locks = list(registry.values())
+    stats = []
+    for lock in locks:
+        with lock.stats_lock:
+            stats.append((lock.name, lock.acquisitions, lock.wait_time, lock.max_wait))
+    return sorted(stats, key = lambda stat: -stat[2])
+
+
+def report(count = 5):
+    """
+    Returns the total lock wait and the count most waited for locks
+    """
+    stats = contention()
+    lines = ['Lock wait: {0:.3f} seconds in {1} acquisitions'.format(
+        sum(stat[2] for stat in stats), sum(stat[1] for stat in stats))]
+    for name, acquisitions, wait_time, max_wait in stats[:count]:
+        lines.append('    {0}: {1} acquisitions, {2:.3f} s waiting (max {3:.3f} s)'.format(
+            name, acquisitions, wait_time, max_wait))
+    return '\n'.join(lines)
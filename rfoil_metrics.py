@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the timing metrics of the Rfoil Thread described in
+Rfoil_parallel2. Events (process spawn, each command with the time spent
+sending it and waiting for rfoil, each sweep, each try and each polar) are
+recorded with a timestamp, the profile and the Reynolds number, queued, and
+written as JSON lines by a background thread so that recording costs almost
+nothing to the workers. The summary tells where the wall time of each polar
+went: starting rfoil, waiting for the commands, sweeping or retrying.
+
+"""
+
+import json
+import time
+import queue
+from threading import Thread, Lock
+
+STOP = object()
+
+
+class Metrics(object):
+
+    def __init__(self, path = 'rfoil_metrics.jsonl', flush_interval = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.lock = Lock()
+        self.totals = {}
+        self.writer = Thread(target = self.write, daemon = True)
+        self.writer.start()
+
+    def record(self, event, **fields):
+        """
+        Queues an event, fields must be JSON serializable
+        """
+        fields['event'] = event
+        fields.setdefault('time', time.time())
+        self.queue.put(fields)
+
+    def write(self):
+        """
+        Background thread appending the queued events to the file, at most
+        every flush_interval seconds
+        """
+        buffer = []
+        last_flush = time.time()
+        while True:
+            try:
+                event = self.queue.get(timeout = self.flush_interval)
+            except queue.Empty:
+                event = None
+            if event is not None and event is not STOP:
+                buffer.append(json.dumps(event) + '\n')
+                with self.lock:
+                    aggregate(self.totals, event)
+            if buffer and (event is STOP or len(buffer) >= 1000 or
+                           time.time() - last_flush >= self.flush_interval):
+                with open(self.path, 'a') as file:
+                    file.writelines(buffer)
+                buffer = []
+                last_flush = time.time()
+            if event is STOP:
+                return
+
+    def close(self):
+        """
+        Writes the remaining events and stops the writer
+        """
+        self.queue.put(STOP)
+        self.writer.join()
+
+    def summary(self):
+        with self.lock:
+            return report(self.totals)
+
+
+def aggregate(totals, event):
+    """
+    Adds an event to the totals by (profile, Reynolds number)
+    """
+    if 'profile' not in event:
+        return
+    total = totals.setdefault((event['profile'], event.get('re')), {
+        'wall': 0., 'spawn': 0., 'spawns': 0, 'send': 0., 'wait': 0., 'commands': 0,
+        'sweep': 0., 'sweeps': 0, 'tries': 0, 'rows': 0, 'cached': False, 'success': None})
+    name = event['event']
+    if name == 'spawn':
+        total['spawn'] += event['duration']
+        total['spawns'] += 1
+    elif name == 'command':
+        total['send'] += event['send']
+        total['wait'] += event['wait']
+        total['commands'] += 1
+    elif name == 'sweep':
+        total['sweep'] += event['duration']
+        total['sweeps'] += 1
+    elif name == 'try':
+        total['tries'] += 1
+    elif name == 'polar':
+        total['wall'] += event['duration']
+        total['rows'] = event['rows'] or 0
+        total['cached'] = event.get('cached', False)
+        total['success'] = event['success']
+
+
+def report(totals):
+    """
+    Returns where the wall time of each polar went
+    """
+    lines = []
+    for (profile, re), total in sorted(totals.items(), key = lambda item: (item[0][0], float(item[0][1] or 0))):
+        lines.append('{0} RE{1}: {2:.2f} s wall, spawn {3:.2f} s ({4}), commands {5:.2f} s waiting '
+                     'and {6:.2f} s sending ({7}), sweeps {8:.2f} s ({9}), {10} tries, {11} rows'.format(
+                         profile, re, total['wall'], total['spawn'], total['spawns'], total['wait'],
+                         total['send'], total['commands'], total['sweep'], total['sweeps'],
+                         total['tries'], total['rows']) + (' (from cache)' if total['cached'] else ''))
+    return '\n'.join(lines)
+
+
+def summarize(path = 'rfoil_metrics.jsonl'):
+    """
+    Returns the summary of a metrics file
+    """
+    totals = {}
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                aggregate(totals, json.loads(line))
+    return report(totals)
+
+
+if __name__ == '__main__':
+    import sys
+    print(summarize(*sys.argv[1:]))
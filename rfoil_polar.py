@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the parser of the polar files written by rfoil (and by the Rfoil
+Thread described in Rfoil_parallel2). A file is read into a Polar: a NumPy
+structured array with one field per column (alpha, CL, CD, CDp, CM, Top_Xtr,
+Bot_Xtr) plus the header lines and the metadata found in them (airfoil name,
+Reynolds and Mach numbers, Ncrit, forced transition). Sorting, removing the
+duplicate angles of attack and the invalid rows are done on the whole array,
+and writing a Polar back gives the same text as rfoil, column widths and
+decimals included.
+A PolarTail follows a polar file while rfoil writes it, reading only the
+rows appended since the last read (used by the live plots of rfoil_gui).
+
+"""
+
+import os
+import re
+import numpy as np
+
+#Columns of an rfoil polar, used when a file has no header
+COLUMNS = ('alpha', 'CL', 'CD', 'CDp', 'CM', 'Top_Xtr', 'Bot_Xtr')
+#Width and decimals of the columns, used when a Polar was not read from a file
+FORMATS = ((8, 3), (9, 4), (10, 5), (10, 5), (9, 4), (9, 4), (9, 4))
+
+
+def isdata(line):
+    """
+    Returns True if the line is a row of numbers
+    """
+    tokens = line.split()
+    if not tokens:
+        return False
+    try:
+        [float(token) for token in tokens]
+    except ValueError:
+        return False
+    return True
+
+
+def formats(line):
+    """
+    Returns the (width, decimals) of each field of a data line
+    """
+    result = []
+    start = 0
+    for match in re.finditer(r'\S+', line):
+        token = match.group()
+        decimals = len(token) - token.index('.') - 1 if '.' in token else 0
+        result.append((match.end() - start, decimals))
+        start = match.end()
+    return tuple(result)
+
+
+def metadata(header):
+    """
+    Returns the airfoil name, Reynolds and Mach numbers, Ncrit and forced
+    transition written in the header lines of a polar
+    """
+    text = ''.join(header)
+    result = {}
+    match = re.search(r'Calculated polar for:\s*(.*)', text)
+    if match:
+        result['name'] = match.group(1).strip()
+    match = re.search(r'Mach\s*=\s*([-\d.]+)\s+Re\s*=\s*([-\d.]+)\s*e\s*([-+]?\d+)', text)
+    if match:
+        result['mach'] = float(match.group(1))
+        result['re'] = float(match.group(2)) * 10 ** int(match.group(3))
+    match = re.search(r'Ncrit\s*=\s*([-\d.]+)', text)
+    if match:
+        result['ncrit'] = float(match.group(1))
+    match = re.search(r'xtrf\s*=\s*([-\d.]+)\s*\(top\)\s*([-\d.]+)', text)
+    if match:
+        result['xtrf_top'] = float(match.group(1))
+        result['xtrf_bottom'] = float(match.group(2))
+    return result
+
+
+class Polar(object):
+
+    def __init__(self, data, header = None, formats = None):
+        self.data = data
+        self.header = list(header or [])
+        self.formats = formats or FORMATS[:len(data.dtype.names)]
+        self.metadata = metadata(self.header)
+
+    @classmethod
+    def empty(cls, columns = COLUMNS):
+        return cls(np.zeros(0, dtype = [(name, 'f8') for name in columns]))
+
+    @classmethod
+    def read(cls, path):
+        """
+        Reads an rfoil polar file
+        """
+        with open(path) as file:
+            return cls.parse(file)
+
+    @classmethod
+    def parse(cls, file):
+        """
+        Reads a polar from an open file: the header lines one by one (up to
+        the dashes under the column names), then the data rows at once
+        """
+        header = []
+        columns = None
+        first = ''
+        for line in iter(file.readline, ''):
+            if columns is not None and not line.strip():
+                header.append(line)
+            elif columns is None and line.lstrip().startswith('---'):
+                columns = header[-1].split() if header else list(COLUMNS)
+                header.append(line)
+            elif columns is None and isdata(line):
+                #No header
+                first = line
+                break
+            elif columns is None:
+                header.append(line)
+            else:
+                first = line
+                break
+        body = first + file.read()
+        lines = [line for line in body.splitlines() if line.strip()]
+        if not lines:
+            return cls(np.zeros(0, dtype = [(name, 'f8') for name in (columns or COLUMNS)]), header)
+        line_formats = formats(lines[0])
+        if columns is None:
+            columns = list(COLUMNS[:len(line_formats)]) + \
+                ['col{0}'.format(i) for i in range(len(COLUMNS), len(line_formats))]
+        dtype = [(name, 'f8') for name in columns]
+        width = len(columns)
+        tokens = body.split()
+        try:
+            if len(tokens) != width * len(lines):
+                raise ValueError
+            values = np.array(tokens, dtype = float).reshape(-1, width)
+        except ValueError:
+            #Incomplete rows or overflowed fields (********), parse row by row
+            values = np.full((len(lines), width), np.nan)
+            for i, line in enumerate(lines):
+                for j, token in enumerate(line.split()[:width]):
+                    try:
+                        values[i, j] = float(token)
+                    except ValueError:
+                        pass
+        data = np.zeros(len(values), dtype = dtype)
+        for j, name in enumerate(columns):
+            data[name] = values[:, j]
+        return cls(data, header, line_formats)
+
+    @property
+    def columns(self):
+        return self.data.dtype.names
+
+    @property
+    def alpha(self):
+        return self.data['alpha']
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def withdata(self, data):
+        return Polar(data, self.header, self.formats)
+
+    def validated(self):
+        """
+        Returns the polar without the rows containing NaN or a drag <= 0
+        """
+        valid = np.ones(len(self.data), dtype = bool)
+        for name in self.columns:
+            valid &= np.isfinite(self.data[name])
+        if 'CD' in self.columns:
+            valid &= self.data['CD'] > 0
+        return self.withdata(self.data[valid])
+
+    def deduplicated(self, decimals = 3):
+        """
+        Returns the polar sorted by angle of attack, keeping the last row of
+        each angle
+        """
+        keys = np.round(self.alpha, decimals)
+        #np.unique gives the first occurrence, look at the rows backwards
+        unique, index = np.unique(keys[::-1], return_index = True)
+        return self.withdata(self.data[len(keys) - 1 - index])
+
+    def sorted(self):
+        """
+        Returns the polar sorted by angle of attack
+        """
+        return self.withdata(self.data[np.argsort(self.alpha, kind = 'stable')])
+
+    def merge(self, other):
+        """
+        Returns the rows of both polars sorted and without duplicates, the
+        rows of other replace those of self for the same angle
+        """
+        if len(self) == 0:
+            return other.deduplicated()
+        if len(other) == 0:
+            return self.deduplicated()
+        if other.columns != self.columns:
+            raise ValueError('Polars with different columns: {0} and {1}'.format(self.columns, other.columns))
+        return self.withdata(np.concatenate([self.data, other.data])).deduplicated()
+
+    def angles(self, decimals = 3):
+        """
+        Returns the set of the angles of attack of the polar
+        """
+        return set(np.round(self.alpha, decimals).tolist())
+
+    def lines(self):
+        """
+        Returns the data rows formatted like rfoil
+        """
+        template = ''.join('{{{0}:{1}.{2}f}}'.format(j, width, decimals)
+                           for j, (width, decimals) in enumerate(self.formats)) + '\n'
+        return [template.format(*row) for row in self.data.tolist()]
+
+    def write(self, path, header = True):
+        """
+        Writes the polar in the rfoil format, with or without the header
+        """
+        with open(path, 'w') as file:
+            if header:
+                file.writelines(self.header)
+            file.writelines(self.lines())
+
+
+class PolarTail(object):
+    """
+    Polar file being written by rfoil, read incrementally: each read only
+    reads the bytes appended since the previous one and parses the new rows.
+    A file removed or started again (next try) is read from the beginning.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self, identity = None):
+        self.identity = identity
+        self.offset = 0
+        #Incomplete last line
+        self.rest = b''
+        self.previous = ''
+        self.columns = list(COLUMNS)
+        self.rows = []
+
+    def read(self):
+        """
+        Reads what was appended to the file, returns True if the rows changed
+        """
+        try:
+            stat = os.stat(self.path)
+        except EnvironmentError:
+            changed = bool(self.rows)
+            self.reset()
+            return changed
+        identity = (stat.st_dev, stat.st_ino)
+        changed = False
+        if identity != self.identity or stat.st_size < self.offset:
+            changed = bool(self.rows)
+            self.reset(identity)
+        if stat.st_size == self.offset:
+            return changed
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        self.offset += len(data)
+        lines = (self.rest + data).split(b'\n')
+        self.rest = lines.pop()
+        count = len(self.rows)
+        for line in lines:
+            line = line.decode(errors = 'replace')
+            if line.lstrip().startswith('---'):
+                #The column names are above the dashes
+                if self.previous.split():
+                    self.columns = self.previous.split()
+                self.rows = []
+            elif isdata(line) and len(line.split()) == len(self.columns):
+                self.rows.append(tuple(float(token) for token in line.split()))
+            if line.strip():
+                self.previous = line
+        return changed or len(self.rows) != count
+
+    def polar(self):
+        """
+        Returns the rows read so far as a Polar
+        """
+        data = np.zeros(len(self.rows), dtype = [(name, 'f8') for name in self.columns])
+        if self.rows:
+            values = np.array(self.rows)
+            for j, name in enumerate(self.columns):
+                data[name] = values[:, j]
+        return Polar(data)
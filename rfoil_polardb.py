@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is a database of all the polars of a Polars/<Profile>/RE<re>.dat tree
+(see Rfoil_parallel2) gathered in a single binary file of float64 rows, read
+through a memory map, and an index giving the rows of each polar by profile
+and Reynolds number. Queries interpolate CL, CD... at any number of
+(Reynolds, alpha) points of a profile at once: linearly in alpha on the
+polars and in log(Re) between the polars, without opening or parsing any
+polar file. New or changed polars are appended to the store (build or
+update), the rows they replace are dropped when the store is compacted.
+
+"""
+
+import os
+import re
+import json
+from threading import RLock
+import numpy as np
+from rfoil_polar import Polar, COLUMNS
+
+#RE1e6.dat but not RE1e6.part1.dat, RE1e6.old.dat...
+POLAR_FILE = re.compile(r'^RE([-+.\deE]+)\.dat$')
+
+
+class PolarDB(object):
+
+    def __init__(self, directory = 'PolarDB', columns = COLUMNS):
+        self.directory = directory
+        self.data_file = os.path.join(directory, 'polars.bin')
+        self.index_file = os.path.join(directory, 'index.json')
+        self.lock = RLock()
+        self.memmap = None
+        self.prepared = {}
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as file:
+                self.index = json.load(file)
+        else:
+            self.index = {'columns': list(columns), 'rows': 0, 'profiles': {}}
+        self.columns = self.index['columns']
+        self.open()
+
+    def open(self):
+        """
+        Maps the data file in memory
+        """
+        rows = self.index['rows']
+        if rows == 0:
+            self.memmap = np.zeros((0, len(self.columns)))
+        else:
+            self.memmap = np.memmap(self.data_file, dtype = 'f8', mode = 'r',
+                                    shape = (rows, len(self.columns)))
+        self.prepared = {}
+
+    def save(self):
+        temporary = self.index_file + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.index, file)
+        os.replace(temporary, self.index_file)
+
+    def profiles(self):
+        return sorted(self.index['profiles'])
+
+    def reynolds(self, profile):
+        """
+        Returns the sorted Reynolds numbers of the polars of a profile
+        """
+        return sorted(entry['re'] for entry in self.index['profiles'].get(profile, {}).values())
+
+    def update(self, path, profile = None, compact = True):
+        """
+        Adds or replaces the polar file path (Polars/<Profile>/RE<re>.dat),
+        does nothing if it did not change since it was added
+        """
+        path = os.path.abspath(path)
+        name = os.path.basename(path)
+        match = POLAR_FILE.match(name)
+        if not match:
+            return False
+        profile = profile or os.path.basename(os.path.dirname(path))
+        stat = os.stat(path)
+        with self.lock:
+            entries = self.index['profiles'].setdefault(profile, {})
+            entry = entries.get(name)
+            if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                return False
+            self.append(entries, name, match.group(1), path, stat)
+            self.save()
+            if compact:
+                self.compact(threshold = 0.5)
+            self.open()
+        return True
+
+    def append(self, entries, name, reynolds, path, stat):
+        """
+        Appends the rows of a polar file to the data file
+        """
+        polar = Polar.read(path).validated().deduplicated()
+        rows = np.full((len(polar), len(self.columns)), np.nan)
+        for j, column in enumerate(self.columns):
+            if column in polar.columns:
+                rows[:, j] = polar[column]
+        with open(self.data_file, 'ab') as file:
+            file.write(np.ascontiguousarray(rows, dtype = '<f8').tobytes())
+        re_value = polar.metadata.get('re') or float(reynolds)
+        entries[name] = {'re': re_value, 'offset': self.index['rows'], 'count': len(rows),
+                         'source': path, 'mtime': stat.st_mtime, 'size': stat.st_size}
+        self.index['rows'] += len(rows)
+
+    def build(self, root_directory = 'Polars'):
+        """
+        Adds all the new or changed polars of a Polars tree, returns the
+        number of polars added
+        """
+        added = 0
+        with self.lock:
+            for profile in sorted(os.listdir(root_directory)):
+                directory = os.path.join(root_directory, profile)
+                if not os.path.isdir(directory):
+                    continue
+                for name in sorted(os.listdir(directory)):
+                    path = os.path.join(directory, name)
+                    if POLAR_FILE.match(name) and '.part' not in name:
+                        added += self.update(path, profile, compact = False)
+            self.compact(threshold = 0.5)
+            self.open()
+        return added
+
+    def compact(self, threshold = 0.):
+        """
+        Rewrites the data file without the rows of replaced polars when they
+        are more than threshold times the total
+        """
+        with self.lock:
+            entries = [entry for profile in self.index['profiles'].values() for entry in profile.values()]
+            live = sum(entry['count'] for entry in entries)
+            total = self.index['rows']
+            if total == 0 or (total - live) <= threshold * total:
+                return
+            self.memmap = None
+            self.prepared = {}
+            data = np.fromfile(self.data_file, dtype = '<f8').reshape(-1, len(self.columns))
+            temporary = self.data_file + '.tmp'
+            offset = 0
+            with open(temporary, 'wb') as file:
+                for entry in entries:
+                    file.write(data[entry['offset']:entry['offset'] + entry['count']].tobytes())
+                    entry['offset'] = offset
+                    offset += entry['count']
+            os.replace(temporary, self.data_file)
+            self.index['rows'] = offset
+            self.save()
+            self.open()
+
+    def prepare(self, profile):
+        """
+        Returns the log(Re) of the polars of a profile and their rows sorted
+        by Reynolds number, kept until the next update
+        """
+        with self.lock:
+            if profile not in self.prepared:
+                entries = sorted(self.index['profiles'].get(profile, {}).values(), key = lambda entry: entry['re'])
+                entries = [entry for entry in entries if entry['count'] > 0]
+                log_re = np.log(np.array([entry['re'] for entry in entries], dtype = float))
+                blocks = [self.memmap[entry['offset']:entry['offset'] + entry['count']] for entry in entries]
+                self.prepared[profile] = (log_re, blocks)
+            return self.prepared[profile]
+
+    def query(self, profile, reynolds, alpha, columns = ('CL', 'CD')):
+        """
+        Interpolates the columns of a profile at the (reynolds, alpha) points,
+        returns one array per column. Reynolds numbers outside of the polars
+        take the closest polar, angles outside of a polar give NaN.
+        """
+        log_re_points, alpha = np.broadcast_arrays(np.log(np.asarray(reynolds, dtype = float)),
+                                                   np.asarray(alpha, dtype = float))
+        shape = alpha.shape
+        log_re_points = log_re_points.ravel()
+        alpha = alpha.ravel()
+        log_re, blocks = self.prepare(profile)
+        if len(blocks) == 0:
+            raise KeyError('No polar for profile {0}'.format(profile))
+        indices = [self.columns.index(column) for column in columns]
+        #Bracketing polars and weight of the upper one
+        upper = np.clip(np.searchsorted(log_re, log_re_points), 1, max(len(log_re) - 1, 1))
+        lower = upper - 1
+        if len(log_re) == 1:
+            upper = lower = np.zeros(len(alpha), dtype = int)
+            weight = np.zeros(len(alpha))
+        else:
+            weight = np.clip((log_re_points - log_re[lower]) / (log_re[upper] - log_re[lower]), 0., 1.)
+        results = [np.zeros(len(alpha)) for column in columns]
+        for j, block in enumerate(blocks):
+            for side, factor in ((lower, 1. - weight), (upper, weight)):
+                points = np.nonzero(side == j)[0]
+                if len(points) == 0:
+                    continue
+                for result, index in zip(results, indices):
+                    values = np.interp(alpha[points], block[:, 0], block[:, index],
+                                       left = np.nan, right = np.nan)
+                    #A zero weight must not turn NaN into the result
+                    values = np.where(factor[points] > 0, values * factor[points], 0.)
+                    result[points] += values
+        return tuple(result.reshape(shape) for result in results)
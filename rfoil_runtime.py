@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is a model of the time rfoil takes to compute a polar, learnt from the
+'polar' events of past runs (see rfoil_metrics). The time of a polar is
+mostly proportional to its number of angles of attack and depends on the
+Reynolds number, the Mach number and the kind of profile, so the model keeps
+the median time per angle by (profile family, Reynolds, Mach), and falls
+back on (family, Reynolds), (Reynolds) and all the polars when a combination
+was never computed. The Scheduler uses it to start the longest polars first
+(longest processing time first) so that no long polar is left alone at the
+end of a batch, and to predict how long a batch will take.
+
+"""
+
+import re
+import json
+import heapq
+import datetime
+import numpy as np
+from rfoil_sessions import naca
+
+#Seconds per angle of attack when there is no history at all
+DEFAULT_TIME = 1.
+
+
+def family(profile):
+    """
+    Returns the family of a profile: Naca4 or Naca5 for generated Naca
+    profiles, the name without its trailing digits (thickness...) otherwise
+    """
+    profile = profile.capitalize()
+    generated = naca(profile)
+    if generated:
+        return 'Naca' + generated[0][3:]
+    return re.sub(r'[\d._-]+$', '', profile) or profile
+
+
+def angle_count(angle_max, angle_step):
+    """
+    Returns the number of angles of attack of a polar (both sweeps)
+    """
+    return 2 * int(round(float(angle_max) / float(angle_step))) + 1
+
+
+class RuntimeModel(object):
+
+    def __init__(self, default = DEFAULT_TIME):
+        self.default = default
+        #Key: list of seconds per angle
+        self.history = {}
+
+    @classmethod
+    def read(cls, path):
+        """
+        Returns the model learnt from a metrics file, empty if there is none
+        """
+        model = cls()
+        try:
+            file = open(path)
+        except EnvironmentError:
+            return model
+        with file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get('event') == 'polar' and not event.get('cached') and 'angle_max' in event:
+                    model.add(event['profile'], event['re'], event['mach'], event['angle_max'],
+                              event['angle_step'], event['duration'])
+        return model
+
+    def keys(self, profile, re, mach):
+        """
+        Returns the keys of a polar from the most to the least specific
+        """
+        re = float(re)
+        mach = round(float(mach), 3)
+        return [(family(profile), re, mach), (family(profile), re), (re,), ()]
+
+    def add(self, profile, re, mach, angle_max, angle_step, duration):
+        per_angle = duration / angle_count(angle_max, angle_step)
+        for key in self.keys(profile, re, mach):
+            self.history.setdefault(key, []).append(per_angle)
+
+    def predict(self, job, fallback = True):
+        """
+        Returns the predicted time in seconds of a job (Rfoil arguments).
+        Without fallback, None unless polars of its Reynolds number were
+        computed, otherwise all the polars or the default time per angle
+        """
+        count = angle_count(job['angle_max'], job['angle_step'])
+        for key in self.keys(job['profile'], job['re'], job.get('mach', 0)):
+            if key == () and not fallback:
+                break
+            if key in self.history:
+                return float(np.median(self.history[key])) * count
+        return self.default * count if fallback else None
+
+    def order(self, jobs):
+        """
+        Returns the jobs sorted from the longest to the shortest
+        """
+        return sorted(jobs, key = self.predict, reverse = True)
+
+    def makespan(self, jobs, workers):
+        """
+        Returns the predicted time of a batch computed in the given order by
+        workers polars at the same time
+        """
+        finish = [0.] * max(int(workers), 1)
+        for job in jobs:
+            heapq.heappush(finish, heapq.heappop(finish) + self.predict(job))
+        return max(finish)
+
+    def report(self, jobs, workers):
+        makespan = self.makespan(jobs, workers)
+        end = datetime.datetime.now() + datetime.timedelta(seconds = makespan)
+        return 'Predicted time for {0} polars: {1:.0f} seconds (done around {2})'.format(
+            len(jobs), makespan, end.strftime('%Y-%m-%d %H:%M'))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the scheduler running the Rfoil Threads described in Rfoil_parallel2
+for a whole batch. It takes the profile x Reynolds job matrix and keeps
+max_running solvers busy: as soon as a polar is finished the next one starts,
+whichever profile it belongs to. The log header and the total time of each
+profile are written when its first polar starts and its last one finishes.
+The listeners are called with each finished Rfoil object (to update a
+PolarDB for instance). With a runtime model (see rfoil_runtime) the polars
+predicted to be the longest start first and the predicted time of the batch
+is printed before it starts. The polars with past runs then know their
+predicted time and can borrow the slots left free at the end of the batch
+for speculative attempts (see speculate_after in Rfoil_parallel2).
+A batch can be paused (no new polar starts, the running ones go on) and
+cancelled, all of it or some of its polars, from another thread.
+It is used by the main block of Rfoil_parallel2 and by rfoil_gui.
+
+"""
+
+import os
+import datetime
+import traceback
+from threading import Lock, Event
+from concurrent.futures import ThreadPoolExecutor
+from Rfoil_parallel2 import Rfoil, CRASH
+from rfoil_locks import directory_lock
+
+
+def make_jobs(profiles, reynolds, **settings):
+    """
+    Returns the list of jobs (Rfoil keyword arguments) for every profile and
+    Reynolds number, settings are the common arguments (cmd, rootdir, mach...)
+    """
+    return [dict(settings, profile = profile, re = re)
+            for profile in profiles for re in reynolds]
+
+
+class Scheduler(object):
+
+    def __init__(self, max_running = 1, pool = None, listeners = None, model = None):
+        self.max_running = max(int(max_running), 1)
+        self.pool = pool
+        self.listeners = list(listeners or [])
+        self.model = model
+        self.lock = Lock()
+        self.running = 0
+        self.borrowed = 0
+        self.remaining = {}
+        self.started = {}
+        self.rfoils = []
+        self.stopped = False
+        #Cleared while the batch is paused
+        self.resumed = Event()
+        self.resumed.set()
+
+    def run(self, jobs):
+        """
+        Runs all the jobs and returns the finished Rfoil objects
+        """
+        if self.model:
+            jobs = self.model.order(jobs)
+            print(self.model.report(jobs, self.max_running))
+        rfoils = [Rfoil(pool = self.pool, **job) for job in jobs]
+        self.rfoils = rfoils
+        if self.stopped:
+            for rfoil in rfoils:
+                rfoil.stop()
+        for job, rfoil in zip(jobs, rfoils):
+            if self.model:
+                #Only a polar predicted from past runs can be a straggler
+                rfoil.predicted = self.model.predict(job, fallback = False)
+                rfoil.slots = self
+            ###Make some room for the incoming polars
+            if not os.path.exists(rfoil.polar_directory):
+                os.makedirs(rfoil.polar_directory)
+            self.remaining[rfoil.polar_directory] = self.remaining.get(rfoil.polar_directory, 0) + 1
+        executor = ThreadPoolExecutor(self.max_running)
+        for rfoil in rfoils:
+            future = executor.submit(self.work, rfoil)
+            future.add_done_callback(lambda future, rfoil = rfoil: self.finished(rfoil, future))
+        executor.shutdown(wait = True)
+        return rfoils
+
+    def work(self, rfoil):
+        """
+        Runs one polar in a worker of the executor
+        """
+        while not (self.resumed.wait(0.5) or rfoil.stopped):
+            pass
+        with self.lock:
+            self.running += 1
+        try:
+            self.begin(rfoil)
+            rfoil.run()
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def pause(self):
+        """
+        No polar starts until resume, the running ones go on
+        """
+        self.resumed.clear()
+
+    def resume(self):
+        self.resumed.set()
+
+    def cancel(self, rfoils = None):
+        """
+        Stops the given Rfoil objects, or the whole batch: the running polars
+        are killed and the others will not start
+        """
+        if rfoils is None:
+            self.stopped = True
+            rfoils = self.rfoils
+        for rfoil in rfoils:
+            rfoil.stop()
+        if self.stopped:
+            self.resume()
+
+    def borrow(self):
+        """
+        Takes a free slot for a speculative attempt, returns False if all
+        the slots are busy
+        """
+        with self.lock:
+            if self.running + self.borrowed >= self.max_running:
+                return False
+            self.borrowed += 1
+            return True
+
+    def giveback(self):
+        with self.lock:
+            self.borrowed -= 1
+
+    def begin(self, rfoil):
+        """
+        Writes the log header of the profile before its first polar
+        """
+        with self.lock:
+            if rfoil.polar_directory in self.started:
+                return
+            now = datetime.datetime.now()
+            self.started[rfoil.polar_directory] = now
+        print('Profile: ' + rfoil.profile)
+        with directory_lock(rfoil.polar_directory):
+            log = open(os.path.join(rfoil.polar_directory, rfoil.log_file), 'a')
+            log.write(now.strftime("\n----- %Y-%m-%d %H:%M -----\n"))
+            log.close()
+
+    def finished(self, rfoil, future = None):
+        """
+        Completion callback of a polar, writes the total time of the profile
+        after its last polar. A polar whose run raised an exception is marked
+        as crashed.
+        """
+        error = future.exception() if future else None
+        if error is not None:
+            print('    Reynolds = {0}, run failed: {1!r}'.format(rfoil.re, error))
+            traceback.print_exception(type(error), error, error.__traceback__)
+            rfoil.success = False
+            if rfoil.failure is None:
+                rfoil.failure = CRASH
+                rfoil.failures.append(CRASH)
+        for listener in self.listeners:
+            try:
+                listener(rfoil)
+            except Exception as error:
+                print('    Reynolds = {0}, listener failed: {1}'.format(rfoil.re, error))
+        with self.lock:
+            self.remaining[rfoil.polar_directory] -= 1
+            if self.remaining[rfoil.polar_directory] > 0:
+                return
+            del self.remaining[rfoil.polar_directory]
+            now = self.started.pop(rfoil.polar_directory, datetime.datetime.now())
+        if self.pool:
+            self.pool.discard(rfoil.polar_directory)
+        delta_t = datetime.datetime.now()-now
+        print('Total time for {0}: {1} seconds'.format(rfoil.profile, delta_t.seconds))
+        with directory_lock(rfoil.polar_directory):
+            log = open(os.path.join(rfoil.polar_directory, rfoil.log_file), 'a')
+            log.write('Total time: {0} seconds\n'.format(delta_t.seconds))
+            log.close()
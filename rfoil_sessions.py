@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the warm solver sessions used by the Rfoil Thread described in
+Rfoil_parallel2. A session is a running solver with a loaded profile which
+remembers in which state it was left, so that the next polar of the same
+profile only has to go back to 'oper' and change the Reynolds and Mach
+numbers instead of starting rfoil and loading the geometry again. The
+SessionPool keeps the idle sessions per polar directory and recycles them
+when they crashed or when they computed max_jobs polars.
+A session times its commands when it is given a record function (see
+rfoil_metrics).
+
+"""
+
+import time
+from threading import Lock
+
+
+def naca(profile):
+    """
+    Returns the rfoil command and number generating a Naca profile
+    ('Naca0018' gives ('nac4', '0018')) or None for a custom profile
+    """
+    if profile[0:4] == 'Naca' and len(profile) in [8, 9]:
+        naca_number = profile[4:]
+        return 'nac' + str(len(naca_number)), naca_number
+    return None
+
+
+class Session(object):
+
+    def __init__(self, backend, directory, key = None, record = None):
+        self.backend = backend
+        self.directory = directory
+        self.key = key
+        #record(event, **fields) receives the timings, set by the user of the session
+        self.record = record
+        self.profile = None
+        self.viscous = False
+        self.jobs = 0
+        #Set when a command failed: the state of the solver is unknown
+        self.broken = False
+
+    def open(self):
+        """
+        Opens the solver and waits for its first prompt
+        """
+        start = time.time()
+        self.backend.open(self.directory) #Initial wait for everything to be written in the window
+        if self.record:
+            self.record('spawn', duration = time.time() - start)
+
+    def write(self, msg):
+        """
+        Sends a command and waits for the solver, recording the time spent
+        sending and waiting
+        """
+        try:
+            if not self.record:
+                self.backend.write(msg)
+                return
+            start = time.time()
+            self.backend.send(str(msg))
+            sent = time.time()
+            self.backend.waitready()
+        except Exception:
+            self.broken = True
+            raise
+        self.record('command', command = str(msg), send = sent - start, wait = time.time() - sent)
+
+    def waitready(self):
+        start = time.time()
+        try:
+            self.backend.waitready()
+        except Exception:
+            self.broken = True
+            raise
+        if self.record:
+            self.record('wait', duration = time.time() - start)
+
+    def loadcommands(self, profile, profile_file):
+        """
+        Returns the commands loading or generating the profile, none if the
+        session already has it
+        """
+        if self.profile == profile:
+            return []
+        generated = naca(profile)
+        if generated:
+            return list(generated)
+        return ['load', profile_file, profile]
+
+    def opercommands(self, re, mach, polar_file):
+        """
+        Returns the commands entering oper with the viscous settings and
+        accumulating the polar in polar_file
+        """
+        commands = ['oper', 're' if self.viscous else 'visc']
+        commands += [re, 'mach', mach]
+        if self.jobs:
+            #Forget the boundary layers of the previous polar
+            commands += ['vpar', 'init', '']
+        return commands + ['pacc', polar_file, '']
+
+    def leavecommands(self):
+        """
+        Returns the commands stopping the polar accumulation and going back
+        to the main menu, ready for the next polar
+        """
+        return ['pacc', '']
+
+    def load(self, profile, profile_file):
+        for msg in self.loadcommands(profile, profile_file):
+            self.write(msg)
+        #The state changes once the solver took the commands
+        self.profile = profile
+
+    def oper(self, re, mach, polar_file):
+        for msg in self.opercommands(re, mach, polar_file):
+            self.write(msg)
+        self.viscous = True
+
+    def leave(self):
+        for msg in self.leavecommands():
+            self.write(msg)
+        self.jobs += 1
+
+    def kill(self):
+        self.backend.kill()
+
+    def close(self):
+        self.backend.close()
+
+
+class SessionPool(object):
+    """
+    Idle sessions by key, a session is closed instead of being reused when it
+    is broken or after max_jobs polars (None for no limit)
+    """
+
+    def __init__(self, max_jobs = 20):
+        self.max_jobs = max_jobs
+        self.idle = {}
+        self.lock = Lock()
+
+    def acquire(self, key, factory):
+        """
+        Returns an idle session for key or opens a new one with factory()
+        """
+        with self.lock:
+            sessions = self.idle.get(key)
+            if sessions:
+                return sessions.pop()
+        session = factory()
+        session.key = key
+        try:
+            session.open()
+        except Exception:
+            session.close()
+            raise
+        return session
+
+    def release(self, session, broken = False):
+        """
+        Gives a session back to the pool after a polar
+        """
+        if broken or session.broken or (self.max_jobs and session.jobs >= self.max_jobs):
+            session.close()
+            return
+        with self.lock:
+            self.idle.setdefault(session.key, []).append(session)
+
+    def discard(self, directory = None):
+        """
+        Closes the idle sessions working in directory, or all of them
+        """
+        with self.lock:
+            keys = [key for key, sessions in self.idle.items()
+                    if directory is None or any(s.directory == directory for s in sessions)]
+            sessions = [s for key in keys for s in self.idle.pop(key)]
+        for session in sessions:
+            session.close()
+
+    def close(self):
+        self.discard()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the staging of the profile files used by the Rfoil Thread described
+in Rfoil_parallel2. rfoil loads the profile from the polar directory, so the
+.dat file of the working directory has to be there. A profile is read,
+checked (at least 3 points of 2 coordinates) and hashed once per version of
+the file; its contents are kept in memory. It is then put in each polar
+directory by a hard link, a symbolic link or a copy, whichever works first,
+and only once per directory: the next polars and tries of the profile find
+it staged without reading the file or taking a lock. With a store directory
+the links point to an immutable content-addressed copy (<sha1>.dat), so
+editing the original file later does not change the staged profiles. The
+Rfoil Threads with a polar cache share the store of its profiles sub
+directory.
+
+"""
+
+import os
+import shutil
+import hashlib
+from threading import Lock
+import numpy as np
+from rfoil_locks import directory_lock
+
+
+def coordinates(data, name = 'profile'):
+    """
+    Returns the (x, y) points of the contents of a profile file, the name
+    line and the lines which are not 2 numbers are skipped
+    """
+    points = []
+    for line in data.decode(errors = 'replace').splitlines():
+        tokens = line.split()
+        if len(tokens) != 2:
+            continue
+        try:
+            points.append((float(tokens[0]), float(tokens[1])))
+        except ValueError:
+            continue
+    points = np.array(points, dtype = float).reshape(-1, 2)
+    if len(points) < 3 or not np.all(np.isfinite(points)):
+        raise ValueError('Invalid profile {0}: {1} points'.format(name, len(points)))
+    return points
+
+
+class ProfileStore(object):
+
+    def __init__(self, directory = None):
+        self.directory = directory
+        self.lock = Lock()
+        #Source path: (size, mtime, digest, data)
+        self.geometries = {}
+        #Staged path: digest
+        self.staged = {}
+
+    def load(self, path):
+        """
+        Returns the digest and contents of a profile file, read and checked
+        once per version of the file
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.geometries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            return entry[2:]
+        with open(path, 'rb') as file:
+            data = file.read()
+        coordinates(data, path)
+        digest = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            self.geometries[path] = (stat.st_size, stat.st_mtime, digest, data)
+        return digest, data
+
+    def origin(self, source, digest, data):
+        """
+        Returns the file the staged profiles link to: the content-addressed
+        copy in the store directory, or the source itself without store
+        """
+        if not self.directory:
+            return source
+        path = os.path.join(self.directory, digest + '.dat')
+        if not os.path.exists(path):
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory, exist_ok = True)
+            temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+            with open(temporary, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        return path
+
+    def stage(self, source, directory, name = None):
+        """
+        Puts the profile file source in directory (under name) if it is not
+        there yet, returns the staged path
+        """
+        digest, data = self.load(source)
+        destination = os.path.join(directory, name or os.path.basename(source))
+        if self.staged.get(destination) == digest:
+            return destination
+        with directory_lock(directory):
+            if os.path.exists(destination):
+                with open(destination, 'rb') as file:
+                    if file.read() == data:
+                        self.staged[destination] = digest
+                        return destination
+                os.remove(destination)
+            origin = os.path.abspath(self.origin(source, digest, data))
+            for link in [os.link, os.symlink, shutil.copyfile]:
+                try:
+                    link(origin, destination)
+                    break
+                except (OSError, NotImplementedError):
+                    if link is shutil.copyfile:
+                        raise
+            self.staged[destination] = digest
+        return destination
+
+
+#Cache directory: store of its profiles sub directory
+stores = {}
+stores_lock = Lock()
+
+
+def cache_store(cache_directory):
+    """
+    Returns the store shared by the users of a polar cache directory
+    """
+    directory = os.path.abspath(os.path.join(cache_directory, 'profiles'))
+    with stores_lock:
+        if directory not in stores:
+            stores[directory] = ProfileStore(directory)
+        return stores[directory]
+
+
+#Store of the Rfoil Threads without polar cache, linking to the source files
+default_store = ProfileStore()
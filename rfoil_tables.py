@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the post-processing of a Polars/<Profile>/RE<re>.dat tree (see
+Rfoil_parallel2) into one lookup table per profile: the columns (CL, CD,
+CM...) of all its polars resampled on a common grid of angles of attack,
+an array of shape (columns, Reynolds numbers, angles) written with the
+Reynolds numbers, the angles and a mask in <Profile>.npz. The mask is 1
+where the value comes from the polar, 0 where it is missing (outside of the
+polar or in a gap of non converged angles wider than max_gap) and 2 where it
+was extrapolated. With extrapolation = True CL and CD are extended to
++-180 degrees from both ends of each polar with the Viterna method (CL of
+the other columns stays missing there).
+The polar files are parsed in parallel worker processes, the resampling is
+done with one np.interp per polar and column. Tables newer than all the
+polar files of their profile are not built again.
+
+    python rfoil_tables.py Polars PolarTables [--step 0.5] [--extrapolate]
+
+"""
+
+import os
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from rfoil_polar import Polar, COLUMNS
+from rfoil_polardb import POLAR_FILE
+
+#Columns of the tables
+TABLE_COLUMNS = COLUMNS[1:]
+#Values of the mask
+MISSING = 0
+DATA = 1
+EXTRAPOLATED = 2
+
+
+def readpolar(path):
+    """
+    Returns the Reynolds number, angles of attack and columns of a polar
+    file (run in the worker processes)
+    """
+    polar = Polar.read(path).validated().deduplicated()
+    reynolds = polar.metadata.get('re') or float(POLAR_FILE.match(os.path.basename(path)).group(1))
+    values = np.full((len(TABLE_COLUMNS), len(polar)), np.nan)
+    for j, column in enumerate(TABLE_COLUMNS):
+        if column in polar.columns:
+            values[j] = polar[column]
+    return reynolds, polar.alpha.copy(), values
+
+
+def resample(alpha, values, grid, max_gap):
+    """
+    Interpolates the columns values (one row per column) of a polar on the
+    angles grid, returns them and the mask of the angles between two
+    computed angles at most max_gap apart
+    """
+    result = np.full((len(values), len(grid)), np.nan)
+    if len(alpha) == 0:
+        return result, np.zeros(len(grid), dtype = bool)
+    index = np.searchsorted(alpha, grid)
+    upper = np.clip(index, 1, max(len(alpha) - 1, 1))
+    lower = upper - 1
+    #A computed angle is valid whatever the gap before it
+    exact = np.isclose(alpha[np.clip(index, 0, len(alpha) - 1)], grid)
+    valid = (grid >= alpha[0]) & (grid <= alpha[-1]) & ((alpha[upper] - alpha[lower] <= max_gap) | exact)
+    for j, column in enumerate(values):
+        result[j] = np.interp(grid, alpha, column)
+    result[:, ~valid] = np.nan
+    return result, valid
+
+
+def viterna(alpha, anchor, cl_anchor, cd_anchor, cd_max):
+    """
+    Returns the CL and CD of the Viterna method at the angles alpha (degrees,
+    same side as the anchor) through the anchor point (last computed angle)
+    """
+    alpha = np.radians(alpha)
+    anchor = np.radians(anchor)
+    a2 = (cl_anchor - cd_max * np.sin(anchor) * np.cos(anchor)) * np.sin(anchor) / np.cos(anchor) ** 2
+    b2 = (cd_anchor - cd_max * np.sin(anchor) ** 2) / np.cos(anchor)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cl = cd_max / 2. * np.sin(2 * alpha) + a2 * np.cos(alpha) ** 2 / np.sin(alpha)
+    cd = cd_max * np.sin(alpha) ** 2 + b2 * np.cos(alpha)
+    return cl, cd
+
+
+def extrapolate(grid, cl, cd, valid, cd_max = 2.):
+    """
+    Fills CL and CD outside of the computed angles up to +-180 degrees:
+    Viterna up to +-90 degrees, the same curve mirrored (CL * -0.7) behind
+    and CL going linearly to 0 at +-180 degrees. Returns the mask of the
+    extrapolated angles.
+    """
+    extrapolated = np.zeros(len(grid), dtype = bool)
+    computed = np.nonzero(valid)[0]
+    if len(computed) == 0:
+        return extrapolated
+    for end, sign in ((computed[-1], 1), (computed[0], -1)):
+        anchor = grid[end]
+        if not 0 < sign * anchor < 90:
+            continue
+        side = grid > anchor if sign > 0 else grid < anchor
+        #Angle seen from the leading edge, mirrored behind +-90 degrees
+        front = np.where(np.abs(grid) <= 90, grid, sign * 180 - grid)
+        mirrored = np.abs(grid) > 90
+        near_edge = sign * front < sign * anchor
+        clipped = np.where(near_edge, anchor, front)
+        cl_side, cd_side = viterna(clipped, anchor, cl[end], cd[end], cd_max)
+        cl_side = np.where(mirrored, -0.7 * cl_side, cl_side)
+        #Linearly to 0 at +-180 degrees
+        cl_side = np.where(mirrored & near_edge, -0.7 * cl[end] * front / anchor, cl_side)
+        cl[side] = cl_side[side]
+        cd[side] = cd_side[side]
+        extrapolated |= side
+    return extrapolated
+
+
+def angle_steps(polars):
+    """
+    Returns the steps between the angles of the polars, rounded like the
+    angles of the polar files
+    """
+    steps = np.concatenate([np.diff(alpha) for reynolds, alpha, values in polars])
+    return np.round(steps[steps > 1e-6], 3)
+
+
+def grid_step(polars):
+    """
+    Returns the smallest step between the angles of the polars, so that the
+    angles added by an adaptive refinement are in the table
+    """
+    steps = angle_steps(polars)
+    if len(steps) == 0:
+        return 1.
+    return float(steps.min())
+
+
+def common_step(polars):
+    """
+    Returns the most common step between the angles of the polars (the
+    angle_step of refined polars)
+    """
+    steps, counts = np.unique(angle_steps(polars), return_counts = True)
+    if len(steps) == 0:
+        return 1.
+    return float(steps[np.argmax(counts)])
+
+
+def make_table(polars, step = None, max_gap = None, extrapolation = False, cd_max = 2.):
+    """
+    Returns the table of the polars of a profile (list of (reynolds, alpha,
+    values)): dict of reynolds, alpha, columns, values and mask
+    """
+    polars = sorted(polars, key = lambda polar: polar[0])
+    step = step or grid_step(polars)
+    #The gaps are those of the polars, not of a finer grid
+    max_gap = max_gap or 2.5 * max(step, common_step(polars))
+    if extrapolation:
+        low, high = -180., 180.
+    else:
+        low = min(alpha[0] for reynolds, alpha, values in polars if len(alpha))
+        high = max(alpha[-1] for reynolds, alpha, values in polars if len(alpha))
+    grid = np.round(np.arange(np.floor(low / step) * step, np.ceil(high / step) * step + step / 2, step), 6)
+    values = np.full((len(TABLE_COLUMNS), len(polars), len(grid)), np.nan)
+    mask = np.zeros((len(polars), len(grid)), dtype = np.uint8)
+    cl, cd = TABLE_COLUMNS.index('CL'), TABLE_COLUMNS.index('CD')
+    for i, (reynolds, alpha, columns) in enumerate(polars):
+        values[:, i], valid = resample(alpha, columns, grid, max_gap)
+        mask[i, valid] = DATA
+        if extrapolation:
+            extrapolated = extrapolate(grid, values[cl, i], values[cd, i], valid, cd_max)
+            mask[i, extrapolated] = EXTRAPOLATED
+    return {'reynolds': np.array([polar[0] for polar in polars]), 'alpha': grid,
+            'columns': np.array(TABLE_COLUMNS), 'values': values.astype(np.float32), 'mask': mask}
+
+
+def write_table(path, table):
+    temporary = path + '.tmp.npz'
+    np.savez(temporary, **table)
+    os.replace(temporary, path)
+
+
+def read_table(path):
+    """
+    Returns the table of a profile written by build_tables
+    """
+    with np.load(path) as data:
+        return dict((name, data[name]) for name in data.files)
+
+
+def polar_files(root_directory, profiles = None):
+    """
+    Returns the polar files by profile of a Polars tree
+    """
+    files = {}
+    for directory in sorted(glob.glob(os.path.join(root_directory, '*'))):
+        profile = os.path.basename(directory)
+        if not os.path.isdir(directory) or (profiles and profile not in profiles):
+            continue
+        paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                 if POLAR_FILE.match(name)]
+        if paths:
+            files[profile] = paths
+    return files
+
+
+def build_tables(root_directory = 'Polars', table_directory = 'PolarTables', profiles = None, step = None,
+                 max_gap = None, extrapolation = False, cd_max = 2., workers = None, force = False):
+    """
+    Writes the table of each profile of a Polars tree whose polars changed,
+    returns the paths of the tables written
+    """
+    files = polar_files(root_directory, profiles)
+    if not os.path.exists(table_directory):
+        os.makedirs(table_directory)
+    todo = {}
+    for profile, paths in files.items():
+        table_file = os.path.join(table_directory, profile + '.npz')
+        if force or not os.path.exists(table_file) or \
+                os.path.getmtime(table_file) < max(os.path.getmtime(path) for path in paths):
+            todo[profile] = paths
+    paths = [path for profile in sorted(todo) for path in todo[profile]]
+    if not paths:
+        return []
+    if workers == 1 or len(paths) == 1:
+        polars = [readpolar(path) for path in paths]
+    else:
+        #A few chunks of files per worker
+        chunksize = max(len(paths) // (4 * (workers or os.cpu_count() or 1)), 1)
+        with ProcessPoolExecutor(workers) as executor:
+            polars = list(executor.map(readpolar, paths, chunksize = chunksize))
+    written = []
+    start = 0
+    for profile in sorted(todo):
+        profile_polars = [polar for polar in polars[start:start + len(todo[profile])] if len(polar[1])]
+        start += len(todo[profile])
+        if not profile_polars:
+            continue
+        table_file = os.path.join(table_directory, profile + '.npz')
+        write_table(table_file, make_table(profile_polars, step, max_gap, extrapolation, cd_max))
+        written.append(table_file)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Builds a Reynolds x alpha table per profile from a Polars tree')
+    parser.add_argument('root_directory', nargs = '?', default = 'Polars', help = 'Polars tree')
+    parser.add_argument('table_directory', nargs = '?', default = 'PolarTables', help = 'output directory')
+    parser.add_argument('--profiles', nargs = '*', default = None, help = 'only these profiles')
+    parser.add_argument('--step', type = float, default = None, help = 'step of the angles (default: smallest of the polars)')
+    parser.add_argument('--max-gap', type = float, default = None, help = 'widest gap interpolated (default: 2.5 times the most common step)')
+    parser.add_argument('--extrapolate', action = 'store_true', help = 'extrapolate CL and CD to +-180 degrees')
+    parser.add_argument('--cd-max', type = float, default = 2., help = 'drag of the flat plate for the extrapolation')
+    parser.add_argument('--workers', type = int, default = None, help = 'worker processes (default: cpu count)')
+    parser.add_argument('--force', action = 'store_true', help = 'build the tables even if they are up to date')
+    args = parser.parse_args()
+    written = build_tables(args.root_directory, args.table_directory, args.profiles, args.step, args.max_gap,
+                           args.extrapolate, args.cd_max, args.workers, args.force)
+    print('{0} tables written'.format(len(written)))
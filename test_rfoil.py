@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the Rfoil Thread against the fake solver (see
+fake_rfoil), driven through the pipe backend.
+
+    python -m pytest -q
+
+"""
+
+import os
+import sys
+import time
+import pytest
+from fake_rfoil import fake_cmd
+from rfoil_polar import Polar
+from rfoil_backends import make_backend, PipeBackend
+from rfoil_async import AsyncRfoil
+from Rfoil_parallel2 import Rfoil, STARTUP_TIMEOUT, TIMEOUT, CRASH, NONCONVERGENCE, TOO_FEW_ROWS
+
+
+def test_pipe_backend(workdir):
+    backend = make_backend('pipe', fake_cmd(), ready = 'prompt', timeout = 5, startup_timeout = 5)
+    assert isinstance(backend, PipeBackend)
+    backend.open(str(workdir))
+    try:
+        for line in ['nac4', '0012', 'oper', 'visc', '1e6', 'alfa', '2', '']:
+            backend.write(line)
+        assert backend.prompts == 9
+    finally:
+        backend.close()
+    assert backend.popen is None
+
+
+def test_complete_polar(make_rfoil):
+    rfoil = make_rfoil()
+    rfoil.run()
+    assert rfoil.success and rfoil.failure is None
+    assert rfoil.failures == [None]
+    polar = Polar.read(rfoil.file_fullpath)
+    assert len(polar) == 41
+    assert polar.alpha[0] == -10 and polar.alpha[-1] == 10
+
+
+def test_resume_segments(make_rfoil):
+    rfoil = make_rfoil(angle_max = 3, angle_step = 1)
+    rfoil.polar = Polar.empty()
+    assert rfoil.segments() == [(0.0, 3.0, True), (-1.0, -3.0, True)]
+    rows = Polar.empty().data.copy()
+    rows.resize(4)
+    rows['alpha'] = [-1., 0., 1., 3.]
+    rfoil.polar = Polar.empty().withdata(rows)
+    #Only the missing angles are computed again, from the converged neighbour
+    assert rfoil.segments(False) == [(1.0, 2.0, False), (-1.0, -3.0, False)]
+    assert rfoil.segments(True) == [(2.0, 2.0, True), (-2.0, -3.0, True)]
+
+
+def test_resume_keeps_rows(make_rfoil, events):
+    rfoil = make_rfoil(fake_cmd(seed = 3, nonconv = 0.8), angle_max = 15, tries_max = 4, metrics = events)
+    rfoil.run()
+    tries = events.named('try')
+    assert tries[0]['failure'] == NONCONVERGENCE
+    assert len(tries) > 1
+    #A retry adds rows to those of the previous tries
+    for previous, current in zip(tries, tries[1:]):
+        assert current['rows'] == previous['rows'] + current['new_rows']
+    assert len(Polar.read(rfoil.file_fullpath)) == tries[-1]['rows']
+
+
+def test_previous_polar_kept(make_rfoil, workdir):
+    rfoil = make_rfoil(fake_cmd(seed = 1, nonconv = 1), angle_max = 15, tries_max = 1)
+    rows = ''.join('{0:8.3f}   0.1000   0.01000\n'.format(alpha * 0.5) for alpha in range(-30, 31))
+    (workdir / 'Polars' / 'Naca0012' / 'RE1e6.dat').write_text(rows)
+    rfoil.run()
+    #The new polar has less rows than the one computed before
+    assert (workdir / 'Polars' / 'Naca0012' / 'RE1e6.dat').read_text() == rows
+
+
+def test_split(make_rfoil, workdir):
+    rfoil = make_rfoil(split = 4)
+    rfoil.polar = Polar.empty()
+    groups = rfoil.share(rfoil.segments(), 4)
+    assert groups == [[(0.0, 5.0, True)], [(5.5, 10.0, True)], [(-0.5, -5.0, True)], [(-5.5, -10.0, True)]]
+    assert rfoil.share([(3.0, 3.0, False)], 3) == [[(3.0, 3.0, False)], [], []]
+    del rfoil.polar
+    rfoil.run()
+    assert rfoil.failures == [None]
+    assert len(Polar.read(rfoil.file_fullpath)) == 41
+    #The part files of the other sessions are merged and removed
+    assert sorted(os.listdir(str(workdir / 'Polars' / 'Naca0012'))) == ['Naca0012.log', 'RE1e6.dat']
+
+
+def test_startup_timeout(make_rfoil):
+    cmd = '{0} -c "import time; time.sleep(30)"'.format(sys.executable)
+    rfoil = make_rfoil(cmd, tries_max = 1, startup_timeout = 1)
+    rfoil.run()
+    assert rfoil.failures == [STARTUP_TIMEOUT]
+    assert rfoil.failure == TOO_FEW_ROWS
+
+
+def test_timeout(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(solve_time = 5), tries_max = 1, timeout = 0.5)
+    start = time.time()
+    rfoil.run()
+    assert rfoil.failures == [TIMEOUT]
+    assert time.time() - start < 5
+
+
+def test_attempt_timeout(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(solve_time = 0.2), tries_max = 2, attempt_timeout = 0.5)
+    start = time.time()
+    rfoil.run()
+    assert rfoil.failures == [TIMEOUT, TIMEOUT]
+    assert rfoil.failure == TOO_FEW_ROWS
+    assert time.time() - start < 5
+
+
+def test_crash(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(crash = 1), tries_max = 2)
+    rfoil.run()
+    assert rfoil.failures == [CRASH, CRASH]
+    assert rfoil.failure == TOO_FEW_ROWS
+
+
+def test_nonconvergence(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(seed = 1, nonconv = 1), angle_max = 15, tries_max = 2)
+    rfoil.run()
+    assert rfoil.failures == [NONCONVERGENCE, NONCONVERGENCE]
+    #The missing angles are computed the other way on the retry
+    assert rfoil.init_gaps is False
+
+
+def test_adaptive(make_rfoil, events):
+    rfoil = make_rfoil(angle_max = 20, angle_step = 2, adaptive = True, min_step = 0.25, metrics = events)
+    rfoil.run()
+    assert rfoil.failure is None and events.named('refine')
+    polar = Polar.read(rfoil.file_fullpath)
+    steps = set(round(float(step), 3) for step in polar.alpha[1:] - polar.alpha[:-1])
+    #Finer steps where the polar is not linear, none below min_step
+    assert len(polar) > 21 and 2. in steps and min(steps) >= 0.25
+    assert not os.path.exists(os.path.join(rfoil.polar_directory, rfoil.refinefile()))
+
+
+@pytest.mark.parametrize('cls', [Rfoil, AsyncRfoil])
+def test_refine_after_attempt_timeout(make_rfoil, events, cls):
+    rfoil = make_rfoil(fake_cmd(seed = 1, solve_time = 0.05), cls = cls, angle_max = 20, angle_step = 1,
+                       tries_max = 1, attempt_timeout = 1.6, adaptive = True, metrics = events)
+    rfoil.run()
+    #Enough rows before the watchdog expired, the refinement has a watchdog of its own
+    assert rfoil.failures == [TIMEOUT] and rfoil.failure is None
+    refine = events.named('refine')
+    assert refine and all(event['converged'] == event['angles'] > 0 for event in refine)
+    assert all(event['duration'] < 1.6 for event in refine)
+    assert rfoil.refinement is None and rfoil.active == []
+
+
+def test_refinement_attempt_timeout(make_rfoil, events):
+    rfoil = make_rfoil(fake_cmd(seed = 1, solve_time = 0.02), angle_max = 10, angle_step = 1, tries_max = 1,
+                       attempt_timeout = 0.8, adaptive = True, min_step = 1 / 64., metrics = events)
+    #Every interval is refined
+    rfoil.refine_cl = rfoil.refine_cd = 1e-9
+    start = time.time()
+    rfoil.run()
+    assert time.time() - start < 2.
+    assert rfoil.failures == [None] and rfoil.failure is None
+    refine, = events.named('refine')
+    #The step was stopped by the watchdog, the angles computed before are kept
+    assert 0 < refine['converged'] < refine['angles'] and len(rfoil.polar) == 21 + refine['converged']
+    log = open(os.path.join(rfoil.polar_directory, rfoil.log_file)).read()
+    assert 'refinement stopped: timeout' in log
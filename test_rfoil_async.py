@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the asyncio runner (see rfoil_async) and of the state
+kept by the sessions (see rfoil_sessions).
+
+"""
+
+import time
+import asyncio
+import pytest
+from fake_rfoil import fake_cmd
+from rfoil_polar import Polar
+from rfoil_backends import SolverError
+from rfoil_scheduler import make_jobs
+from rfoil_sessions import Session, SessionPool
+from rfoil_async import AsyncRfoil, run_polar, run_batch
+from Rfoil_parallel2 import TIMEOUT
+
+
+def test_run_polar(workdir):
+    rfoil = asyncio.run(run_polar(cmd = fake_cmd(seed = 1), rootdir = 'Polars', profile = 'Naca0012',
+                                  re = '1e6', mach = 0.1, angle_max = 10, angle_step = 0.5))
+    assert rfoil.success and rfoil.failure is None
+    assert len(Polar.read(str(workdir / 'Polars' / 'Naca0012' / 'RE1e6.dat'))) == 41
+
+
+def test_run_batch(workdir):
+    async def collect():
+        jobs = make_jobs(['Naca0012', 'Naca0015'], ['1e5', '1e6'], cmd = fake_cmd(seed = 1), rootdir = 'Polars',
+                         mach = 0.1, angle_max = 5, angle_step = 0.5)
+        return [rfoil async for rfoil in run_batch(jobs, max_running = 2)]
+    results = asyncio.run(collect())
+    assert sorted((rfoil.profile, rfoil.re) for rfoil in results) == [
+        ('Naca0012', '1e5'), ('Naca0012', '1e6'), ('Naca0015', '1e5'), ('Naca0015', '1e6')]
+    assert all(rfoil.success and len(rfoil.polar) == 21 for rfoil in results)
+
+
+def test_stop(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(seed = 1, solve_time = 0.05), cls = AsyncRfoil, angle_max = 20, angle_step = 0.25)
+    rfoil.start()
+    while not rfoil.active:
+        time.sleep(0.01)
+    start = time.time()
+    rfoil.stop()
+    rfoil.join(5)
+    #The running session was killed instead of finishing its sweeps
+    assert not rfoil.is_alive()
+    assert time.time() - start < 1.
+    assert rfoil.active == []
+
+
+def test_attempt_timeout(make_rfoil):
+    rfoil = make_rfoil(fake_cmd(seed = 1, solve_time = 0.05), cls = AsyncRfoil, angle_max = 20,
+                       angle_step = 0.25, tries_max = 1, attempt_timeout = 0.5)
+    start = time.time()
+    rfoil.run()
+    assert time.time() - start < 3.
+    assert rfoil.failures == [TIMEOUT]
+
+
+class Backend(object):
+    """
+    Backend failing on the command fail
+    """
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    def open(self, directory):
+        pass
+
+    def write(self, msg):
+        self.sent.append(str(msg))
+        if str(msg) == self.fail:
+            raise SolverError('Solver closed its output')
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize('fail, profile, viscous', [('nac4', None, False), ('visc', 'Naca0012', False)])
+def test_failed_command(fail, profile, viscous):
+    session = Session(Backend(fail), 'Polars')
+    with pytest.raises(SolverError):
+        session.load('Naca0012', None)
+        session.oper('1e6', 0.1, 'RE1e6.dat')
+    #The state is the one of the last commands taken by the solver
+    assert (session.profile, session.viscous, session.broken) == (profile, viscous, True)
+    pool = SessionPool()
+    pool.release(session)
+    assert session.backend.closed and pool.idle == {}
+
+
+def test_session_reuse():
+    session = Session(Backend(None), 'Polars')
+    for re in ['1e5', '1e6']:
+        session.load('Naca0012', None)
+        session.oper(re, 0.1, 'RE{0}.dat'.format(re))
+        session.leave()
+    assert session.backend.sent.count('nac4') == 1
+    assert session.backend.sent.count('visc') == 1 and session.backend.sent.count('re') == 1
+    assert session.jobs == 2 and not session.broken
+    pool = SessionPool()
+    pool.release(session)
+    assert not session.backend.closed
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the batch command line (see rfoil_batch).
+
+"""
+
+import os
+import json
+import pytest
+import numpy as np
+from fake_rfoil import fake_cmd
+from rfoil_polardb import PolarDB
+from rfoil_batch import DEFAULTS, read_spec, format_re, expand_reynolds, expand_profiles, expand, run
+
+
+def write_spec(path, **spec):
+    with open(path, 'w') as file:
+        json.dump(spec, file)
+    return path
+
+
+def test_read_spec(workdir):
+    spec = read_spec(write_spec('batch.json', profiles = ['Naca0012'], reynolds = ['1e6'], max_running = 2))
+    assert spec['max_running'] == 2 and spec['angle_step'] == DEFAULTS['angle_step']
+    with pytest.raises(ValueError):
+        read_spec(write_spec('typo.json', profiles = ['Naca0012'], max_runing = 2))
+    with open('batch.toml', 'w') as file:
+        file.write('profiles = ["Naca0012"]\nreynolds = {from = 1e5, to = 1e7, count = 3}\n')
+    assert read_spec('batch.toml')['reynolds'] == {'from': 1e5, 'to': 1e7, 'count': 3}
+
+
+def test_reynolds():
+    assert format_re(1e6) == '1e6' and format_re(2.5e6) == '2.5e6' and format_re('1e6') == '1e6'
+    assert expand_reynolds({'from': 1e5, 'to': 1e7, 'count': 5}) == ['1e5', '3.16e5', '1e6', '3.16e6', '1e7']
+    assert expand_reynolds(500000.) == ['5e5']
+
+
+def test_profiles(workdir):
+    os.makedirs('profiles')
+    for name in ['S1223.dat', 'Clarky.dat']:
+        open(os.path.join('profiles', name), 'w').close()
+    assert expand_profiles(['Naca0012', 'profiles/*.dat']) == [
+        ('Naca0012', None), ('Clarky', os.path.join('profiles', 'Clarky.dat')),
+        ('S1223', os.path.join('profiles', 'S1223.dat'))]
+    with pytest.raises(ValueError):
+        expand_profiles(['missing/*.dat'])
+
+
+def test_expand(workdir):
+    os.makedirs('profiles')
+    open(os.path.join('profiles', 'S1223.dat'), 'w').close()
+    spec = dict(DEFAULTS, profiles = ['Naca0012', 'naca0012', 'profiles/S1223.dat'],
+                reynolds = ['1e6', 1e6, '2e6'], mach = [0.1, 0.2])
+    jobs, staging = expand(spec)
+    #The duplicates are removed, one sub directory by Mach number
+    assert len(jobs) == 8
+    assert sorted(set(job['rootdir'] for job in jobs)) == [os.path.join('Polars', 'M0.1'), os.path.join('Polars', 'M0.2')]
+    assert staging == {os.path.join('Polars', 'M0.1', 'S1223'): os.path.join('profiles', 'S1223.dat'),
+                       os.path.join('Polars', 'M0.2', 'S1223'): os.path.join('profiles', 'S1223.dat')}
+    assert expand(dict(spec, mach = 0.1))[0][0]['rootdir'] == 'Polars'
+
+
+def test_run(workdir):
+    spec = read_spec(write_spec('batch.json', cmd = fake_cmd(seed = 1), backend = 'pipe', profiles = ['Naca0012'],
+                                reynolds = ['1e5', '1e6'], mach = [0.1, 0.2], angle_max = 5, max_running = 2,
+                                table_directory = None))
+    assert run(spec, 'batch.json', dry_run = True) is None
+    data = run(spec, 'batch.json')
+    with open('manifest.json') as file:
+        assert json.load(file) == data
+    assert data['finished'] is not None and len(data['polars']) == 4
+    assert all(polar['success'] and polar['rows'] == 21 for polar in data['polars'])
+    #One database by Mach number
+    for mach in ['M0.1', 'M0.2']:
+        database = PolarDB(os.path.join('PolarDB', mach))
+        assert database.reynolds('Naca0012') == [1e5, 1e6]
+        assert np.isfinite(database.query('Naca0012', 1e6, 2.)[0]).all()
+    #Nothing is computed again, the polars come from the cache
+    data = run(spec, 'batch.json')
+    assert all(polar['cached'] for polar in data['polars'])
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the polar cache (see rfoil_cache).
+
+"""
+
+import os
+import time
+from rfoil_cache import PolarCache
+
+
+def test_key():
+    cache = PolarCache('PolarCache')
+    key = cache.key('Naca0012', '1e6', 0.1, 20, 0.5, 5, 'rfoil')
+    assert key == cache.key('Naca0012', 1e6, '0.1', 20., 0.5, 5, 'rfoil')
+    assert key != cache.key('Naca0015', '1e6', 0.1, 20, 0.5, 5, 'rfoil')
+    assert key != cache.key('Naca0012', '2e6', 0.1, 20, 0.5, 5, 'rfoil')
+    assert key != cache.key('Naca0012', '1e6', 0.1, 20, 0.25, 5, 'rfoil')
+    assert key != cache.key('Naca0012', '1e6', 0.1, 20, 0.5, 5, 'rfoil2')
+    assert key != cache.key('Naca0012', '1e6', 0.1, 20, 0.5, 5, 'rfoil', [0.125, None])
+    #A profile file is identified by its contents
+    assert cache.key(b'profile\n0 0\n', '1e6', 0.1, 20, 0.5, 5, 'rfoil') != \
+        cache.key(b'profile\n0 0.1\n', '1e6', 0.1, 20, 0.5, 5, 'rfoil')
+
+
+def test_hit_miss(workdir):
+    cache = PolarCache('PolarCache')
+    (workdir / 'polar.dat').write_text('   0.000   0.0000   0.00600\n')
+    key = cache.key('Naca0012', '1e6', 0.1, 20, 0.5, 5, 'rfoil')
+    assert not cache.get(key, 'copy.dat')
+    assert not os.path.exists('copy.dat')
+    cache.put(key, 'polar.dat')
+    assert cache.get(key, 'copy.dat')
+    assert (workdir / 'copy.dat').read_text() == (workdir / 'polar.dat').read_text()
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1, 'size': 28}
+
+
+def test_eviction(workdir):
+    cache = PolarCache('PolarCache', max_size = 250)
+    (workdir / 'polar.dat').write_text('x' * 100)
+    for name in ['a', 'b']:
+        cache.put(name, 'polar.dat')
+    #Least recently used first: b, then a (just read)
+    os.utime(cache.path('b'), (time.time() - 10, time.time() - 10))
+    assert cache.get('a', 'copy.dat')
+    cache.put('c', 'polar.dat')
+    assert sorted(os.listdir('PolarCache')) == ['a.dat', 'c.dat']
+
+
+def test_rfoil_from_cache(make_rfoil, events):
+    cache = PolarCache('PolarCache')
+    first = make_rfoil(cache = cache)
+    first.run()
+    second = make_rfoil(cache = cache, metrics = events)
+    second.run()
+    assert second.success and second.failure is None
+    assert [event['cached'] for event in events.named('polar')] == [True]
+    with open(first.file_fullpath) as file:
+        assert len(file.readlines()) == 41
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the distributed polar generation (see
+rfoil_distributed): a coordinator and several workers on localhost.
+
+"""
+
+import os
+from threading import Thread
+from fake_rfoil import fake_cmd
+from rfoil_polar import Polar
+from rfoil_scheduler import make_jobs
+from rfoil_distributed import Coordinator, Worker
+
+
+def coordinator(count = 4, **options):
+    jobs = make_jobs(['Naca0012', 'Naca0015'], ['1e5', '1e6', '2e6', '5e6'][:count // 2],
+                     mach = 0.1, angle_max = 5, angle_step = 0.5, tries_max = 2)
+    return Coordinator(jobs, 'Polars', port = 0, **options)
+
+
+def worker(coordinator, name, **options):
+    return Worker(coordinator.address, fake_cmd(seed = 1, solve_time = 0.005), os.path.join('Workers', name),
+                  name, backend = 'pipe', ready = 'prompt', retries = 3, **options)
+
+
+def serve(coordinator):
+    results = {}
+    thread = Thread(target = lambda: results.update(coordinator.serve(linger = 0.5)), daemon = True)
+    thread.start()
+    return thread, results
+
+
+def test_workers(workdir):
+    server = coordinator(8, token = 'secret')
+    thread, results = serve(server)
+    workers = [worker(server, 'worker{0}'.format(i), token = 'secret') for i in range(3)]
+    threads = [Thread(target = w.run, daemon = True) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    thread.join(10)
+    assert not thread.is_alive() and not any(t.is_alive() for t in threads)
+    assert sorted(results) == list(range(8))
+    assert all(result['success'] for result in results.values())
+    #Several workers took part
+    assert len(set(result['worker'] for result in results.values())) > 1
+    for profile in ['Naca0012', 'Naca0015']:
+        names = sorted(os.listdir(str(workdir / 'Polars' / profile)))
+        assert names == [profile + '.log', 'RE1e5.dat', 'RE1e6.dat', 'RE2e6.dat', 'RE5e6.dat']
+        assert len(Polar.read(str(workdir / 'Polars' / profile / 'RE1e6.dat'))) == 21
+
+
+def test_invalid_token():
+    server = coordinator(2, token = 'secret')
+    thread, results = serve(server)
+    try:
+        #The worker gives up instead of computing anything
+        worker(server, 'intruder', token = 'wrong').run()
+        assert results == {} and server.results == {}
+        assert server.handle({'op': 'get', 'worker': 'intruder'}) == {'error': 'invalid token'}
+    finally:
+        server.server.shutdown()
+        server.server.server_close()
+
+
+def test_expired_lease():
+    server = coordinator(2, lease = 0.4)
+    thread, results = serve(server)
+    #A worker taking a job and dying
+    lost = server.handle({'op': 'get', 'worker': 'lost'})
+    good = worker(server, 'good')
+    good.run()
+    thread.join(10)
+    assert sorted(results) == [0, 1]
+    assert results[lost['id']]['worker'] == 'good'
+    assert server.lease_count[lost['id']] == 2
+
+
+def test_first_result_kept(workdir):
+    server = coordinator(2)
+    try:
+        job = server.handle({'op': 'get', 'worker': 'first'})
+        for name, polar in [('first', '   1.000   0.1000   0.01000\n'), ('second', '   2.000   0.2000   0.02000\n')]:
+            assert server.handle({'op': 'result', 'worker': name, 'id': job['id'], 'polar': polar, 'log': None,
+                                  'success': True, 'failure': None}) == {'ok': True}
+        assert (workdir / 'Polars' / 'Naca0012' / 'RE1e5.dat').read_text() == '   1.000   0.1000   0.01000\n'
+        assert server.results[job['id']]['worker'] == 'first'
+        assert server.handle({'op': 'result', 'worker': 'first', 'id': 99}) == {'error': 'unknown job 99'}
+    finally:
+        server.server.server_close()
+
+
+def test_worker_survives_errors(monkeypatch):
+    server = coordinator(2)
+    thread, results = serve(server)
+    good = worker(server, 'good')
+    calls = []
+    call = Worker.call
+
+    def failing(self, request):
+        #The coordinator rejects the first result
+        calls.append(request['op'])
+        if request['op'] == 'result' and calls.count('result') == 1:
+            raise RuntimeError('rejected')
+        return call(self, request)
+    monkeypatch.setattr(Worker, 'call', failing)
+    good.run()
+    thread.join(10)
+    assert sorted(results) == [0, 1]
+    assert calls.count('result') == 3
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the directory locks (see rfoil_locks).
+
+"""
+
+import os
+import time
+from threading import Thread, Event
+import rfoil_locks
+from rfoil_locks import directory_lock
+
+
+def test_one_lock_per_directory(workdir):
+    lock = directory_lock('Polars/Naca0012')
+    assert directory_lock(os.path.join(str(workdir), 'Polars', 'Naca0012')) is lock
+    assert directory_lock('Polars/Naca0015') is not lock
+    #Reentrant
+    with lock:
+        with lock:
+            pass
+    assert lock.acquisitions == 2
+
+
+def test_wait_time():
+    lock = directory_lock('Polars/Naca0018')
+    taken = Event()
+
+    def hold():
+        with lock:
+            taken.set()
+            time.sleep(0.2)
+    thread = Thread(target = hold)
+    thread.start()
+    taken.wait()
+    with lock:
+        pass
+    thread.join()
+    assert lock.acquisitions == 2
+    assert 0.1 < lock.max_wait <= lock.wait_time
+    stats = dict((stat[0], stat[1:]) for stat in rfoil_locks.contention())
+    assert stats[lock.name] == (2, lock.wait_time, lock.max_wait)
+    assert 'acquisitions' in rfoil_locks.report()
+
+
+def test_other_directories_do_not_wait():
+    lock = directory_lock('Polars/Naca2412')
+    other = directory_lock('Polars/Naca4412')
+
+    def take():
+        with other:
+            pass
+    with lock:
+        thread = Thread(target = take)
+        thread.start()
+        thread.join(1)
+        assert not thread.is_alive()
+    assert other.max_wait < 0.1
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the timing metrics (see rfoil_metrics).
+
+"""
+
+import json
+from rfoil_metrics import Metrics, summarize
+
+
+def test_sink(workdir):
+    metrics = Metrics('metrics.jsonl', flush_interval = 0.05)
+    metrics.record('spawn', profile = 'Naca0012', re = '1e6', duration = 0.5)
+    metrics.record('command', profile = 'Naca0012', re = '1e6', command = 'oper', send = 0.01, wait = 0.1)
+    metrics.record('polar', profile = 'Naca0012', re = '1e6', duration = 2., rows = 41, success = True)
+    metrics.close()
+    with open('metrics.jsonl') as file:
+        events = [json.loads(line) for line in file]
+    assert [event['event'] for event in events] == ['spawn', 'command', 'polar']
+    assert all('time' in event for event in events)
+    summary = metrics.summary()
+    assert summary == summarize('metrics.jsonl')
+    assert summary.startswith('Naca0012 RE1e6: 2.00 s wall, spawn 0.50 s (1), commands 0.10 s waiting')
+    assert summary.endswith('0 tries, 41 rows')
+
+
+def test_rfoil_events(make_rfoil):
+    metrics = Metrics('metrics.jsonl')
+    rfoil = make_rfoil(metrics = metrics)
+    rfoil.run()
+    metrics.close()
+    with open('metrics.jsonl') as file:
+        events = [json.loads(line) for line in file]
+    names = [event['event'] for event in events]
+    assert names[0] == 'start' and names[-1] == 'polar'
+    for name in ['spawn', 'session', 'command', 'sweep', 'try']:
+        assert name in names
+    assert names.count('sweep') == 2
+    polar = events[-1]
+    assert polar['rows'] == 41 and polar['success'] and not polar['cached']
+    assert (polar['profile'], polar['re'], polar['angle_max']) == ('Naca0012', '1e6', 10)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the polar parser (see rfoil_polar).
+
+"""
+
+import os
+import numpy as np
+from rfoil_polar import Polar, PolarTail, COLUMNS
+
+HEADER = """
+       RFOIL  Version 1.1
+
+ Calculated polar for: NACA 0012
+
+ Mach =   0.100     Re =     1.000 e 6     Ncrit =   9.000
+ xtrf =   1.000 (top)        1.000 (bottom)
+
+   alpha    CL        CD       CDp       CM     Top_Xtr  Bot_Xtr
+  ------ -------- --------- --------- -------- -------- --------
+
+"""
+
+ROWS = """   0.000   0.0000   0.00600   0.00180  -0.0200   0.6000   0.6000
+   1.000   0.1042   0.00611   0.00183  -0.0200   0.5600   0.6400
+  -1.000  -0.1042   0.00611   0.00183  -0.0200   0.6400   0.5600
+"""
+
+
+def test_round_trip(workdir):
+    (workdir / 'polar.dat').write_text(HEADER + ROWS)
+    polar = Polar.read('polar.dat')
+    assert polar.columns == COLUMNS
+    assert polar.metadata == {'name': 'NACA 0012', 'mach': 0.1, 're': 1e6, 'ncrit': 9.,
+                              'xtrf_top': 1., 'xtrf_bottom': 1.}
+    assert polar.alpha.tolist() == [0., 1., -1.]
+    assert polar['CL'][1] == 0.1042
+    polar.write('copy.dat')
+    assert (workdir / 'copy.dat').read_text() == HEADER + ROWS
+    copy = Polar.read('copy.dat')
+    assert (copy.data == polar.data).all() and copy.metadata == polar.metadata
+    #The rows are written back in the format of rfoil
+    polar.write('rows.dat', header = False)
+    assert (workdir / 'rows.dat').read_text() == ROWS
+    assert (Polar.read('rows.dat').data == polar.data).all()
+
+
+def test_invalid_rows(workdir):
+    (workdir / 'polar.dat').write_text(HEADER + ROWS + '   2.000 ********   0.00650   0.00190  -0.0200\n')
+    polar = Polar.read('polar.dat')
+    assert len(polar) == 4 and np.isnan(polar['CL'][3])
+    assert polar.validated().alpha.tolist() == [0., 1., -1.]
+
+
+def test_merge(workdir):
+    (workdir / 'polar.dat').write_text(ROWS)
+    polar = Polar.read('polar.dat')
+    other = polar.withdata(polar.data[:2].copy())
+    other.data['alpha'] = [1., 2.]
+    merged = polar.merge(other)
+    assert merged.alpha.tolist() == [-1., 0., 1., 2.]
+    #The rows of the other polar replace those of the same angle
+    assert merged['CL'][2] == 0.
+    assert merged.angles() == {-1., 0., 1., 2.}
+    assert len(Polar.empty().merge(polar)) == 3 and len(polar.merge(Polar.empty())) == 3
+
+
+def test_tail(workdir):
+    tail = PolarTail('RE1e6.dat')
+    assert not tail.read() and len(tail.polar()) == 0
+    first, second, third = ROWS.splitlines(True)
+    with open('RE1e6.dat', 'w') as file:
+        file.write(HEADER + first + second[:20])
+    assert tail.read()
+    assert tail.polar().alpha.tolist() == [0.]
+    offset = tail.offset
+    #Only the appended bytes are read, the incomplete row is completed
+    with open('RE1e6.dat', 'a') as file:
+        file.write(second[20:] + third)
+    assert tail.read() and tail.offset > offset
+    assert sorted(tail.polar().alpha.tolist()) == [-1., 0., 1.]
+    assert not tail.read()
+
+
+def test_tail_new_file(workdir):
+    tail = PolarTail('RE1e6.dat')
+    with open('RE1e6.dat', 'w') as file:
+        file.write(HEADER + ROWS)
+    tail.read()
+    #The next try starts a new file
+    with open('RE1e6.tmp', 'w') as file:
+        file.write(HEADER + ROWS.splitlines(True)[2])
+    os.replace('RE1e6.tmp', 'RE1e6.dat')
+    assert tail.read()
+    assert tail.polar().alpha.tolist() == [-1.]
+    os.remove('RE1e6.dat')
+    assert tail.read() and len(tail.polar()) == 0
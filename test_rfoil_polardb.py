@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the polar database (see rfoil_polardb).
+
+"""
+
+import os
+import numpy as np
+from rfoil_polardb import PolarDB
+
+
+def write_polar(path, offset, alphas = range(-5, 6)):
+    """
+    Writes a polar whose CL is 0.1 * alpha + offset and CD 0.01
+    """
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as file:
+        for alpha in alphas:
+            file.write('{0:8.3f} {1:8.4f} {2:9.5f}\n'.format(alpha, 0.1 * alpha + offset, 0.01))
+
+
+def test_query():
+    write_polar('Polars/Naca0012/RE1e5.dat', 0.)
+    write_polar('Polars/Naca0012/RE1e7.dat', 0.2)
+    write_polar('Polars/Naca0012/RE1e6.part1.dat', 5.)
+    database = PolarDB('PolarDB')
+    assert database.build('Polars') == 2
+    assert database.profiles() == ['Naca0012']
+    assert database.reynolds('Naca0012') == [1e5, 1e7]
+    cl, cd = database.query('Naca0012', [1e5, 1e6, 1e7, 1e8], [1., 2., 2.5, 3.])
+    #Linear in alpha, linear in log(Re), the closest polar outside
+    assert np.allclose(cl, [0.1, 0.3, 0.45, 0.5])
+    assert np.allclose(cd, 0.01)
+    cl, = database.query('Naca0012', 1e6, [-6., 6.], columns = ['CL'])
+    assert np.isnan(cl).all()
+    #Broadcast Reynolds and angles
+    assert database.query('Naca0012', [[1e5], [1e7]], [0., 1., 2.])[0].shape == (2, 3)
+
+
+def test_update():
+    write_polar('Polars/Naca0012/RE1e6.dat', 0.)
+    database = PolarDB('PolarDB')
+    assert database.update('Polars/Naca0012/RE1e6.dat')
+    assert not database.update('Polars/Naca0012/RE1e6.dat')
+    write_polar('Polars/Naca0012/RE1e6.dat', 0.5, range(0, 3))
+    os.utime('Polars/Naca0012/RE1e6.dat', (0, 0))
+    assert database.update('Polars/Naca0012/RE1e6.dat')
+    #The rows of the replaced polar are dropped
+    assert database.index['rows'] == 3
+    assert np.allclose(database.query('Naca0012', 1e6, 1.)[0], 0.6)
+    reopened = PolarDB('PolarDB')
+    assert np.allclose(reopened.query('Naca0012', 1e6, [0., 2.])[0], [0.5, 0.7])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the runtime model (see rfoil_runtime).
+
+"""
+
+import json
+from rfoil_runtime import RuntimeModel, family, angle_count, DEFAULT_TIME
+
+
+def job(profile = 'Naca0012', re = '1e6', mach = 0.1, angle_max = 10, angle_step = 0.5):
+    return dict(profile = profile, re = re, mach = mach, angle_max = angle_max, angle_step = angle_step)
+
+
+def test_family():
+    assert family('Naca0012') == 'Naca4'
+    assert family('naca23012') == 'Naca5'
+    assert family('S1223') == 'S'
+    assert family('Clark_Y') == 'Clark_y'
+    assert angle_count(10, 0.5) == 41
+
+
+def test_predict():
+    model = RuntimeModel()
+    assert model.predict(job()) == DEFAULT_TIME * 41
+    model.add('Naca0012', '1e6', 0.1, 10, 0.5, 41.)
+    model.add('Naca0015', '1e6', 0.1, 10, 0.5, 123.)
+    model.add('S1223', '1e5', 0., 10, 0.5, 410.)
+    #Median of the family at this Reynolds and Mach numbers, for the angles of the job
+    assert model.predict(job(angle_max = 5)) == 2. * 21
+    #Same Reynolds number, other family
+    assert model.predict(job('S1223')) == 2. * 41
+    #Nothing at this Reynolds number: all the polars
+    assert model.predict(job(re = '1e7')) == 3. * 41
+    #Without fallback only the polars of the same Reynolds number count
+    assert model.predict(job(re = '1e7'), fallback = False) is None
+    assert model.predict(job('S1223'), fallback = False) == 2. * 41
+    assert RuntimeModel().predict(job(), fallback = False) is None
+
+
+def test_order_and_makespan():
+    model = RuntimeModel()
+    for re, duration in [('1e5', 410.), ('1e6', 82.), ('1e7', 41.)]:
+        model.add('Naca0012', re, 0.1, 10, 0.5, duration)
+    jobs = [job(re = re) for re in ['1e7', '1e6', '1e5', '1e6']]
+    ordered = model.order(jobs)
+    assert [j['re'] for j in ordered] == ['1e5', '1e6', '1e6', '1e7']
+    #Longest first: 410 on one worker, 82 + 82 + 41 on the other
+    assert model.makespan(ordered, 2) == 410.
+    assert model.makespan(ordered, 1) == 615.
+    assert model.report(ordered, 2).startswith('Predicted time for 4 polars: 410 seconds')
+
+
+def test_read(workdir):
+    events = [dict(event = 'polar', profile = 'Naca0012', re = '1e6', mach = 0.1, angle_max = 10,
+                   angle_step = 0.5, duration = 82., cached = False),
+              dict(event = 'polar', profile = 'Naca0012', re = '1e6', mach = 0.1, angle_max = 10,
+                   angle_step = 0.5, duration = 0.01, cached = True),
+              dict(event = 'spawn', duration = 1.)]
+    with open('metrics.jsonl', 'w') as file:
+        for event in events:
+            file.write(json.dumps(event) + '\n')
+        file.write('not json\n')
+    model = RuntimeModel.read('metrics.jsonl')
+    assert model.predict(job()) == 82.
+    assert RuntimeModel.read('missing.jsonl').history == {}
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the Scheduler running a batch of Rfoil Threads (see
+rfoil_scheduler).
+
+"""
+
+import os
+import time
+from threading import Thread, Lock
+from fake_rfoil import fake_cmd
+from Rfoil_parallel2 import Rfoil, CRASH, CANCELLED
+from rfoil_scheduler import Scheduler, make_jobs
+from rfoil_runtime import RuntimeModel
+
+
+def jobs(profiles = ('Naca0012', 'Naca0015'), reynolds = ('1e5', '1e6'), **settings):
+    settings = dict(dict(cmd = fake_cmd(seed = 1), rootdir = 'Polars', mach = 0.1, angle_max = 10,
+                         angle_step = 0.5, tries_max = 3, backend = 'pipe', ready = 'prompt'), **settings)
+    return make_jobs(list(profiles), list(reynolds), **settings)
+
+
+def test_make_jobs():
+    matrix = make_jobs(['Naca0012', 'Naca0015'], ['1e5', '1e6', '1e7'], cmd = 'rfoil', mach = 0.2)
+    assert len(matrix) == 6
+    assert matrix[0] == {'cmd': 'rfoil', 'mach': 0.2, 'profile': 'Naca0012', 're': '1e5'}
+
+
+def test_max_running(monkeypatch):
+    lock = Lock()
+    counts = {'running': 0, 'most': 0}
+
+    def run(rfoil):
+        with lock:
+            counts['running'] += 1
+            counts['most'] = max(counts['most'], counts['running'])
+        time.sleep(0.05)
+        with lock:
+            counts['running'] -= 1
+        rfoil.success = True
+    monkeypatch.setattr(Rfoil, 'run', run)
+    finished = []
+    rfoils = Scheduler(3, listeners = [finished.append]).run(jobs(reynolds = ('1e5', '2e5', '5e5', '1e6')))
+    assert len(rfoils) == len(finished) == 8
+    assert counts['most'] == 3
+
+
+def test_batch(workdir):
+    finished = []
+    rfoils = Scheduler(2, listeners = [finished.append]).run(jobs())
+    assert len(finished) == 4
+    assert all(rfoil.success and rfoil.failure is None for rfoil in rfoils)
+    log = (workdir / 'Polars' / 'Naca0012' / 'Naca0012.log').read_text()
+    assert log.count('-----') == 2 and 'Total time' in log
+
+
+def test_run_exception(monkeypatch):
+    def run(rfoil):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(Rfoil, 'run', run)
+    finished = []
+    Scheduler(2, listeners = [finished.append]).run(jobs(profiles = ['Naca0012'], reynolds = ['1e6']))
+    assert [(rfoil.failure, rfoil.failures, rfoil.success) for rfoil in finished] == [(CRASH, [CRASH], False)]
+
+
+def test_speculative(workdir, events):
+    model = RuntimeModel()
+    #Predicted 0.41 seconds, the slow solver takes about 2 seconds
+    model.add('Naca0012', '1e6', 0.1, 10, 0.5, 0.41)
+    rfoils = Scheduler(2, model = model).run(jobs(profiles = ['Naca0012'], reynolds = ['1e6'], metrics = events,
+                                                  cmd = fake_cmd(seed = 1, solve_time = 0.05), speculate_after = 2))
+    assert rfoils[0].success and rfoils[0].failure is None
+    assert len(events.named('speculative')) == 1
+    assert len(rfoils[0].polar) == 41
+
+
+def test_no_speculation_without_history(workdir, events):
+    model = RuntimeModel()
+    #Only other Reynolds numbers: the default time is no reason to speculate
+    model.add('Naca0012', '1e5', 0.1, 10, 0.5, 0.41)
+    rfoils = Scheduler(2, model = model).run(jobs(profiles = ['Naca0012'], reynolds = ['1e6'], metrics = events,
+                                                  cmd = fake_cmd(seed = 1, solve_time = 0.05), speculate_after = 1))
+    assert rfoils[0].success and rfoils[0].predicted is None
+    assert events.named('speculative') == []
+
+
+def start(scheduler, batch):
+    results = []
+    thread = Thread(target = lambda: results.extend(scheduler.run(batch)), daemon = True)
+    thread.start()
+    while len(scheduler.rfoils) < len(batch):
+        time.sleep(0.01)
+    return thread, results
+
+
+def test_cancel_batch(workdir):
+    scheduler = Scheduler(2)
+    thread, rfoils = start(scheduler, jobs(cmd = fake_cmd(seed = 1, solve_time = 0.05)))
+    while scheduler.running < 2:
+        time.sleep(0.01)
+    scheduler.cancel()
+    thread.join(5)
+    #The running polars are killed, the others do not start
+    assert not thread.is_alive()
+    assert [rfoil.failure for rfoil in rfoils] == [CANCELLED] * 4
+    assert scheduler.running == 0
+
+
+def test_pause_and_cancel(workdir):
+    scheduler = Scheduler(2)
+    scheduler.pause()
+    thread, rfoils = start(scheduler, jobs())
+    time.sleep(0.3)
+    assert scheduler.running == 0 and not os.path.exists(os.path.join('Polars', 'Naca0012', 'RE1e5.dat'))
+    scheduler.cancel(scheduler.rfoils[1:2])
+    scheduler.resume()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert [rfoil.failure for rfoil in rfoils] == [None, CANCELLED, None, None]
+    assert not os.path.exists(os.path.join('Polars', 'Naca0012', 'RE1e6.dat'))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the staging of the profile files (see rfoil_staging).
+
+"""
+
+import os
+import pytest
+from rfoil_staging import ProfileStore, coordinates, cache_store
+
+PROFILE = b'S1223\n 1.0 0.0\n 0.5 0.1\n 0.0 0.0\n 0.5 -0.05\n 1.0 0.0\n'
+
+
+def write(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def test_coordinates():
+    points = coordinates(PROFILE)
+    assert points.shape == (5, 2) and points[1].tolist() == [0.5, 0.1]
+    with pytest.raises(ValueError):
+        coordinates(b'S1223\n 1.0 0.0\n 0.0 0.0\n')
+    with pytest.raises(ValueError):
+        coordinates(b'S1223\n 1.0 0.0\n 0.0 nan\n 0.5 0.1\n')
+
+
+def test_stage(workdir):
+    write('S1223.dat', PROFILE)
+    os.makedirs('Polars')
+    store = ProfileStore()
+    staged = store.stage('S1223.dat', 'Polars', 'S1223.dat')
+    assert open(staged, 'rb').read() == PROFILE
+    #Staged once per directory, read once per version of the file
+    os.remove(staged)
+    assert store.stage('S1223.dat', 'Polars', 'S1223.dat') == staged and not os.path.exists(staged)
+    other = ProfileStore()
+    other.stage('S1223.dat', 'Polars', 'S1223.dat')
+    assert open(staged, 'rb').read() == PROFILE
+    write('S1223.dat', b'invalid\n')
+    with pytest.raises(ValueError):
+        other.stage('S1223.dat', 'Polars', 'S1223.dat')
+
+
+def test_store(workdir):
+    write('S1223.dat', PROFILE)
+    for directory in ['Polars/S1223', 'Polars/M0.2/S1223']:
+        os.makedirs(directory)
+    store = ProfileStore('Store')
+    first = store.stage('S1223.dat', 'Polars/S1223', 'S1223.dat')
+    second = store.stage('S1223.dat', 'Polars/M0.2/S1223', 'S1223.dat')
+    assert os.listdir('Store') == [store.load('S1223.dat')[0] + '.dat']
+    #Editing the original file later does not change the staged profiles
+    edited = PROFILE.replace(b'0.1', b'0.2')
+    write('S1223.dat', edited)
+    os.utime('S1223.dat', (0, 0))
+    assert open(first, 'rb').read() == open(second, 'rb').read() == PROFILE
+    store.stage('S1223.dat', 'Polars/S1223', 'S1223.dat')
+    assert open(first, 'rb').read() == edited and open(second, 'rb').read() == PROFILE
+    assert len(os.listdir('Store')) == 2
+
+
+def test_cache_store(workdir):
+    store = cache_store('PolarCache')
+    assert cache_store(os.path.join(str(workdir), 'PolarCache')) is store
+    assert store.directory == os.path.join(str(workdir), 'PolarCache', 'profiles')
+    assert cache_store('OtherCache') is not store
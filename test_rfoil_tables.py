@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the lookup tables built from the polars (see
+rfoil_tables).
+
+"""
+
+import os
+import numpy as np
+from test_rfoil_polardb import write_polar
+from rfoil_tables import (TABLE_COLUMNS, MISSING, DATA, EXTRAPOLATED, grid_step, common_step, make_table,
+                          build_tables, read_table)
+
+
+def polar(reynolds, alpha):
+    """
+    Returns a polar as read by readpolar, CL is 0.1 * alpha and CD 0.01
+    """
+    alpha = np.array(alpha, dtype = float)
+    values = np.full((len(TABLE_COLUMNS), len(alpha)), np.nan)
+    values[TABLE_COLUMNS.index('CL')] = 0.1 * alpha
+    values[TABLE_COLUMNS.index('CD')] = 0.01
+    return reynolds, alpha, values
+
+
+def test_refined_polar():
+    #Angle step 1, refined down to 0.25 around 0.5
+    refined = polar(1e6, [-3., -2., -1., 0., 0.5, 0.75, 1., 2., 3.])
+    assert grid_step([refined]) == 0.25 and common_step([refined]) == 1.
+    assert grid_step([polar(1e6, [0., 0.25, 0.5, 1., 2., 3.])]) == 0.25
+    table = make_table([refined])
+    assert np.allclose(table['alpha'], np.arange(-3., 3.01, 0.25))
+    cl = table['values'][TABLE_COLUMNS.index('CL'), 0]
+    assert np.allclose(cl, 0.1 * table['alpha'])
+    #The coarse intervals of the polar are not gaps
+    assert (table['mask'] == DATA).all()
+
+
+def test_gap_and_reynolds_order():
+    table = make_table([polar(1e7, [-2., -1., 0., 1., 2.]), polar(1e5, [-2., 2.])], step = 1.)
+    assert table['reynolds'].tolist() == [1e5, 1e7]
+    #Nothing is interpolated between -2 and 2 at 1e5
+    assert table['mask'][0].tolist() == [DATA, MISSING, MISSING, MISSING, DATA]
+    assert np.isnan(table['values'][TABLE_COLUMNS.index('CL'), 0, 1:4]).all()
+    assert (table['mask'][1] == DATA).all()
+
+
+def test_extrapolation():
+    table = make_table([polar(1e6, np.arange(-10., 10.5, 0.5))], extrapolation = True)
+    alpha = table['alpha']
+    assert alpha[0] == -180. and alpha[-1] == 180.
+    mask = table['mask'][0]
+    assert (mask[np.abs(alpha) <= 10] == DATA).all() and (mask[np.abs(alpha) > 10] == EXTRAPOLATED).all()
+    cl, cd = table['values'][TABLE_COLUMNS.index('CL'), 0], table['values'][TABLE_COLUMNS.index('CD'), 0]
+    assert np.isfinite(cl).all() and np.isfinite(cd).all()
+    #Flat plate drag at 90 degrees, no lift at +-180 degrees
+    assert np.isclose(cd[alpha == 90.][0], 2., atol = 0.05)
+    assert np.allclose(cl[np.abs(alpha) == 180.], 0., atol = 1e-6)
+
+
+def test_build_tables(workdir):
+    write_polar('Polars/Naca0012/RE1e5.dat', 0.)
+    write_polar('Polars/Naca0012/RE1e6.dat', 0.)
+    write_polar('Polars/Naca0015/RE1e6.dat', 0., [-1, 0, 1])
+    written = build_tables('Polars', 'PolarTables', workers = 2)
+    assert sorted(written) == [os.path.join('PolarTables', 'Naca0012.npz'), os.path.join('PolarTables', 'Naca0015.npz')]
+    table = read_table(os.path.join('PolarTables', 'Naca0012.npz'))
+    assert table['values'].shape == (len(TABLE_COLUMNS), 2, 11)
+    assert table['reynolds'].tolist() == [1e5, 1e6]
+    #Up to date
+    assert build_tables('Polars', 'PolarTables') == []
+    assert build_tables('Polars', 'PolarTables', profiles = ['Naca0015'], force = True, workers = 1) == [
+        os.path.join('PolarTables', 'Naca0015.npz')]
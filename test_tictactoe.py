@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the Tic tac toe engine (see tictactoe_engine).
+
+"""
+
+import pytest
+from tictactoe_engine import Game, visit, togrid, toboard, WIN_SCORE
+from tictactoe_table import WIN_O, OPEN
+
+
+def test_perft():
+    game = Game()
+    assert [game.perft(depth) for depth in range(1, 5)] == [81, 720, 6336, 55080]
+    assert visit(game, 3) == 81 + 720 + 6336
+    #Everything was taken back
+    assert game.history == [] and game.states == [0] * 9 and game.boards == ([0] * 9, [0] * 9)
+
+
+def test_board():
+    assert togrid(4, 7) == (5, 4)
+    assert all(togrid(*toboard(grid, cell)) == (grid, cell) for grid in range(9) for cell in range(9))
+
+
+def test_play():
+    game = Game()
+    game.play(4, 0)
+    #The cell played forces the grid of the next move
+    assert game.player == 1 and game.forced == 0
+    assert all(grid == 0 for grid, cell in game.moves())
+    with pytest.raises(ValueError):
+        game.play(4, 1)
+    game.play(0, 4)
+    assert game.owner(4, 0) == 0 and game.owner(0, 4) == 1 and game.owner(0, 0) is None
+    game.unmake()
+    assert game.player == 1 and game.forced == 0 and game.owner(0, 4) is None
+
+
+def test_win():
+    game = Game()
+    #O aligns the top row of the middle grid, X answers in the forced grids
+    for move in [(4, 0), (0, 4), (4, 1), (1, 4)]:
+        game.play(*move)
+    assert game.evaluate() == WIN_SCORE - 1
+    game.play(4, 2)
+    assert game.winner == 0 and game.status(4) == WIN_O
+    assert game.over() and game.moves() == []
+    assert game.evaluate() == -WIN_SCORE
+    game.unmake()
+    assert game.winner is None and game.status(4) == OPEN
+    assert len(game.moves()) == 7
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+These are the tests of the table of the grid states (see tictactoe_table).
+
+"""
+
+import os
+import numpy as np
+import tictactoe_table
+from tictactoe_table import STATUS, THREATS, SCORE, OPEN, WIN_O, WIN_X, DRAW, VERSION, state, build, load
+
+
+def test_state():
+    assert state(0, 0) == 0
+    #O in cell 0, X in cell 2
+    assert state(0b1, 0b100) == 1 + 2 * 9
+    assert state(0b111111111, 0) == (3 ** 9 - 1) // 2
+
+
+def test_status():
+    assert STATUS[state(0b000000111, 0b000011000)] == WIN_O
+    assert STATUS[state(0b000001000, 0b001010100)] == WIN_X
+    #O X O / O X X / X O O: no line left
+    assert STATUS[state(0b110001101, 0b001110010)] == DRAW
+    #X X . / O . . / O . .: both players can still complete lines
+    assert STATUS[state(0b001001000, 0b000000011)] == OPEN
+
+
+def test_threats_and_score():
+    #O in cells 0 and 1: cell 2 completes the top row
+    grid = state(0b11, 0)
+    assert THREATS[0][grid] == 0b100 and THREATS[1][grid] == 0
+    #Top row with 2 symbols, left and middle columns and diagonal with 1
+    assert SCORE[grid] == 10 + 1 + 1 + 1
+    assert SCORE[state(0, 0b11)] == -SCORE[grid]
+    #Blocked by X
+    assert THREATS[0][state(0b11, 0b100)] == 0
+
+
+def test_load(workdir):
+    path = str(workdir / 'table.npz')
+    status, threats, score = load(path)
+    assert os.path.exists(path)
+    assert np.array_equal(status, STATUS) and np.array_equal(score, SCORE)
+    assert np.array_equal(threats, THREATS)
+    #An outdated table is built again
+    np.savez(path, version = VERSION - 1, status = status, threats = threats, score = score)
+    assert np.array_equal(load(path)[0], build()[0])
+    with np.load(path) as data:
+        assert int(data['version']) == VERSION
+    assert tictactoe_table.TABLE_FILE.endswith('tictactoe_table.npz')
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the game engine of the Tic tac toe with 9 grids of TicTacToeV2,
+without any user interface. The state of each grid is one 9 bit mask per
+player (bit 3 * row + column), the winning positions of a grid are computed
+once for the 512 masks. A move is a (grid, cell) pair: the cell played forces
+the grid of the next move, if that grid is full the next player plays in any
+grid. The first player to align three symbols in a grid wins. Moves are made
+and unmade in place (make, unmake): with the generation of the moves, a
+search makes and unmakes about 750 000 moves per second in CPython (perft,
+which does not play the moves of its last depth, counts about 3 million
+positions per second). Run this file to measure both.
+Each grid also keeps its ternary state, the index of the table of
+tictactoe_table giving its status, threats and score: a win is detected and
+a position is evaluated with table lookups only.
+
+"""
+
+import time
+from tictactoe_table import STATUS, THREATS, SCORE, WON, MARKS
+
+#Symbols of the players, 'O' plays first
+SYMBOLS = ('O', 'X')
+FULL = 0b111111111
+#Score of a won game
+WIN_SCORE = 10000
+#Mask: cells of the mask
+CELLS = tuple(tuple(cell for cell in range(9) if mask >> cell & 1) for mask in range(FULL + 1))
+
+
+def togrid(i, j):
+    """
+    Returns the (grid, cell) of the box at row i and column j of the board
+    """
+    return 3 * (i // 3) + j // 3, 3 * (i % 3) + j % 3
+
+
+def toboard(grid, cell):
+    """
+    Returns the (row, column) on the board of a cell of a grid
+    """
+    return 3 * (grid // 3) + cell // 3, 3 * (grid % 3) + cell % 3
+
+
+class Game(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        #Player: one mask per grid
+        self.boards = ([0] * 9, [0] * 9)
+        #Grid: index in the table of tictactoe_table
+        self.states = [0] * 9
+        self.player = 0
+        #Grid of the next move, -1 for any grid
+        self.forced = -1
+        self.winner = None
+        #(grid, cell, forced grid before the move) of the moves played
+        self.history = []
+
+    def moves(self):
+        """
+        Returns the legal (grid, cell) moves of the player
+        """
+        if self.winner is not None:
+            return []
+        first, second = self.boards
+        forced = self.forced
+        if forced >= 0:
+            empty = FULL & ~(first[forced] | second[forced])
+            if empty:
+                return [(forced, cell) for cell in CELLS[empty]]
+        return [(grid, cell) for grid in range(9) for cell in CELLS[FULL & ~(first[grid] | second[grid])]]
+
+    def make(self, grid, cell):
+        """
+        Plays a move without checking it is legal
+        """
+        player = self.player
+        self.history.append((grid, cell, self.forced))
+        self.boards[player][grid] |= 1 << cell
+        self.states[grid] += MARKS[player][cell]
+        if STATUS[self.states[grid]] == WON[player]:
+            self.winner = player
+        self.forced = cell
+        self.player ^= 1
+
+    def unmake(self):
+        """
+        Takes back the last move
+        """
+        grid, cell, self.forced = self.history.pop()
+        self.player ^= 1
+        self.boards[self.player][grid] ^= 1 << cell
+        self.states[grid] -= MARKS[self.player][cell]
+        #No move follows a win, so the last move was the winning one if any
+        self.winner = None
+
+    def play(self, grid, cell):
+        """
+        Plays a move, raises ValueError if it is not legal
+        """
+        if (grid, cell) not in self.moves():
+            raise ValueError('Illegal move: grid {0}, cell {1}'.format(grid, cell))
+        self.make(grid, cell)
+
+    def over(self):
+        return self.winner is not None or not self.moves()
+
+    def owner(self, grid, cell):
+        """
+        Returns the player who played a cell, None if it is empty
+        """
+        bit = 1 << cell
+        for player in (0, 1):
+            if self.boards[player][grid] & bit:
+                return player
+        return None
+
+    def status(self, grid):
+        """
+        Returns the status of a grid (see tictactoe_table)
+        """
+        return STATUS[self.states[grid]]
+
+    def evaluate(self):
+        """
+        Returns the score of the position for the player to move: lost if
+        the last move won, won if a legal move completes a line, otherwise
+        the sum of the scores of the grids
+        """
+        if self.winner is not None:
+            return -WIN_SCORE
+        player = self.player
+        threats = THREATS[player]
+        grids = [self.forced] if self.forced >= 0 and self.boards[0][self.forced] | \
+            self.boards[1][self.forced] != FULL else range(9)
+        for grid in grids:
+            if threats[self.states[grid]]:
+                return WIN_SCORE - 1
+        score = sum(SCORE[state] for state in self.states)
+        return score if player == 0 else -score
+
+    def perft(self, depth):
+        """
+        Returns the number of move sequences of the given length (or ending
+        the game before), used to test and time the engine
+        """
+        if depth == 0:
+            return 1
+        moves = self.moves()
+        if not moves:
+            return 1
+        if depth == 1:
+            return len(moves)
+        count = 0
+        for grid, cell in moves:
+            self.make(grid, cell)
+            count += self.perft(depth - 1)
+            self.unmake()
+        return count
+
+
+def visit(game, depth):
+    """
+    Makes and unmakes all the move sequences of the given length, returns
+    the number of moves made (the work of a search without evaluation)
+    """
+    if depth == 0:
+        return 0
+    count = 0
+    for grid, cell in game.moves():
+        game.make(grid, cell)
+        count += 1 + visit(game, depth - 1)
+        game.unmake()
+    return count
+
+
+if __name__ == '__main__':
+    game = Game()
+    for depth in range(1, 6):
+        start = time.perf_counter()
+        count = game.perft(depth)
+        duration = max(time.perf_counter() - start, 1e-9)
+        print('Depth {0}: {1} positions in {2:.3f} seconds ({3:.0f} per second)'.format(
+            depth, count, duration, count / duration))
+    start = time.perf_counter()
+    count = visit(game, 4)
+    duration = time.perf_counter() - start
+    print('{0} moves made and unmade in {1:.3f} seconds ({2:.0f} per second)'.format(count, duration, count / duration))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Renaud Laine
+
+This is the table of the 3^9 = 19683 states of one grid of the Tic tac toe
+with 9 grids (see tictactoe_engine). A state is the number whose ternary
+digit cell is 0 for an empty cell, 1 for 'O' and 2 for 'X'. For each state
+the table gives the status of the grid (open, won by O or X, or drawn when
+no line can be completed any more), the immediate threats of each player
+(mask of the empty cells completing one of their lines) and a score of the
+grid for O (lines held by one player only, counted by their number of
+symbols). It is built with NumPy once and cached in tictactoe_table.npz next
+to this file, so that the engine and the user interface evaluate a grid with
+one lookup.
+
+"""
+
+import os
+import numpy as np
+
+#Rows, columns and diagonals of a grid, bit 3 * row + column
+WIN_MASKS = (0b000000111, 0b000111000, 0b111000000,
+             0b001001001, 0b010010010, 0b100100100,
+             0b100010001, 0b001010100)
+#Status of a grid
+OPEN = 0
+WIN_O = 1
+WIN_X = 2
+DRAW = 3
+#Status of a grid won by each player
+WON = (WIN_O, WIN_X)
+#Score of a line held by one player by number of symbols
+LINE_SCORES = (0, 1, 10, 100)
+SIZE = 3 ** 9
+#Value added to the state by a symbol of each player in each cell
+MARKS = (tuple(3 ** cell for cell in range(9)), tuple(2 * 3 ** cell for cell in range(9)))
+#Increase when the contents of the table change
+VERSION = 1
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tictactoe_table.npz')
+
+
+def build():
+    """
+    Returns the status, threats (one row per player) and score of every
+    state
+    """
+    cells = (np.arange(SIZE)[:, None] // np.array(MARKS[0])) % 3
+    lines = np.array([[cell for cell in range(9) if mask >> cell & 1] for mask in WIN_MASKS])
+    #State, line, cell of the line
+    values = cells[:, lines]
+    counts = [(values == player + 1).sum(axis = 2) for player in (0, 1)]
+    free = [counts[1 - player] == 0 for player in (0, 1)]
+    status = np.full(SIZE, DRAW, dtype = np.uint8)
+    status[(free[0] | free[1]).any(axis = 1)] = OPEN
+    status[(counts[1] == 3).any(axis = 1)] = WIN_X
+    status[(counts[0] == 3).any(axis = 1)] = WIN_O
+    #Bit of the empty cells of each line
+    empty = ((values == 0) << lines).sum(axis = 2)
+    threats = np.zeros((2, SIZE), dtype = np.uint16)
+    for player in (0, 1):
+        threatening = (counts[player] == 2) & free[player]
+        threats[player] = np.bitwise_or.reduce(np.where(threatening, empty, 0), axis = 1)
+    scores = np.array(LINE_SCORES)
+    score = (np.where(free[0], scores[counts[0]], 0) - np.where(free[1], scores[counts[1]], 0)).sum(axis = 1)
+    return status, threats, score.astype(np.int16)
+
+
+def load(path = TABLE_FILE):
+    """
+    Returns the table cached in path, built and written there if it is
+    missing or outdated
+    """
+    try:
+        with np.load(path) as data:
+            if int(data['version']) == VERSION:
+                return data['status'], data['threats'], data['score']
+    except (EnvironmentError, KeyError, ValueError):
+        pass
+    status, threats, score = build()
+    try:
+        temporary = '{0}.{1}.tmp.npz'.format(path, os.getpid())
+        np.savez(temporary, version = VERSION, status = status, threats = threats, score = score)
+        os.replace(temporary, path)
+    except EnvironmentError:
+        #Read-only installation, the table is built at each import
+        pass
+    return status, threats, score
+
+
+#Lookups on tuples are faster than on arrays for single states
+_status, _threats, _score = load()
+STATUS = tuple(_status.tolist())
+THREATS = tuple(tuple(row) for row in _threats.tolist())
+SCORE = tuple(_score.tolist())
+del _status, _threats, _score
+
+
+def state(first, second):
+    """
+    Returns the state of a grid from the masks of the cells of each player
+    """
+    return sum(MARKS[0][cell] for cell in range(9) if first >> cell & 1) + \
+        sum(MARKS[1][cell] for cell in range(9) if second >> cell & 1)